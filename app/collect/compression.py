@@ -0,0 +1,143 @@
+import json
+
+from app import db
+from app.collect.logbook import MAX_EVENT_AGL
+
+# hypertable -> (segmentby, orderby) of the TimescaleDB native compression
+# The position queries (IGC export, logbook) select the beacons of one sender, so they only decompress the segments of this sender.
+COMPRESSION_SETTINGS = {
+    'sender_positions': ('name, receiver_name', 'timestamp'),
+    'receiver_positions': ('name, receiver_name', 'timestamp'),
+}
+
+# name -> query of the access paths which are timed by the compression report (parameters: name, start, end)
+ACCESS_PATH_QUERIES = {
+    'igc': """
+        SELECT timestamp, location, altitude
+        FROM sender_positions
+        WHERE reference_timestamp BETWEEN :start AND :end AND name = :name
+        ORDER BY timestamp;
+    """,
+    'logbook_max_altitude': """
+        SELECT MAX(altitude)
+        FROM sender_positions
+        WHERE reference_timestamp BETWEEN :start AND :end AND name = :name;
+    """,
+    'logbook_takeoff_landings': f"""
+        SELECT DISTINCT ON (name, timestamp) name, timestamp, location, track, ground_speed, altitude, climb_rate
+        FROM sender_positions
+        WHERE reference_timestamp BETWEEN :start AND :start + INTERVAL '1 hour' AND agl <= {MAX_EVENT_AGL}
+        ORDER BY name, timestamp, error_count;
+    """,
+}
+
+
+def get_compressed_hypertables():
+    """Returns the names of the hypertables with enabled compression."""
+
+    rows = db.session.execute("""
+        SELECT table_name
+        FROM _timescaledb_catalog.hypertable
+        WHERE compressed_hypertable_id IS NOT NULL;
+    """).fetchall()
+
+    return [row[0] for row in rows]
+
+
+def enable_compression(compress_after):
+    """Enable the compression of the position hypertables and add a policy which compresses the chunks older than 'compress_after' (interval string)."""
+
+    for tablename, (segmentby, orderby) in COMPRESSION_SETTINGS.items():
+        db.session.execute(f"""
+            ALTER TABLE {tablename} SET (
+                timescaledb.compress,
+                timescaledb.compress_segmentby = '{segmentby}',
+                timescaledb.compress_orderby = '{orderby}'
+            );
+        """)
+        db.session.execute(f"SELECT add_compress_chunks_policy('{tablename}', INTERVAL '{compress_after}', if_not_exists => TRUE);")
+    db.session.commit()
+
+
+def compress_chunks(compress_after):
+    """Compress the chunks of the hypertables with enabled compression which are older than 'compress_after' (interval string). Returns the number of compressed chunks."""
+
+    compressed_chunks = 0
+    for tablename in get_compressed_hypertables():
+        chunks = db.session.execute(f"""
+            SELECT c.chunk::TEXT
+            FROM show_chunks('{tablename}', older_than => INTERVAL '{compress_after}') AS c(chunk)
+            INNER JOIN _timescaledb_catalog.chunk AS ch ON format('%I.%I', ch.schema_name, ch.table_name)::regclass = c.chunk
+            WHERE ch.compressed_chunk_id IS NULL;
+        """).fetchall()
+
+        # one transaction per chunk, so we don't hold the locks of all chunks at once
+        for (chunk, ) in chunks:
+            db.session.execute(f"SELECT compress_chunk('{chunk}', if_not_compressed => TRUE);")
+            db.session.commit()
+            compressed_chunks += 1
+
+    return compressed_chunks
+
+
+def get_chunk_sizes(tablename):
+    """Returns the chunks of the hypertable with their time range, compression status and the sizes (bytes) before and after the compression."""
+
+    rows = db.session.execute("""
+        SELECT
+            format('%I.%I', c.schema_name, c.table_name) AS chunk,
+            _timescaledb_internal.to_timestamp_without_timezone(ds.range_start) AS range_start,
+            _timescaledb_internal.to_timestamp_without_timezone(ds.range_end) AS range_end,
+            c.compressed_chunk_id IS NOT NULL AS is_compressed,
+            COALESCE(ccs.uncompressed_heap_size + ccs.uncompressed_toast_size + ccs.uncompressed_index_size,
+                     pg_total_relation_size(format('%I.%I', c.schema_name, c.table_name)::regclass)) AS uncompressed_bytes,
+            ccs.compressed_heap_size + ccs.compressed_toast_size + ccs.compressed_index_size AS compressed_bytes
+        FROM _timescaledb_catalog.chunk AS c
+        INNER JOIN _timescaledb_catalog.hypertable AS h ON c.hypertable_id = h.id
+        INNER JOIN _timescaledb_catalog.chunk_constraint AS cc ON cc.chunk_id = c.id
+        INNER JOIN _timescaledb_catalog.dimension_slice AS ds ON cc.dimension_slice_id = ds.id
+        LEFT JOIN _timescaledb_catalog.compression_chunk_size AS ccs ON ccs.chunk_id = c.id
+        WHERE h.table_name = :tablename
+        ORDER BY range_start;
+    """, {'tablename': tablename}).fetchall()
+
+    return rows
+
+
+def get_execution_time(query, parameters):
+    """Returns the execution time (ms) of the query measured by the database."""
+
+    result = db.session.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}", parameters).scalar()
+    plan = result if isinstance(result, list) else json.loads(result)
+
+    return plan[0]['Execution Time']
+
+
+def get_access_path_timings(chunk_sizes):
+    """Returns the execution times (ms) of the access paths in the newest compressed and the newest uncompressed chunk of sender_positions.
+
+    The result is a dict: 'compressed'/'uncompressed' -> (chunk, name, {access path: ms}). Senders with more beacons give the more meaningful times,
+    so we take the most active sender of the first beacons in the chunk.
+    """
+
+    timings = {}
+    for label, is_compressed in (('compressed', True), ('uncompressed', False)):
+        chunks = [row for row in chunk_sizes if row.is_compressed == is_compressed]
+        if not chunks:
+            continue
+
+        chunk = chunks[-1]
+        name = db.session.execute(f"""
+            SELECT name
+            FROM (SELECT name FROM {chunk.chunk} LIMIT 10000) AS sq
+            GROUP BY name
+            ORDER BY COUNT(*) DESC
+            LIMIT 1;
+        """).scalar()
+        if name is None:
+            continue
+
+        parameters = {'name': name, 'start': chunk.range_start, 'end': chunk.range_end}
+        timings[label] = (chunk.chunk, name, {path: get_execution_time(query, parameters) for path, query in ACCESS_PATH_QUERIES.items()})
+
+    return timings
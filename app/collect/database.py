@@ -8,7 +8,7 @@ from flask import current_app
 from flydenity import parser as flydenity_parser
 
 from app import db
-from app.model import AircraftType, Country, Sender, SenderInfo, SenderInfoOrigin, Receiver
+from app.model import AircraftType, Country, SenderInfo, SenderInfoOrigin, Receiver
 
 DDB_URL = "http://ddb.glidernet.org/download/?t=1"
 FLARMNET_URL = "http://www.flarmnet.org/files/data.fln"
@@ -109,11 +109,32 @@ def merge_sender_infos(sender_info_dicts):
                 sender_info.country = countries[dataset['iso2']]
     db.session.commit()
 
-    # Update sender_infos FK -> senders
-    upd = db.update(SenderInfo) \
-        .where(SenderInfo.address == Sender.address) \
-        .values(sender_id=Sender.id)
-    result = db.session.execute(upd)
-    db.session.commit()
+    # Update sender_infos FK -> senders (only for the imported sender_infos)
+    link_sender_infos(addresses=[sender_info_dict['address'] for sender_info_dict in sender_info_dicts])
 
     return len(sender_info_dicts)
+
+
+def link_sender_infos(addresses=None):
+    """Set the FK sender_infos -> senders. Returns the number of changed sender_infos.
+
+    With addresses only the unlinked sender_infos with these addresses are linked,
+    otherwise all sender_infos are checked (reconciliation).
+    """
+
+    if addresses is None:
+        condition = "si.sender_id IS DISTINCT FROM s.id"
+        parameters = {}
+    else:
+        condition = "si.sender_id IS NULL AND si.address = ANY(:addresses)"
+        parameters = {'addresses': list(addresses)}
+
+    result = db.session.execute(f"""
+        UPDATE sender_infos AS si
+        SET sender_id = s.id
+        FROM senders AS s
+        WHERE {condition} AND s.address = si.address;
+    """, parameters)
+    db.session.commit()
+
+    return result.rowcount
@@ -1,24 +1,140 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from flask import current_app
 
-from app import redis_client
-from app.gateway.message_handling import sender_position_csv_strings_to_db, receiver_position_csv_strings_to_db, receiver_status_csv_strings_to_db
+from app.gateway.message_handling import sender_position_csv_strings_to_db, receiver_position_csv_strings_to_db, receiver_status_csv_strings_to_db, flush_statistics, STATISTICS_AGGREGATORS
+from app.gateway.sender_cache import sender_cache
+from app.gateway.transport import get_transport, TransferBatch, REDIS_TARGETS
 
 
-def transfer_from_redis_to_database():
-    def unmapping(string):
-        return string[0].decode('utf-8')
+# The stages of a transfer: redis_target -> (function, stages which must be finished before)
+# - receiver_position and receiver_status both upsert 'receivers' with all their columns, so they must not run at the same time
+# - sender_position runs concurrently: the receiver id cache inserts the unknown receivers (just the name) itself
+TRANSFER_STAGES = {
+    'receiver_position': (receiver_position_csv_strings_to_db, ()),
+    'receiver_status': (receiver_status_csv_strings_to_db, ('receiver_position', )),
+    'sender_position': (sender_position_csv_strings_to_db, ()),
+}
 
-    receiver_status_data = list(map(unmapping, redis_client.zpopmin('receiver_status', 100000)))
-    receiver_position_data = list(map(unmapping, redis_client.zpopmin('receiver_position', 100000)))
-    sender_status_data = list(map(unmapping, redis_client.zpopmin('sender_status', 100000)))
-    sender_position_data = list(map(unmapping, redis_client.zpopmin('sender_position', 100000)))
 
-    receiver_status_csv_strings_to_db(lines=receiver_status_data)
-    receiver_position_csv_strings_to_db(lines=receiver_position_data)
-    sender_position_csv_strings_to_db(lines=sender_position_data)
+def transfer_batch(transport, batch_size):
+    """Transfer up to batch_size rows of each redis target to the database.
 
-    current_app.logger.debug(f"transfer_from_redis_to_database: rx_stat: {len(receiver_status_data):6d}\trx_pos: {len(receiver_position_data):6d}\ttx_stat: {len(sender_status_data):6d}\ttx_pos: {len(sender_position_data):6d}")
+    Independent stages run concurrently, each with its own database connection. The rows are read
+    in chunks of TRANSFER_CHUNK_ROWS while they are copied, so the memory doesn't grow with batch_size.
+    Returns the number of rows and the duration (seconds) for each target.
+    """
 
-    finish_message = f"Database: {len(receiver_status_data)+len(receiver_position_data)+len(sender_status_data)+len(sender_position_data)} inserted"
+    chunk_size = current_app.config['TRANSFER_CHUNK_ROWS']
+    batches = {redis_target: TransferBatch(transport, redis_target, batch_size, chunk_size) for redis_target in REDIS_TARGETS}
+
+    app = current_app._get_current_object()
+    futures = {}
+    durations = {}
+
+    def run_stage(redis_target, function, dependencies):
+        for dependency in dependencies:
+            futures[dependency].result()    # re-raises the exception if the dependency failed
+
+        with app.app_context():
+            start = time.time()
+            batch = batches[redis_target]
+            if not batch.is_empty():
+                function(lines=batch)
+            batch.ack()
+            durations[redis_target] = time.time() - start
+
+    with ThreadPoolExecutor(max_workers=len(TRANSFER_STAGES)) as executor:
+        for redis_target, (function, dependencies) in TRANSFER_STAGES.items():
+            futures[redis_target] = executor.submit(run_stage, redis_target, function, dependencies)
+
+    for future in futures.values():
+        future.result()
+
+    # we don't store sender status messages
+    batches['sender_status'].skip()
+    batches['sender_status'].ack()
+
+    counts = {redis_target: batch.rows for redis_target, batch in batches.items()}
+    return counts, durations
+
+
+def transfer_from_redis_to_database(batch_size=None):
+    transport = get_transport()
+    counts, durations = transfer_batch(transport, batch_size or current_app.config['TRANSFER_MAX_BATCH_ROWS'])
+    flush_statistics()
+
+    # get_info() costs redis round trips, so we only build the messages if they are logged
+    if current_app.logger.isEnabledFor(logging.DEBUG):
+        current_app.logger.debug(sender_cache.get_statistics_message())
+        current_app.logger.debug(f"transfer_from_redis_to_database: rx_stat: {counts['receiver_status']:6d}\trx_pos: {counts['receiver_position']:6d}\ttx_stat: {counts['sender_status']:6d}\ttx_pos: {counts['sender_position']:6d}")
+        current_app.logger.debug("transfer_from_redis_to_database: durations " + ", ".join(f"{redis_target}: {duration:.2f}s" for redis_target, duration in durations.items()))
+
+        transport_info = ', '.join(f"{redis_target}: {transport.get_info(redis_target)}" for redis_target in REDIS_TARGETS)
+        current_app.logger.debug(f"transfer_from_redis_to_database: transport {transport_info}")
+
+    finish_message = f"Database: {sum(counts.values())} inserted"
     return finish_message
+
+
+def follow_redis_to_database(target_latency, max_batch_rows, min_batch_rows=1000):
+    """Transfer the data from redis to the database continuously (until KeyboardInterrupt).
+
+    If the rows are waiting in redis (backlog) the batch size is adapted to the measured throughput so that
+    a transfer takes about target_latency seconds. Otherwise we wait until the oldest row is about
+    target_latency seconds old, so the batches don't get too small.
+
+    The statistics are aggregated in memory and upserted every TRANSFER_STATISTICS_FLUSH_INTERVAL seconds.
+    """
+
+    transport = get_transport()
+    batch_size = min_batch_rows
+
+    statistics = {'transfers': 0, 'rows': 0, 'duration': 0.0, 'max_duration': 0.0, 'stage_durations': {}}
+    last_minute = datetime.utcnow().minute
+
+    try:
+        while True:
+            start = time.time()
+            counts, durations = transfer_batch(transport, batch_size)
+            flush_statistics()
+            duration = time.time() - start
+            rows = sum(counts.values())
+
+            statistics['transfers'] += 1
+            statistics['rows'] += rows
+            statistics['duration'] += duration
+            statistics['max_duration'] = max(statistics['max_duration'], duration)
+            for redis_target, stage_duration in durations.items():
+                statistics['stage_durations'][redis_target] = statistics['stage_durations'].get(redis_target, 0.0) + stage_duration
+
+            current_minute = datetime.utcnow().minute
+            if current_minute != last_minute:
+                current_app.logger.info(
+                    f"{statistics['rows']:7d} rows/min, "
+                    f"{statistics['rows'] / max(statistics['duration'], 1e-6):6.0f} rows/s while transferring, "
+                    f"{statistics['transfers']} transfers, "
+                    f"commit latency avg {statistics['duration'] / statistics['transfers']:.2f}s, "
+                    f"max {statistics['max_duration']:.2f}s, "
+                    f"batch size: {batch_size}, "
+                    f"avg stage durations: " + ", ".join(f"{redis_target} {stage_duration / statistics['transfers']:.2f}s" for redis_target, stage_duration in statistics['stage_durations'].items())
+                )
+                statistics = {'transfers': 0, 'rows': 0, 'duration': 0.0, 'max_duration': 0.0, 'stage_durations': {}}
+
+                for aggregator in STATISTICS_AGGREGATORS:
+                    current_app.logger.info(aggregator.get_statistics_message())
+                    aggregator.reset_statistics()
+                current_app.logger.info(sender_cache.get_statistics_message())
+                sender_cache.reset_statistics()
+            last_minute = current_minute
+
+            if max(counts.values()) >= batch_size:
+                # there is a backlog: adapt the batch size to the throughput and continue immediately
+                rows_per_second = rows / max(duration, 1e-6)
+                batch_size = int(min(max_batch_rows, max(min_batch_rows, rows_per_second * target_latency)))
+            else:
+                time.sleep(max(0.0, target_latency - duration))
+    finally:
+        flush_statistics(force=True)
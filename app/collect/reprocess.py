@@ -0,0 +1,200 @@
+import json
+import os
+from datetime import timedelta
+
+from app import create_app, db
+from app.gateway.beacon_conversion import get_mgrs
+from app.gateway.elevation import get_elevation_service
+from app.gateway.pgcopy import IteratorFile
+from app.utils import get_sql_trustworthy
+
+REPROCESS_COLUMNS = ('agl', 'location_mgrs', 'normalized_quality', 'is_trustworthy')
+REPROCESS_FETCH_ROWS = 10000    # locations which are fetched (and calculated in python) at once
+FLOAT_TOLERANCE = 0.01          # smaller differences of the real columns are not updated
+
+# column -> (new value, condition for the rows which have to be updated) for the set-based recalculation in SQL
+SQL_CALCULATIONS = {
+    'agl': (
+        "sp.altitude - (SELECT ST_Value(e.rast, sp.location) FROM elevation AS e WHERE ST_Intersects(sp.location, e.rast) LIMIT 1)",
+        "{value} IS NOT NULL AND (sp.agl IS NULL OR ABS(sp.agl - {value}) > {tolerance})",
+    ),
+    'normalized_quality': (
+        "CASE WHEN sp.distance > 0 THEN sp.signal_quality + 20.0 * LOG(sp.distance / 10000.0) END",
+        "(sp.normalized_quality IS NULL) <> ({value} IS NULL) OR ABS(sp.normalized_quality - {value}) > {tolerance}",
+    ),
+    'is_trustworthy': (
+        f"({get_sql_trustworthy(source_table_alias='sp')})",
+        "sp.is_trustworthy IS DISTINCT FROM {value}",
+    ),
+}
+
+# column -> columns which are calculated from it and are recalculated with it
+DEPENDENT_COLUMNS = {
+    'normalized_quality': ('is_trustworthy', ),
+}
+
+# column -> statistics tables which are computed from it (and from its dependent columns)
+DEPENDENT_STATISTICS = {
+    'agl': (),
+    'location_mgrs': ('coverage_statistics', ),
+    'normalized_quality': ('coverage_statistics', ),
+    'is_trustworthy': ('coverage_statistics', ),
+}
+
+
+def get_location_calculation(column):
+    """Returns the calculation in python for columns which depend only on the location (or None).
+
+    The calculation is a tuple of the columns (with SQL types) of the temporary table, a function (longitude, latitude) -> values
+    of these columns (or None if there is no result), the SET clause and the condition for the rows which have to be updated.
+    """
+
+    if column == 'location_mgrs':
+        return (
+            "location_mgrs VARCHAR, location_mgrs_short VARCHAR",
+            lambda longitude, latitude: get_mgrs(latitude, longitude),
+            "location_mgrs = tmp.location_mgrs, location_mgrs_short = tmp.location_mgrs_short",
+            "sp.location_mgrs IS DISTINCT FROM tmp.location_mgrs OR sp.location_mgrs_short IS DISTINCT FROM tmp.location_mgrs_short",
+        )
+
+    # with the SRTM tiles the agl is calculated like in the gateway (otherwise with the elevation raster of the database)
+    elevation_service = get_elevation_service() if column == 'agl' else None
+    if elevation_service is not None:
+        def get_elevation(longitude, latitude):
+            elevation = elevation_service.get_elevation(latitude, longitude)
+            return None if elevation is None else (elevation, )
+
+        return (
+            "elevation DOUBLE PRECISION",
+            get_elevation,
+            "agl = sp.altitude - tmp.elevation",
+            f"sp.altitude IS NOT NULL AND (sp.agl IS NULL OR ABS(sp.agl - (sp.altitude - tmp.elevation)) > {FLOAT_TOLERANCE})",
+        )
+
+    return None
+
+
+def get_chunks(start, end):
+    """Returns the names of the TimescaleDB chunks of sender_positions with beacons from start to end."""
+
+    # the chunks at the borders could be missing with the exact times, the rows are filtered anyway
+    rows = db.session.execute(
+        "SELECT show_chunks('sender_positions', older_than => :end, newer_than => :start)::TEXT;",
+        {'start': start - timedelta(days=1), 'end': end + timedelta(days=1)},
+    ).fetchall()
+    db.session.remove()
+
+    return [row[0] for row in rows]
+
+
+def update_column(cursor, chunk, column, parameters):
+    """Recalculate the column in SQL for the beacons from start to end within the chunk. Returns the number of changed rows."""
+
+    value, condition = SQL_CALCULATIONS[column]
+    cursor.execute(f"""
+        UPDATE {chunk} AS sp
+        SET {column} = {value}
+        WHERE sp.reference_timestamp >= %(start)s AND sp.reference_timestamp < %(end)s AND ({condition.format(value=value, tolerance=FLOAT_TOLERANCE)});
+    """, parameters)
+
+    return cursor.rowcount
+
+
+def init_reprocess_worker(config_name):
+    app = create_app(config_name)
+    app.app_context().push()
+
+
+def reprocess_chunk(job):
+    """Recalculate the column (and its dependent columns) of the beacons from start to end within the chunk (one transaction).
+
+    Returns the chunk and the number of rows with a changed column.
+    """
+
+    chunk, column, start, end = job
+    parameters = {'start': start, 'end': end}
+
+    connection = db.engine.raw_connection()
+    cursor = connection.cursor()
+    try:
+        # compressed chunks cannot be updated: decompress them and compress them again after the update
+        cursor.execute("SELECT compressed_chunk_id IS NOT NULL FROM _timescaledb_catalog.chunk WHERE format('%%I.%%I', schema_name, table_name)::regclass = %(chunk)s::regclass;", {'chunk': chunk})
+        is_compressed = cursor.fetchone()[0]
+        if is_compressed:
+            cursor.execute("SELECT decompress_chunk(%(chunk)s::regclass);", {'chunk': chunk})
+
+        location_calculation = get_location_calculation(column)
+        if location_calculation is None:
+            changed_rows = update_column(cursor, chunk, column, parameters)
+        else:
+            tmp_columns, calculate, set_clause, condition = location_calculation
+            tmp_tablename = f"reprocess_{os.getpid()}"
+            cursor.execute(f"CREATE TEMPORARY TABLE {tmp_tablename} (longitude DOUBLE PRECISION, latitude DOUBLE PRECISION, {tmp_columns}) ON COMMIT DROP;")
+
+            # calculate the values of each location once (stationary senders send the same location again and again)
+            location_cursor = connection.cursor(name=f"{tmp_tablename}_locations")
+            location_cursor.execute(f"""
+                SELECT DISTINCT ST_X(sp.location), ST_Y(sp.location)
+                FROM {chunk} AS sp
+                WHERE sp.reference_timestamp >= %(start)s AND sp.reference_timestamp < %(end)s AND sp.location IS NOT NULL;
+            """, parameters)
+            while True:
+                locations = location_cursor.fetchmany(REPROCESS_FETCH_ROWS)
+                if not locations:
+                    break
+
+                lines = []
+                for longitude, latitude in locations:
+                    values = calculate(longitude, latitude)
+                    if values is not None:
+                        lines.append("\t".join(map(str, (longitude, latitude) + tuple(values))) + "\n")
+                cursor.copy_expert(f"COPY {tmp_tablename} FROM STDIN", IteratorFile(lines))
+            location_cursor.close()
+
+            cursor.execute(f"""
+                UPDATE {chunk} AS sp
+                SET {set_clause}
+                FROM {tmp_tablename} AS tmp
+                WHERE
+                    sp.reference_timestamp >= %(start)s AND sp.reference_timestamp < %(end)s
+                    AND ST_X(sp.location) = tmp.longitude AND ST_Y(sp.location) = tmp.latitude
+                    AND ({condition});
+            """, parameters)
+            changed_rows = cursor.rowcount
+
+        # otherwise the dependent columns would be stale
+        for dependent_column in DEPENDENT_COLUMNS.get(column, ()):
+            update_column(cursor, chunk, dependent_column, parameters)
+
+        if is_compressed:
+            cursor.execute("SELECT compress_chunk(%(chunk)s::regclass);", {'chunk': chunk})
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+    return chunk, changed_rows
+
+
+class ReprocessState:
+    """The chunks which are done for a reprocessing (column, start, end), saved as json file to resume the reprocessing."""
+
+    def __init__(self, path, column, start, end):
+        self.path = path
+        self.key = f"{column} {start.isoformat()} {end.isoformat()}"
+
+        self.state = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+        self.done = set(self.state.get(self.key, []))
+
+    def add(self, chunk):
+        self.done.add(chunk)
+        self.state[self.key] = sorted(self.done)
+
+        # write a new file and replace the old one, so a crash never leaves a broken state
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.path)
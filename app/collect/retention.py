@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+
+# columns of the sender positions which are kept in sender_positions_downsampled
+DOWNSAMPLED_COLUMNS = (
+    'reference_timestamp', 'name', 'receiver_name', 'timestamp', 'location', 'track', 'ground_speed', 'altitude',
+    'address', 'aircraft_type', 'climb_rate', 'turn_rate', 'error_count', 'normalized_quality', 'agl', 'is_trustworthy',
+)
+
+
+def get_raw_data_lookback(config):
+    """Returns how far back (timedelta) the scheduled tasks read the full-rate sender positions.
+
+    The statistics and the logbook of today and of the previous day are always computed from the sender positions,
+    the kwargs of the CELERYBEAT_SCHEDULE can extend this (e.g. 'last_minutes' of update_takeoff_landings).
+    """
+
+    lookback = timedelta(days=2)
+    for entry in config.get("CELERYBEAT_SCHEDULE", {}).values():
+        kwargs = entry.get("kwargs", {})
+        if "last_minutes" in kwargs:
+            lookback = max(lookback, timedelta(minutes=kwargs["last_minutes"]))
+        for key in ("offset_days", "day_offset"):
+            if kwargs.get(key) is not None:
+                lookback = max(lookback, timedelta(days=abs(kwargs[key]) + 1))
+
+    return lookback
+
+
+def validate_retention_config(config):
+    """Raise a ValueError if the retention would drop sender positions which are still needed (or if it is inconsistent)."""
+
+    raw_days = config["RETENTION_RAW_DAYS"]
+    if raw_days is None:
+        return
+
+    # one more day for the transfer lag and the refresh of the continuous aggregates
+    min_raw_days = get_raw_data_lookback(config).days + 1
+    if raw_days < min_raw_days:
+        raise ValueError(f"RETENTION_RAW_DAYS must be at least {min_raw_days} (logbook, flights and statistics read the sender positions of the last {min_raw_days - 1} days), got {raw_days}")
+
+    if config["RETENTION_DOWNSAMPLE_INTERVAL"] <= 0:
+        raise ValueError(f"RETENTION_DOWNSAMPLE_INTERVAL must be positive, got {config['RETENTION_DOWNSAMPLE_INTERVAL']}")
+
+    downsampled_months = config["RETENTION_DOWNSAMPLED_MONTHS"]
+    if downsampled_months is not None and downsampled_months * 28 <= raw_days:
+        raise ValueError(f"RETENTION_DOWNSAMPLED_MONTHS ({downsampled_months} months) must be longer than RETENTION_RAW_DAYS ({raw_days} days)")
+
+
+def get_continuous_aggregates(tablename):
+    """Returns the TimescaleDB continuous aggregates of the hypertable."""
+
+    rows = db.session.execute("""
+        SELECT format('%I.%I', ca.user_view_schema, ca.user_view_name)
+        FROM _timescaledb_catalog.continuous_agg AS ca
+        INNER JOIN _timescaledb_catalog.hypertable AS h ON ca.raw_hypertable_id = h.id
+        WHERE h.table_name = :tablename;
+    """, {'tablename': tablename}).fetchall()
+
+    return [row[0] for row in rows]
+
+
+def downsample_sender_positions(end, interval):
+    """Copy one sender position per sender and interval (seconds) with the lowest error_count into sender_positions_downsampled.
+
+    It starts after the last downsampled day (or with the first sender position) and ends before 'end', one transaction per day.
+    Returns the number of downsampled positions.
+    """
+
+    start = db.session.execute("SELECT date_trunc('day', MAX(reference_timestamp)) + INTERVAL '1 day' FROM sender_positions_downsampled;").scalar()
+    if start is None:
+        start = db.session.execute("SELECT date_trunc('day', MIN(reference_timestamp)) FROM sender_positions;").scalar()
+    if start is None:
+        return 0
+
+    columns = ", ".join(DOWNSAMPLED_COLUMNS)
+    sp_columns = ", ".join(f"sp.{column}" for column in DOWNSAMPLED_COLUMNS)
+
+    downsampled_rows = 0
+    while start < end:
+        day_end = min(start + timedelta(days=1), end)
+        result = db.session.execute(f"""
+            INSERT INTO sender_positions_downsampled({columns})
+            SELECT DISTINCT ON (sp.name, time_bucket(INTERVAL '{interval} seconds', sp.timestamp))
+                {sp_columns}
+            FROM sender_positions AS sp
+            WHERE sp.reference_timestamp >= :start AND sp.reference_timestamp < :end AND sp.name IS NOT NULL AND sp.location IS NOT NULL
+            ORDER BY sp.name, time_bucket(INTERVAL '{interval} seconds', sp.timestamp), sp.error_count NULLS LAST, sp.normalized_quality DESC NULLS LAST, sp.timestamp
+            ON CONFLICT DO NOTHING;
+        """, {'start': start, 'end': day_end})
+        db.session.commit()
+
+        downsampled_rows += result.rowcount
+        start = day_end
+
+    return downsampled_rows
+
+
+def drop_sender_positions(older_than):
+    """Drop the chunks of sender_positions older than 'older_than' (the continuous aggregates keep their data). Returns the number of dropped chunks."""
+
+    continuous_aggregates = get_continuous_aggregates('sender_positions')
+    for view_name in continuous_aggregates:
+        # without this the continuous aggregate would forget the materialized buckets of the dropped chunks
+        db.session.execute(f"ALTER VIEW {view_name} SET (timescaledb.ignore_invalidation_older_than = '{(datetime.utcnow() - older_than).days} days');")
+
+    cascade = ", cascade_to_materializations => FALSE" if continuous_aggregates else ""
+    dropped_chunks = db.session.execute(f"SELECT drop_chunks(older_than => :older_than, table_name => 'sender_positions'{cascade});", {'older_than': older_than}).fetchall()
+    db.session.commit()
+
+    return len(dropped_chunks)
+
+
+def purge_old_data():
+    """Downsample the sender positions older than RETENTION_RAW_DAYS, drop them and drop the downsampled positions older than RETENTION_DOWNSAMPLED_MONTHS."""
+
+    config = current_app.config
+    if config["RETENTION_RAW_DAYS"] is None:
+        return "Retention is disabled (RETENTION_RAW_DAYS is None)."
+    validate_retention_config(config)
+
+    # only whole days, so the downsampling and the 3 hour chunks end at the same time
+    now = datetime.utcnow()
+    older_than = datetime(now.year, now.month, now.day) - timedelta(days=config["RETENTION_RAW_DAYS"])
+
+    downsampled_rows = downsample_sender_positions(end=older_than, interval=config["RETENTION_DOWNSAMPLE_INTERVAL"])
+    dropped_chunks = drop_sender_positions(older_than=older_than)
+
+    dropped_downsampled_chunks = 0
+    if config["RETENTION_DOWNSAMPLED_MONTHS"] is not None:
+        rows = db.session.execute(f"SELECT drop_chunks(older_than => INTERVAL '{config['RETENTION_DOWNSAMPLED_MONTHS']} months', table_name => 'sender_positions_downsampled');").fetchall()
+        db.session.commit()
+        dropped_downsampled_chunks = len(rows)
+
+    message = f"Downsampled {downsampled_rows} sender positions older than {older_than}, dropped {dropped_chunks} chunks of sender_positions and {dropped_downsampled_chunks} chunks of sender_positions_downsampled."
+    current_app.logger.info(message)
+    return message
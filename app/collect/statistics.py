@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+from app import db
+from app.collect.retention import get_continuous_aggregates
+from app.gateway.statistics_aggregator import STATISTICS_REBUILD_LOCK
+from app.tasks.sql_tasks import update_statistics
+
+# statistics table -> SQL which computes its rows of the days from :first_day to :end_day again from the hypertables
+REBUILD_STATISTICS_SQL = {
+    'sender_position_statistics': """
+        DELETE FROM sender_position_statistics WHERE date >= :first_day AND date < :end_day;
+
+        INSERT INTO sender_position_statistics (date, sender_id, dstcall, address_type, aircraft_type, stealth, software_version, hardware_version, messages_count)
+        SELECT
+            sp.reference_timestamp::DATE AS date,
+            s.id AS sender_id,
+            sp.dstcall,
+            sp.address_type,
+            sp.aircraft_type,
+            sp.stealth,
+            sp.software_version,
+            sp.hardware_version,
+            COUNT(sp.*) AS messages_count
+        FROM sender_positions AS sp INNER JOIN senders AS s ON sp.name = s.name
+        WHERE sp.reference_timestamp >= :first_day AND sp.reference_timestamp < :end_day
+        GROUP BY date, s.id, sp.dstcall, sp.address_type, sp.aircraft_type, sp.stealth, sp.software_version, sp.hardware_version;
+    """,
+    'coverage_statistics': """
+        DELETE FROM coverage_statistics WHERE date >= :first_day AND date < :end_day;
+
+        INSERT INTO coverage_statistics (date, location_mgrs_short, sender_id, receiver_id, is_trustworthy, max_distance, max_normalized_quality, max_signal_quality, min_altitude, max_altitude, messages_count)
+        SELECT
+            sp.reference_timestamp::DATE AS date,
+            sp.location_mgrs_short,
+            s.id AS sender_id,
+            r.id AS receiver_id,
+
+            sp.is_trustworthy,
+
+            MAX(sp.distance) AS max_distance,
+            MAX(sp.normalized_quality) AS max_normalized_quality,
+            MAX(sp.signal_quality) AS max_signal_quality,
+            MIN(sp.altitude) AS min_altitude,
+            MAX(sp.altitude) AS max_altitude,
+            COUNT(sp.*) AS messages_count
+        FROM sender_positions AS sp
+        INNER JOIN senders AS s ON sp.name = s.name
+        INNER JOIN receivers AS r ON sp.receiver_name = r.name
+        WHERE sp.reference_timestamp >= :first_day AND sp.reference_timestamp < :end_day
+        GROUP BY date, sp.location_mgrs_short, s.id, r.id, sp.is_trustworthy;
+    """,
+    'receiver_status_statistics': """
+        DELETE FROM receiver_status_statistics WHERE date >= :first_day AND date < :end_day;
+
+        INSERT INTO receiver_status_statistics (date, receiver_id, version, platform, messages_count)
+        SELECT
+            rs.reference_timestamp::DATE AS date,
+            r.id AS receiver_id,
+            COALESCE(rs.version, ''),
+            COALESCE(rs.platform, ''),
+            COUNT(rs.*) AS messages_count
+        FROM receiver_statuses AS rs INNER JOIN receivers AS r ON rs.name = r.name
+        WHERE rs.reference_timestamp >= :first_day AND rs.reference_timestamp < :end_day
+        GROUP BY rs.reference_timestamp::DATE, r.id, COALESCE(rs.version, ''), COALESCE(rs.platform, '');
+    """,
+}
+
+
+def rebuild_statistics(first_day, end_day, tablenames=tuple(REBUILD_STATISTICS_SQL)):
+    """Compute the statistics of the days from first_day (inclusive) to end_day (exclusive) again.
+
+    The tables are computed from the hypertables (not incrementally like in the transfer), so the whole day is correct
+    after an import or after a reprocessing of the sender positions. Then the daily statistics which depend on them are updated.
+
+    A running transfer waits while a day is rebuilt (one transaction per day). The rebuilt days are recorded in
+    statistics_rebuilds, so the transfers drop their deltas of these days which were aggregated before (no beacon is counted twice).
+    """
+
+    day = first_day
+    while day < end_day:
+        next_day = day + timedelta(days=1)
+
+        db.session.execute("SELECT pg_advisory_xact_lock(:lock);", {'lock': STATISTICS_REBUILD_LOCK})
+        for tablename in tablenames:
+            db.session.execute("INSERT INTO statistics_rebuilds (tablename, date, rebuilt_at) VALUES (:tablename, :date, timezone('utc', now()));", {'tablename': tablename, 'date': day.date()})
+            db.session.execute(REBUILD_STATISTICS_SQL[tablename], {'first_day': day, 'end_day': next_day})
+        db.session.commit()
+
+        update_statistics(day.strftime("%Y-%m-%d"))
+        day = next_day
+
+
+def refresh_continuous_aggregates(tablename):
+    """Refresh the continuous aggregates of the hypertable, e.g. after old rows were updated. Returns the names of the views."""
+
+    view_names = get_continuous_aggregates(tablename)
+    db.session.commit()
+
+    # the materialization runs its own transactions
+    connection = db.engine.raw_connection()
+    try:
+        connection.set_session(autocommit=True)
+        cursor = connection.cursor()
+        for view_name in view_names:
+            cursor.execute(f"REFRESH MATERIALIZED VIEW {view_name};")
+        cursor.close()
+    finally:
+        connection.close()
+
+    return view_names
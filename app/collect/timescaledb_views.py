@@ -1,7 +1,4 @@
 from app import db
-from app.utils import get_sql_trustworthy
-
-SQL_TRUSTWORTHY = get_sql_trustworthy(source_table_alias='sp')
 
 
 def create_views():
@@ -55,7 +52,7 @@ def create_timescaledb_views():
 
     # --- Sender statistics ---
     # These stats will be used in the daily ranking, so we make the bucket < 1d
-    db.session.execute(f"""
+    db.session.execute("""
         DROP VIEW IF EXISTS sender_stats_1h CASCADE;
 
         CREATE VIEW sender_stats_1h
@@ -63,18 +60,18 @@ def create_timescaledb_views():
         SELECT
             time_bucket(INTERVAL '1 hour', sp.reference_timestamp) AS bucket,
             sp.name,
-            ({SQL_TRUSTWORTHY}) AS is_trustworthy,
+            sp.is_trustworthy,
             COUNT(sp.*) AS beacon_count,
             MAX(sp.distance) AS max_distance,
             MIN(sp.altitude) AS min_altitude,
             MAX(sp.altitude) AS max_altitude
 
         FROM sender_positions AS sp
-        GROUP BY bucket, sp.name, is_trustworthy;
+        GROUP BY bucket, sp.name, sp.is_trustworthy;
     """)
 
     # ... and just for curiosity also bucket = 1d
-    db.session.execute(f"""
+    db.session.execute("""
         DROP VIEW IF EXISTS sender_stats_1d CASCADE;
 
         CREATE VIEW sender_stats_1d
@@ -82,19 +79,19 @@ def create_timescaledb_views():
         SELECT
             time_bucket(INTERVAL '1 day', sp.reference_timestamp) AS bucket,
             sp.name,
-            ({SQL_TRUSTWORTHY}) AS is_trustworthy,
+            sp.is_trustworthy,
             COUNT(sp.*) AS beacon_count,
             MAX(sp.distance) AS max_distance,
             MIN(sp.altitude) AS min_altitude,
             MAX(sp.altitude) AS max_altitude
 
         FROM sender_positions AS sp
-        GROUP BY bucket, sp.name, is_trustworthy;
+        GROUP BY bucket, sp.name, sp.is_trustworthy;
     """)
 
     # --- Receiver statistics ---
     # These stats will be used in the daily ranking, so we make the bucket < 1d
-    db.session.execute(f"""
+    db.session.execute("""
         DROP VIEW IF EXISTS receiver_stats_1h CASCADE;
 
         CREATE VIEW receiver_stats_1h
@@ -102,18 +99,18 @@ def create_timescaledb_views():
         SELECT
             time_bucket(INTERVAL '1 hour', sp.reference_timestamp) AS bucket,
             sp.receiver_name,
-            ({SQL_TRUSTWORTHY}) AS is_trustworthy,
+            sp.is_trustworthy,
             COUNT(sp.*) AS beacon_count,
             MAX(sp.distance) AS max_distance,
             MIN(sp.altitude) AS min_altitude,
             MAX(sp.altitude) AS max_altitude
 
         FROM sender_positions AS sp
-        GROUP BY bucket, sp.receiver_name, is_trustworthy;
+        GROUP BY bucket, sp.receiver_name, sp.is_trustworthy;
     """)
 
     # ... and just for curiosity also bucket = 1d
-    db.session.execute(f"""
+    db.session.execute("""
         DROP VIEW IF EXISTS receiver_stats_1d CASCADE;
 
         CREATE VIEW receiver_stats_1d
@@ -121,19 +118,19 @@ def create_timescaledb_views():
         SELECT
             time_bucket(INTERVAL '1 day', sp.reference_timestamp) AS bucket,
             sp.receiver_name,
-            ({SQL_TRUSTWORTHY}) AS is_trustworthy,
+            sp.is_trustworthy,
             COUNT(sp.*) AS beacon_count,
             MAX(sp.distance) AS max_distance,
             MIN(sp.altitude) AS min_altitude,
             MAX(sp.altitude) AS max_altitude
 
         FROM sender_positions AS sp
-        GROUP BY bucket, sp.receiver_name, is_trustworthy;
+        GROUP BY bucket, sp.receiver_name, sp.is_trustworthy;
     """)
 
     # --- Relation statistics (sender <-> receiver) ---
     # these stats will be used on a >= 1d basis, so we make the bucket = 1d
-    db.session.execute(f"""
+    db.session.execute("""
         DROP VIEW IF EXISTS relation_stats_1d CASCADE;
 
         CREATE VIEW relation_stats_1d
@@ -142,13 +139,13 @@ def create_timescaledb_views():
             time_bucket(INTERVAL '1 day', sp.reference_timestamp) AS bucket,
             sp.name,
             sp.receiver_name,
-            ({SQL_TRUSTWORTHY}) AS is_trustworthy,
+            sp.is_trustworthy,
             COUNT(sp.*) AS beacon_count,
             MAX(sp.normalized_quality) AS max_normalized_quality,
             MAX(sp.distance) AS max_distance
 
         FROM sender_positions AS sp
-        GROUP BY bucket, sp.name, sp.receiver_name, is_trustworthy;
+        GROUP BY bucket, sp.name, sp.receiver_name, sp.is_trustworthy;
     """)
 
     db.session.commit()
@@ -2,13 +2,20 @@ from flask import current_app
 from flask.cli import AppGroup
 import click
 
-from datetime import datetime
+from datetime import datetime, timedelta
+import multiprocessing
+import os
 from sqlalchemy.sql import func
+from tqdm import tqdm
 
 from app.model import SenderPosition
 from app.utils import get_airports, get_days
 from app.collect.timescaledb_views import create_timescaledb_views, create_views
-from app.collect.database import read_ddb, read_flarmnet, merge_sender_infos
+from app.collect.compression import COMPRESSION_SETTINGS, enable_compression, compress_chunks, get_chunk_sizes, get_access_path_timings
+from app.collect.retention import purge_old_data, validate_retention_config
+from app.collect.reprocess import REPROCESS_COLUMNS, DEPENDENT_STATISTICS, ReprocessState, get_chunks, init_reprocess_worker, reprocess_chunk
+from app.collect.statistics import rebuild_statistics, refresh_continuous_aggregates
+from app.collect.database import read_ddb, read_flarmnet, merge_sender_infos, link_sender_infos
 
 from app import db
 
@@ -60,6 +67,7 @@ def init():
     # Change (sender|receiver)_positions to TimescaleDB table
     db.session.execute("SELECT create_hypertable('sender_positions', 'reference_timestamp', chunk_time_interval => interval '3 hours', if_not_exists => TRUE);")
     db.session.execute("SELECT create_hypertable('receiver_positions', 'reference_timestamp', chunk_time_interval => interval '1 day', if_not_exists => TRUE);")
+    db.session.execute("SELECT create_hypertable('sender_positions_downsampled', 'reference_timestamp', chunk_time_interval => interval '7 days', if_not_exists => TRUE);")
     db.session.commit()
 
     print("Initialized the database (with PostGIS and TimescaleDB extensions).")
@@ -131,3 +139,118 @@ def cmd_create_views():
 
     create_views()
     print("Done")
+
+
+@user_cli.command("reprocess")
+@click.option("--column", required=True, type=click.Choice(REPROCESS_COLUMNS), help="Column of the sender positions (location_mgrs: also location_mgrs_short, normalized_quality: also is_trustworthy).")
+@click.option("--start", required=True, help="First day (YYYY-MM-DD).")
+@click.option("--end", required=True, help="Last day (YYYY-MM-DD).")
+@click.option("--jobs", default=1, help="Number of chunks which are processed in parallel.")
+@click.option("--state", "state_path", default="reprocess_state.json", help="File with the finished chunks (to resume the reprocessing).")
+def cmd_reprocess(column, start, end, jobs, state_path):
+    """Recompute a derived column of the sender positions chunk by chunk (e.g. after an update of the elevation data or a parser fix).
+
+    Afterwards the statistics of these days which depend on the column are computed again and the continuous aggregates are refreshed.
+    """
+
+    start = datetime.strptime(start, "%Y-%m-%d")
+    end = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)
+
+    state = ReprocessState(state_path, column, start, end)
+    chunks = [chunk for chunk in get_chunks(start, end) if chunk not in state.done]
+    print(f"Reprocess '{column}' from {start} to {end}: {len(chunks)} chunks ({len(state.done)} already done)")
+
+    if chunks:
+        changed_rows = 0
+        config_name = os.getenv('FLASK_CONFIG') or 'default'
+        with multiprocessing.Pool(min(jobs, len(chunks)), initializer=init_reprocess_worker, initargs=(config_name, )) as pool:
+            pbar = tqdm(total=len(chunks), unit=" chunks")
+            for chunk, chunk_changed_rows in pool.imap_unordered(reprocess_chunk, [(chunk, column, start, end) for chunk in chunks]):
+                state.add(chunk)
+                changed_rows += chunk_changed_rows
+                pbar.update()
+            pbar.close()
+
+        print(f"Updated {changed_rows} sender positions.")
+
+    # also if all chunks were done before: an interrupted run could have stopped before this
+    tablenames = DEPENDENT_STATISTICS[column]
+    if tablenames:
+        print(f"Rebuild {', '.join(tablenames)} (and the daily statistics) from {start.date()} to {end.date()}")
+        rebuild_statistics(start, end, tablenames)
+
+    view_names = refresh_continuous_aggregates('sender_positions')
+    print(f"Refreshed the continuous aggregates: {', '.join(view_names) or 'none'}")
+
+
+@user_cli.command("enable_compression")
+@click.option("--compress_after", default=None, help="Compress the chunks older than this interval (default: TIMESCALEDB_COMPRESS_AFTER).")
+def cmd_enable_compression(compress_after):
+    """Enable the TimescaleDB compression of the position hypertables and add a compression policy."""
+
+    if compress_after is None:
+        compress_after = current_app.config["TIMESCALEDB_COMPRESS_AFTER"]
+    enable_compression(compress_after=compress_after)
+    print(f"Enabled the compression of {', '.join(COMPRESSION_SETTINGS)}: chunks older than '{compress_after}' will be compressed.")
+
+
+@user_cli.command("compress")
+@click.option("--compress_after", default=None, help="Compress the chunks older than this interval (default: TIMESCALEDB_COMPRESS_AFTER).")
+def cmd_compress(compress_after):
+    """Compress the old chunks now (without waiting for the compression policy)."""
+
+    if compress_after is None:
+        compress_after = current_app.config["TIMESCALEDB_COMPRESS_AFTER"]
+    compressed_chunks = compress_chunks(compress_after=compress_after)
+    print(f"Compressed {compressed_chunks} chunks.")
+
+
+@user_cli.command("compression_report")
+@click.option("--timings/--no-timings", default=True, help="Time the IGC and logbook queries in a compressed and an uncompressed chunk.")
+def cmd_compression_report(timings):
+    """Show the compression ratio per chunk and the query times of the IGC and logbook access paths."""
+
+    def format_bytes(value):
+        return "-" if value is None else f"{value / 1024 / 1024:.1f} MiB"
+
+    for tablename in COMPRESSION_SETTINGS:
+        chunk_sizes = get_chunk_sizes(tablename)
+        print(f"{tablename}:")
+        print(f"  {'chunk':<45} {'start':<20} {'before':>12} {'after':>12} {'ratio':>7}")
+        uncompressed_bytes = compressed_bytes = 0
+        for row in chunk_sizes:
+            ratio = f"{row.uncompressed_bytes / row.compressed_bytes:.1f}" if row.is_compressed and row.compressed_bytes else "-"
+            print(f"  {row.chunk:<45} {row.range_start:%Y-%m-%d %H:%M}     {format_bytes(row.uncompressed_bytes):>12} {format_bytes(row.compressed_bytes):>12} {ratio:>7}")
+            if row.is_compressed:
+                uncompressed_bytes += row.uncompressed_bytes
+                compressed_bytes += row.compressed_bytes
+        compressed_chunks = sum(1 for row in chunk_sizes if row.is_compressed)
+        ratio = f"{uncompressed_bytes / compressed_bytes:.1f}" if compressed_bytes else "-"
+        print(f"  {compressed_chunks} of {len(chunk_sizes)} chunks compressed: {format_bytes(uncompressed_bytes)} -> {format_bytes(compressed_bytes)} (ratio {ratio})")
+
+        if timings and tablename == 'sender_positions':
+            for label, (chunk, name, execution_times) in get_access_path_timings(chunk_sizes).items():
+                print(f"  {label} chunk {chunk}, sender {name}:")
+                for path, execution_time in execution_times.items():
+                    print(f"    {path:<25} {execution_time:10.1f} ms")
+
+
+@user_cli.command("purge")
+@click.option("--check", is_flag=True, help="Only check the retention configuration.")
+def cmd_purge(check):
+    """Downsample and drop the old sender positions (see RETENTION_RAW_DAYS)."""
+
+    validate_retention_config(current_app.config)
+    if check:
+        print("The retention configuration is valid.")
+        return
+
+    print(purge_old_data())
+
+
+@user_cli.command("link_sender_infos")
+def cmd_link_sender_infos():
+    """Check and set the relation of all sender_infos to the senders."""
+
+    changed_rows = link_sender_infos()
+    print(f"Linked {changed_rows} sender_infos.")
@@ -1,5 +1,9 @@
 import os
-from datetime import datetime, timezone
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import multiprocessing
+import queue
+import threading
 import time
 
 from flask import current_app
@@ -10,9 +14,14 @@ from tqdm import tqdm
 from ogn.client import AprsClient
 
 from app import redis_client
-from app.gateway.beacon_conversion import aprs_string_to_message
-from app.gateway.message_handling import receiver_status_message_to_csv_string, receiver_position_message_to_csv_string, sender_position_message_to_csv_string
-from app.collect.gateway import transfer_from_redis_to_database
+from app.gateway.archive import ArchiveWriter
+from app.gateway.beacon_conversion import aprs_string_to_csv_string, warm_receiver_position_cache, receiver_position_cache, rejection_counter
+from app.gateway.log_import import ImportState, get_imported_files, get_reference_timestamp, init_import_worker, import_file, rebuild_after_import
+from app.gateway.parse_pool import ParsePool
+from app.gateway.redis_writer import RedisBatchWriter
+from app.gateway.spool import Spool
+from app.gateway.transport import get_transport, REDIS_TARGETS
+from app.collect.gateway import transfer_from_redis_to_database, follow_redis_to_database
 
 user_cli = AppGroup("gateway")
 user_cli.help = "Connection to APRS servers."
@@ -20,7 +29,9 @@ user_cli.help = "Connection to APRS servers."
 
 @user_cli.command("run")
 @click.option("--aprs_filter", default='')
-def run(aprs_filter):
+@click.option("--workers", default=0, help="Number of parser processes (0: parse within the aprs client).")
+@click.option("--queue_size", default=10000, help="Max. number of lines waiting for each parser process.")
+def run(aprs_filter, workers, queue_size):
     """
     Run the aprs client, parse the incoming data and put it to redis.
     """
@@ -28,62 +39,275 @@ def run(aprs_filter):
     import logging
     logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)-17s %(levelname)-8s %(message)s')
 
-    current_app.logger.warning("Start ogn gateway")
+    logger = current_app.logger
+    logger.warning("Start ogn gateway")
     client = AprsClient(current_app.config['APRS_USER'], aprs_filter)
     client.connect()
 
-    def insert_into_redis(aprs_string):
-        # Convert aprs_string to message dict, add MGRS Position, flatten gps precision, etc. etc. ...
-        message = aprs_string_to_message(aprs_string)
-        if message is None:
-            return
-
-        # separate between tables (receiver/sender) and aprs_type (status/position)
-        if message['beacon_type'] in ('aprs_receiver', 'receiver'):
-            if message['aprs_type'] == 'status':
-                redis_target = 'receiver_status'
-                csv_string = receiver_status_message_to_csv_string(message, none_character=r'\N')
-            elif message['aprs_type'] == 'position':
-                redis_target = 'receiver_position'
-                csv_string = receiver_position_message_to_csv_string(message, none_character=r'\N')
-            else:
-                return
-        else:
-            if message['aprs_type'] == 'status':
-                return  # no interesting data we want to keep
-            elif message['aprs_type'] == 'position':
-                redis_target = 'sender_position'
-                csv_string = sender_position_message_to_csv_string(message, none_character=r'\N')
-            else:
-                return
-
-        mapping = {csv_string: str(time.time())}
-
-        redis_client.zadd(name=redis_target, mapping=mapping, nx=True)
+    pool = None
+    if workers > 0:
+        pool = ParsePool(workers=workers, queue_size=queue_size, submit_timeout=current_app.config['GATEWAY_PARSE_SUBMIT_TIMEOUT'])
+        pool.start()
+        logger.info(f"Started {workers} parser processes")
+
+    spool = get_spool()
+    if spool is not None and not spool.is_empty():
+        logger.warning(f"Replay the spool: {spool.get_statistics_message()}")
+
+    redis_writer = RedisBatchWriter(
+        get_transport(),
+        batch_size=current_app.config['GATEWAY_REDIS_BATCH_SIZE'],
+        batch_interval=current_app.config['GATEWAY_REDIS_BATCH_INTERVAL'],
+        spool=spool,
+        retry_interval=current_app.config['GATEWAY_SPOOL_RETRY_INTERVAL'],
+        replay_rows=current_app.config['GATEWAY_SPOOL_REPLAY_ROWS'],
+        logger=logger,
+    )
+
+    archive = get_archive()
+    if archive is not None:
+        archive.start()
+        logger.info(f"Archive the raw beacons in '{archive.path}'")
+
+    def log_statistics():
+        message = f"{insert_into_redis.beacon_counter:7d}/min"
+        if pool is not None:
+            worker_counters = pool.get_counters()
+            worker_rates = ' '.join(f"{current - last:6d}" for current, last in zip(worker_counters, insert_into_redis.last_worker_counters))
+            message += f" (parsed per worker: {worker_rates})"
+            insert_into_redis.last_worker_counters = worker_counters
+
+            dropped = pool.dropped + write_results.dropped
+            if dropped > insert_into_redis.last_dropped:
+                message += f", dropped: {dropped - insert_into_redis.last_dropped}"
+            insert_into_redis.last_dropped = dropped
+
+        rejections = rejection_counter.copy() if pool is None else pool.get_rejection_counter()
+        rejection_rates = ', '.join(f"{reason} {count - insert_into_redis.last_rejections[reason]}" for reason, count in rejections.items() if count > insert_into_redis.last_rejections[reason])
+        message += f", rejected: {rejection_rates or 'none'}"
+        insert_into_redis.last_rejections = rejections
+
+        receiver_cache_counts = (receiver_position_cache.hits, receiver_position_cache.misses) if pool is None else pool.get_receiver_cache_counts()
+        hits, misses = (current - last for current, last in zip(receiver_cache_counts, insert_into_redis.last_receiver_cache_counts))
+        message += f", receiver cache: {100 * hits / max(hits + misses, 1):.1f}% hits ({misses} misses)"
+        insert_into_redis.last_receiver_cache_counts = receiver_cache_counts
+
+        message += f", redis: {redis_writer.get_statistics_message()}"
+        if archive is not None:
+            message += f", archive: {archive.get_statistics_message()}"
+        logger.info(message)
+
+        insert_into_redis.beacon_counter = 0
+        redis_writer.reset_statistics()
+
+    def insert_into_redis(redis_target, csv_string):
+        redis_writer.add(redis_target, csv_string)
         insert_into_redis.beacon_counter += 1
 
         current_minute = datetime.utcnow().minute
         if current_minute != insert_into_redis.last_minute:
-            current_app.logger.info(f"{insert_into_redis.beacon_counter:7d}/min")
-            insert_into_redis.beacon_counter = 0
+            log_statistics()
         insert_into_redis.last_minute = current_minute
 
     insert_into_redis.beacon_counter = 0
     insert_into_redis.last_minute = datetime.utcnow().minute
+    insert_into_redis.last_worker_counters = [0] * workers
+    insert_into_redis.last_rejections = Counter()
+    insert_into_redis.last_receiver_cache_counts = (0, 0)
+    insert_into_redis.last_dropped = 0
+
+    if pool is None:
+        warm_receiver_position_cache()
+
+        # flush the last rows even if the feed is quiet and no new beacon triggers it
+        redis_writer.start_timer()
+
+        def process_aprs_string(aprs_string):
+            result = aprs_string_to_csv_string(aprs_string)
+            if result is not None:
+                insert_into_redis(*result)
+    else:
+        # The aprs client just reads the lines and the parser processes do the work.
+        # The results are put into redis by a separate thread.
+        stop_event = threading.Event()
+
+        def write_results():
+            while not stop_event.is_set():
+                try:
+                    for redis_target, csv_string in pool.get_results(timeout=redis_writer.batch_interval):
+                        insert_into_redis(redis_target, csv_string)
+                    redis_writer.flush_if_due()
+                except Exception:
+                    # without a spool we can't keep the rows (redis is unreachable), but the thread must go on:
+                    # if it died the queues would fill up and the aprs client would only drop lines
+                    write_results.dropped += redis_writer.row_count
+                    logger.exception(f"Failed to write the parsed beacons to redis, dropped {redis_writer.row_count} rows")
+                    redis_writer.clear_rows()
+                    stop_event.wait(redis_writer.retry_interval)
+
+            try:
+                redis_writer.flush()
+            except Exception:
+                logger.exception(f"Failed to write the last parsed beacons to redis, dropped {redis_writer.row_count} rows")
+
+        write_results.dropped = 0
+        writer = threading.Thread(target=write_results, daemon=True)
+        writer.start()
+
+        process_aprs_string = pool.submit
+
+    if archive is not None:
+        parse_aprs_string = process_aprs_string
+
+        def process_aprs_string(aprs_string):
+            archive.add(aprs_string)
+            parse_aprs_string(aprs_string)
 
     try:
-        client.run(callback=insert_into_redis, autoreconnect=True)
+        client.run(callback=process_aprs_string, autoreconnect=True)
     except KeyboardInterrupt:
-        current_app.logger.warning("\nStop ogn gateway")
+        logger.warning("\nStop ogn gateway")
 
     client.disconnect()
 
+    if pool is None:
+        redis_writer.stop_timer()
+        redis_writer.flush()
+    else:
+        pool.stop()
+        stop_event.set()
+        writer.join()
+
+    if spool is not None:
+        spool.close()
+
+    if archive is not None:
+        archive.stop()
+
+
+def get_spool():
+    """Returns the spool of the gateway (None if GATEWAY_SPOOL_PATH is not set)."""
+
+    if not current_app.config['GATEWAY_SPOOL_PATH']:
+        return None
+
+    return Spool(
+        current_app.config['GATEWAY_SPOOL_PATH'],
+        segment_size=current_app.config['GATEWAY_SPOOL_SEGMENT_SIZE'],
+        fsync=current_app.config['GATEWAY_SPOOL_FSYNC'],
+        fsync_interval=current_app.config['GATEWAY_SPOOL_FSYNC_INTERVAL'],
+    )
+
+
+def get_archive():
+    """Returns the archive writer for the raw beacons (None if GATEWAY_ARCHIVE_PATH is not set)."""
+
+    if not current_app.config['GATEWAY_ARCHIVE_PATH']:
+        return None
+
+    return ArchiveWriter(
+        current_app.config['GATEWAY_ARCHIVE_PATH'],
+        compression=current_app.config['GATEWAY_ARCHIVE_COMPRESSION'],
+        queue_size=current_app.config['GATEWAY_ARCHIVE_QUEUE_SIZE'],
+    )
+
 
 @user_cli.command("transfer")
-def transfer():
+@click.option("--follow", is_flag=True, help="Transfer the data continuously.")
+@click.option("--target_latency", type=float, default=None, help="Target duration of a transfer in seconds (with --follow).")
+@click.option("--max_batch_rows", type=int, default=None, help="Max. number of rows per redis target and transfer.")
+def transfer(follow, target_latency, max_batch_rows):
     """Transfer data from redis to the database."""
 
-    transfer_from_redis_to_database()
+    max_batch_rows = max_batch_rows or current_app.config['TRANSFER_MAX_BATCH_ROWS']
+    if not follow:
+        transfer_from_redis_to_database(batch_size=max_batch_rows)
+        return
+
+    import logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)-17s %(levelname)-8s %(message)s')
+
+    target_latency = target_latency or current_app.config['TRANSFER_TARGET_LATENCY']
+    current_app.logger.warning(f"Start transfer (target latency: {target_latency}s, max. batch rows: {max_batch_rows})")
+    try:
+        follow_redis_to_database(target_latency=target_latency, max_batch_rows=max_batch_rows)
+    except KeyboardInterrupt:
+        current_app.logger.warning("\nStop transfer")
+
+
+@user_cli.command("import")
+@click.argument("filenames", nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option("--workers", default=os.cpu_count(), help="Number of processes which parse and copy the files.")
+@click.option("--reference_date", default=None, help="Day of the beacons (YYYY-MM-DD) if it is not in the filenames.")
+@click.option("--state", "state_path", default="import_state.json", help="File with the progress of the import (to resume it).")
+@click.option("--batch_lines", default=50000, help="Number of lines per transaction.")
+def import_logs(filenames, workers, reference_date, state_path, batch_lines):
+    """Import (gzipped) APRS log files directly into the database (without redis).
+
+    An interrupted import continues where it stopped if it is started again with the same state file.
+    The imported lines of each file are stored in the table imported_files together with the beacons,
+    so the lines of a file are never imported twice (delete its row to import it again).
+    """
+
+    filenames = [os.path.abspath(filename) for filename in filenames]
+    state = ImportState(state_path)
+    state.sync(get_imported_files(filenames))
+
+    jobs = []
+    for filename in filenames:
+        if state.is_done(filename):
+            print(f"Skip {filename} (already imported)")
+            continue
+
+        reference_timestamp = datetime.strptime(reference_date, "%Y-%m-%d") + timedelta(hours=12) if reference_date else get_reference_timestamp(filename)
+        if reference_timestamp is None:
+            raise click.BadParameter(f"No date in the filename '{filename}', use --reference_date", param_hint="filenames")
+        jobs.append((filename, state.get_offset(filename), reference_timestamp, batch_lines))
+
+    if jobs:
+        config_name = os.getenv('FLASK_CONFIG') or 'default'
+        progress_queue = multiprocessing.Queue()
+        with multiprocessing.Pool(min(workers, len(jobs)), initializer=init_import_worker, initargs=(config_name, progress_queue)) as pool:
+            result = pool.map_async(import_file, jobs, chunksize=1)
+
+            progress = tqdm(unit=" lines", unit_scale=True, initial=sum(job[1] for job in jobs))
+            done = 0
+            while done < len(jobs):
+                try:
+                    filename, offset, lines, start, end = progress_queue.get(timeout=1)
+                except queue.Empty:
+                    if result.ready() and not result.successful():
+                        break   # a worker failed, result.get() raises its exception
+                    continue
+
+                state.update(filename, offset, start, end)
+                state.save()
+                progress.update(lines)
+                if offset is None:
+                    done += 1
+            progress.close()
+            result.get()
+
+    if state.start is not None and not state.rebuilt:
+        print(f"Update senders, receivers and statistics from {state.start} to {state.end}")
+        rebuild_after_import(state.start, state.end)
+        state.rebuilt = True
+        state.save()
+
+
+@user_cli.command("transport_info")
+def transport_info():
+    """Show the number of rows waiting in redis (and the pending rows of the stream transport) and in the spool of the gateway."""
+
+    transport = get_transport()
+    print(f"Transport: {current_app.config['TRANSPORT']}")
+    for redis_target in REDIS_TARGETS:
+        info = transport.get_info(redis_target)
+        print(f"{redis_target:17s} " + ", ".join(f"{key}: {value:.1f}" if isinstance(value, float) else f"{key}: {value}" for key, value in info.items()))
+
+    spool = get_spool()
+    if spool is not None:
+        print(f"Spool of the gateway: {spool.get_statistics_message()}")
 
 
 @user_cli.command("printout")
@@ -0,0 +1,145 @@
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:     # optional, only needed for GATEWAY_ARCHIVE_COMPRESSION = "zstd"
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+INDEX_SUFFIX = ".json"
+STOP = None                 # sentinel which tells the writer thread to quit
+WRITER_BATCH_SIZE = 1000    # max. number of lines the writer thread takes from the queue at once
+
+
+class ArchiveWriter:
+    """Writes every raw line of the gateway into hourly compressed archive files for a later reprocessing.
+
+    The gateway only puts the lines into a bounded queue (add()), the compression and the writing is done
+    by a background thread. If the queue is full (e.g. the disk is too slow) the lines are dropped and
+    counted instead of slowing down the gateway.
+
+    The files are named by the hour of reception (e.g. OGN_log.txt_2021-06-01_13.gz), so they can be imported
+    with 'flask gateway import'. Each file has a sidecar index (e.g. OGN_log.txt_2021-06-01_13.gz.json) with
+    the number of lines and the first and last time of reception, which is written when the file is closed.
+    If the gateway is restarted within the same hour the lines are appended (as a new gzip member or
+    zstd frame) and the index is continued.
+
+    :param str path: directory of the archive files
+    :param str compression: 'gzip' or 'zstd' (needs the package zstandard)
+    :param int queue_size: max. number of lines waiting for the writer thread
+    """
+
+    def __init__(self, path, compression="gzip", queue_size=100000, compression_level=6):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Unknown compression '{compression}', expected one of {tuple(COMPRESSION_SUFFIXES)}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("The compression 'zstd' needs the package 'zstandard'")
+
+        self.path = path
+        self.compression = compression
+        self.compression_level = compression_level
+
+        os.makedirs(path, exist_ok=True)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+
+        self.file = None
+        self.filename = None
+        self.index = None
+
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        """Write the waiting lines, close the current file and stop the writer thread."""
+
+        self.queue.put(STOP)
+        self.thread.join(timeout)
+
+    def add(self, aprs_string, received=None):
+        """Put the aprs_string (received at this UTC time, default: now) into the queue. Never blocks."""
+
+        try:
+            self.queue.put_nowait((received or datetime.utcnow(), aprs_string))
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        try:
+            while True:
+                items = [self.queue.get()]
+                while len(items) < WRITER_BATCH_SIZE:
+                    try:
+                        items.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                for item in items:
+                    if item is STOP:
+                        return
+                    self.write(*item)
+        finally:
+            self.close_file()
+
+    def write(self, received, aprs_string):
+        filename = self.get_filename(received)
+        if filename != self.filename:
+            self.close_file()
+            self.open_file(filename)
+
+        self.file.write(aprs_string)
+        self.file.write("\n")
+
+        timestamp = received.isoformat()
+        if self.index["first"] is None:
+            self.index["first"] = timestamp
+        self.index["last"] = timestamp
+        self.index["lines"] += 1
+        self.written += 1
+
+    def get_filename(self, received):
+        return os.path.join(self.path, f"OGN_log.txt_{received:%Y-%m-%d_%H}{COMPRESSION_SUFFIXES[self.compression]}")
+
+    def open_file(self, filename):
+        if self.compression == "gzip":
+            self.file = gzip.open(filename, "at", encoding="utf-8", compresslevel=self.compression_level)
+        else:
+            compressor = zstandard.ZstdCompressor(level=self.compression_level)
+            self.file = io.TextIOWrapper(compressor.stream_writer(open(filename, "ab")), encoding="utf-8")
+        self.filename = filename
+
+        index_filename = filename + INDEX_SUFFIX
+        if os.path.exists(index_filename):
+            with open(index_filename) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {"lines": 0, "first": None, "last": None}
+
+    def close_file(self):
+        if self.file is None:
+            return
+
+        self.file.close()
+
+        # write a new index and replace the old one, so a crash never leaves a broken index
+        index_filename = self.filename + INDEX_SUFFIX
+        with open(index_filename + ".tmp", "w") as f:
+            json.dump(self.index, f)
+        os.replace(index_filename + ".tmp", index_filename)
+
+        self.file = None
+        self.filename = None
+        self.index = None
+
+    def get_statistics_message(self):
+        return f"{self.written} lines archived, {self.dropped} dropped, {self.queue.qsize()} waiting"
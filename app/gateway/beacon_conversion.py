@@ -1,52 +1,218 @@
+from collections import Counter
+from functools import lru_cache
+
 from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
 
 from mgrs import MGRS
 
 from ogn.parser import parse
 
+from app import db
 from app.model import AircraftType
-
-#import rasterio as rs
-#elevation_dataset = rs.open('/Volumes/LaCieBlack/Wtf4.tiff')
+from app.gateway.message_handling import SENDER_POSITION_CODEC, RECEIVER_POSITION_CODEC, RECEIVER_STATUS_CODEC
+from app.gateway.elevation import get_elevation_service
+from app.gateway.receiver_cache import ReceiverPositionCache, add_relations
+from app.utils import is_trustworthy
 
 mgrs = MGRS()
+MGRS_CACHE_SIZE = 65536     # coordinates -> MGRS strings of the recently seen positions
+
+RECEIVER_DSTCALLS = ('APRS', 'OGNSDR')  # the status beacons of other dstcalls are from senders
+RECEIVER_BEACON_TYPES = ('aprs_receiver', 'receiver')
+AIRCRAFT_TYPES = {aircraft_type.value: aircraft_type for aircraft_type in AircraftType}   # parser value -> AircraftType (without a list per beacon)
+
+# redis_target -> codec with the record type and the csv encoder of the beacons
+CODECS = {
+    'sender_position': SENDER_POSITION_CODEC,
+    'receiver_position': RECEIVER_POSITION_CODEC,
+    'receiver_status': RECEIVER_STATUS_CODEC,
+}
+
+# receiver name -> last known position for the relations (distance, bearing, normalized_quality) of the sender positions
+receiver_position_cache = ReceiverPositionCache()
+
+# reason -> number of aprs_strings (of this process) we didn't convert
+REJECTION_REASONS = ('server_comment', 'malformed', 'aprs_type', 'ignored_dstcall', 'ignored_name', 'sender_status', 'parse_error')
+rejection_counter = Counter()
+
+
+def preclassify(aprs_string, ignore_dstcalls=(), ignore_names=()):
+    """Cheap classification of the raw aprs_string before the expensive parsing.
+
+    Returns the reason why we don't want the beacon or None if it has to be parsed.
+
+    :param ignore_dstcalls: beacons with these dstcalls are rejected
+    :param tuple ignore_names: beacons with names starting with one of these prefixes are rejected
+    """
+
+    if aprs_string[:1] == '#':
+        return 'server_comment'
+
+    header, separator, body = aprs_string.partition(':')
+    name, separator2, path = header.partition('>')
+    if not separator or not separator2 or not body:
+        return 'malformed'
+
+    aprs_type = body[0]
+    if aprs_type != '/' and aprs_type != '>':
+        return 'aprs_type'
+
+    dstcall = path.split(',', 1)[0]
+    if dstcall in ignore_dstcalls:
+        return 'ignored_dstcall'
+    if ignore_names and name.startswith(ignore_names):
+        return 'ignored_name'
+
+    if aprs_type == '>' and dstcall not in RECEIVER_DSTCALLS:
+        return 'sender_status'
+
+    return None
+
+
+@lru_cache(maxsize=MGRS_CACHE_SIZE)
+def get_mgrs(latitude, longitude):
+    """Returns the MGRS string (1m precision) and the short one (1km precision) of the location.
+
+    Parking aircraft, receivers and other stationary senders send exactly the same coordinates again
+    and again, so the conversion is cached (keyed by the exact coordinates to keep the results identical).
+    """
+
+    location_mgrs = mgrs.toMGRS(latitude, longitude)
+    if isinstance(location_mgrs, bytes):    # mgrs < 1.4 returns bytes
+        location_mgrs = location_mgrs.decode("utf-8")
+
+    return location_mgrs, location_mgrs[0:5] + location_mgrs[5:7] + location_mgrs[10:12]
 
 
-def aprs_string_to_message(aprs_string):
+def warm_receiver_position_cache():
+    """Load the latest receiver positions from the database (the cache starts empty if the database is unreachable)."""
+
+    receiver_position_cache.maxsize = current_app.config['GATEWAY_RECEIVER_CACHE_SIZE']
+    try:
+        rows = db.session.execute("""
+            SELECT name, ST_X(location), ST_Y(location)
+            FROM receivers
+            WHERE location IS NOT NULL
+            ORDER BY lastseen DESC NULLS LAST
+            LIMIT :limit;
+        """, {'limit': receiver_position_cache.maxsize}).fetchall()
+    except SQLAlchemyError as e:
+        current_app.logger.warning(f"Could not load the receiver positions: {e}")
+        return
+    finally:
+        db.session.remove()
+
+    receiver_position_cache.warm(reversed(rows))
+
+
+def aprs_string_to_record(aprs_string, relations=None, reference_timestamp=None):
+    """Convert an aprs_string to a tuple (redis_target, record). Returns None if we don't want to keep the beacon.
+
+    The record has only the fields of its redis target, so the (much bigger) message dict of the parser
+    is dropped right after the conversion.
+    The relations to the receiver (distance, bearing, normalized_quality) are calculated immediately or,
+    if relations is a list, the (record, receiver position) pair is appended for add_relations().
+    The reference_timestamp (default: now) is the time when the beacon was received.
+    """
+
     try:
-        message = parse(aprs_string, calculate_relations=True)
+        message = parse(aprs_string, reference_timestamp=reference_timestamp)
     except Exception as e:
         current_app.logger.debug(e)
+        rejection_counter['parse_error'] += 1
         return None
 
-    if message['aprs_type'] not in ('position', 'status'):
+    aprs_type = message['aprs_type']
+    if aprs_type not in ('position', 'status'):
+        rejection_counter['aprs_type'] += 1
         return None
 
-    elif message['aprs_type'] == 'position':
+    # separate between tables (receiver/sender) and aprs_type (status/position)
+    if message['beacon_type'] in RECEIVER_BEACON_TYPES:
+        redis_target = f"receiver_{aprs_type}"
+    elif aprs_type == 'position':
+        redis_target = 'sender_position'
+    else:
+        rejection_counter['sender_status'] += 1
+        return None     # no interesting data we want to keep
+
+    record = CODECS[redis_target].to_record(message)
+
+    if aprs_type == 'position':
         latitude = message["latitude"]
         longitude = message["longitude"]
 
-        message["location"] = "SRID=4326;POINT({} {})".format(longitude, latitude)
+        record.location = "SRID=4326;POINT({} {})".format(longitude, latitude)
+
+        record.location_mgrs, record.location_mgrs_short = get_mgrs(latitude, longitude)
+
+        elevation_service = get_elevation_service()
+        if elevation_service is not None and message.get('altitude') is not None:
+            elevation = elevation_service.get_elevation(latitude, longitude)
+            if elevation is not None:
+                record.agl = message['altitude'] - elevation
+
+        # every position could be a receiver (e.g. FANET ground stations send FANET beacons)
+        receiver_position_cache.update(message['name'], longitude, latitude)
+
+        if redis_target == 'sender_position':
+            receiver_position = receiver_position_cache.get(message['receiver_name'])
+            if receiver_position is not None:
+                if relations is None:
+                    add_relations([(record, receiver_position)])
+                else:
+                    relations.append((record, receiver_position))
+
+            if "aircraft_type" in message:
+                record.aircraft_type = AIRCRAFT_TYPES.get(message["aircraft_type"], AircraftType.UNKNOWN)
+
+            gps_quality = message.get("gps_quality")
+            if gps_quality is not None and "horizontal" in gps_quality:
+                record.gps_quality_horizontal = gps_quality["horizontal"]
+                record.gps_quality_vertical = gps_quality["vertical"]
+
+    return redis_target, record
+
+
+def record_to_csv_string(redis_target, record):
+    """Convert a record to a csv_string for PostgreSQL COPY."""
+
+    if redis_target == 'sender_position':
+        record.is_trustworthy = is_trustworthy(record.distance, record.normalized_quality, record.error_count, record.climb_rate)
+
+    return CODECS[redis_target].encode_record(record)
+
+
+def aprs_strings_to_csv_strings(aprs_strings):
+    """Convert a micro-batch of aprs_strings to a list of (redis_target, csv_string) for the beacons we want to keep.
+
+    The relations of all sender positions of the batch are calculated at once.
+    """
+
+    ignore_dstcalls = current_app.config['GATEWAY_IGNORE_DSTCALLS']
+    ignore_names = current_app.config['GATEWAY_IGNORE_NAMES']
+
+    records = []
+    relations = []
+    for aprs_string in aprs_strings:
+        rejection_reason = preclassify(aprs_string, ignore_dstcalls, ignore_names)
+        if rejection_reason is not None:
+            rejection_counter[rejection_reason] += 1
+            continue
 
-        location_mgrs = mgrs.toMGRS(latitude, longitude).decode("utf-8")
-        message["location_mgrs"] = location_mgrs
-        message["location_mgrs_short"] = location_mgrs[0:5] + location_mgrs[5:7] + location_mgrs[10:12]
+        # Convert aprs_string to a record, add MGRS Position, flatten gps precision, etc. etc. ...
+        result = aprs_string_to_record(aprs_string, relations)
+        if result is not None:
+            records.append(result)
 
-        #if 'altitude' in message and longitude >= 0.0 and longitude <= 20.0 and latitude >= 40.0 and latitude <= 60.0:
-        #    elevation = [val[0] for val in elevation_dataset.sample(((longitude, latitude),))][0]
-        #    message['agl'] = message['altitude'] - elevation
+    add_relations(relations)
 
-        if 'bearing' in message:
-            bearing = int(message['bearing'])
-            message['bearing'] = bearing if bearing < 360 else 0
+    return [(redis_target, record_to_csv_string(redis_target, record)) for redis_target, record in records]
 
-        if "aircraft_type" in message:
-            message["aircraft_type"] = AircraftType(message["aircraft_type"]) if message["aircraft_type"] in AircraftType.list() else AircraftType.UNKNOWN
 
-        if "gps_quality" in message:
-            if message["gps_quality"] is not None and "horizontal" in message["gps_quality"]:
-                message["gps_quality_horizontal"] = message["gps_quality"]["horizontal"]
-                message["gps_quality_vertical"] = message["gps_quality"]["vertical"]
-            del message["gps_quality"]
+def aprs_string_to_csv_string(aprs_string):
+    """Convert an aprs_string to a tuple (redis_target, csv_string). Returns None if we don't want to keep the beacon."""
 
-    return message
+    results = aprs_strings_to_csv_strings([aprs_string])
+    return results[0] if results else None
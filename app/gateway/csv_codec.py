@@ -0,0 +1,109 @@
+REQUIRED = "required"   # the field must be in the message
+TRUTHY = "truthy"       # missing or falsy values (None, 0, False, '') are written as NULL
+NOT_NONE = "not_none"   # only missing or None values are written as NULL
+
+
+class Column:
+    """Describes how a message field is written into its csv column.
+
+    :param str null_handling: REQUIRED, TRUTHY or NOT_NONE
+    :param converter: function which converts a (not NULL) value before it is written
+    :param str default: written instead of NULL
+    """
+
+    def __init__(self, null_handling=TRUTHY, converter=None, default=None):
+        self.null_handling = null_handling
+        self.converter = converter
+        self.default = default
+
+
+class CsvCodec:
+    """Encodes message dicts (or records) to csv rows for PostgreSQL COPY (or csv files).
+
+    The encoder is generated and compiled once from the list of fields, so encoding a message
+    is a single function call with one f-string instead of a membership test, a lookup and a
+    format call for every column.
+
+    The record_type is a compact class with __slots__ for the fields (and the record_fields which
+    are not written), which can be used instead of the much bigger message dicts.
+
+    :param list fields: the fields in the order of the csv columns
+    :param dict columns: Column definitions for fields which differ from default_column
+    :param str none_character: '' for a file, '\\N' for Postgresql COPY
+    :param list record_fields: additional fields of the record_type
+    """
+
+    def __init__(self, fields, columns=None, default_column=Column(), none_character=r'\N', record_fields=()):
+        self.fields = list(fields)
+        self.columns = [columns.get(field, default_column) if columns else default_column for field in self.fields]
+        self.none_character = none_character
+        self.record_fields = list(record_fields)
+        self.index = {field: i for i, field in enumerate(self.fields)}
+        self.variants = {none_character: self}
+
+        self.encode = self._compile(record=False)
+        self.encode_record = self._compile(record=True)
+        self.record_type, self.to_record = self._compile_record_type()
+
+    def _compile(self, record):
+        namespace = {}
+        expressions = []
+        for i, (field, column) in enumerate(zip(self.fields, self.columns)):
+            null = f"_null_{i}"
+            namespace[null] = column.default if column.default is not None else self.none_character
+            getter = f"record.{field}" if record else f"get({field!r})"
+            required_getter = f"record.{field}" if record else f"message[{field!r}]"
+            if column.converter is None:
+                value = getter
+            else:
+                namespace[f"_convert_{i}"] = column.converter
+                value = f"_convert_{i}({getter})"
+
+            if column.null_handling == REQUIRED:
+                if column.converter is None:
+                    expressions.append(f"{{{required_getter}}}")
+                else:
+                    expressions.append(f"{{_convert_{i}({required_getter})}}")
+            elif column.null_handling == TRUTHY:
+                if column.converter is None:
+                    expressions.append(f"{{{getter} or {null}}}")
+                else:
+                    expressions.append(f"{{{value} if {getter} else {null}}}")
+            elif column.null_handling == NOT_NONE:
+                expressions.append(f"{{{null} if {getter} is None else {value}}}")
+            else:
+                raise ValueError(f"Unknown null handling '{column.null_handling}' for field '{field}'")
+
+        if record:
+            source = "def encode_record(record):\n    return f\"" + ",".join(expressions) + "\\n\"\n"
+        else:
+            source = "def encode(message):\n    get = message.get\n    return f\"" + ",".join(expressions) + "\\n\"\n"
+        exec(compile(source, "<CsvCodec>", "exec"), namespace)
+        return namespace["encode_record" if record else "encode"]
+
+    def _compile_record_type(self):
+        slots = tuple(self.fields + [field for field in self.record_fields if field not in self.index])
+        record_type = type("Record", (), {
+            '__slots__': slots,
+            'as_dict': lambda record: {slot: getattr(record, slot) for slot in slots},
+        })
+
+        source = "def to_record(message):\n    get = message.get\n    record = _new(_record_type)\n"
+        source += "".join(f"    record.{slot} = get({slot!r})\n" for slot in slots)
+        source += "    return record\n"
+        namespace = {'_new': object.__new__, '_record_type': record_type}
+        exec(compile(source, "<CsvCodec>", "exec"), namespace)
+        return record_type, namespace["to_record"]
+
+    def encode_batch(self, messages):
+        """Encode a list of messages into one string with a csv row for each message."""
+
+        return "".join(map(self.encode, messages))
+
+    def with_none_character(self, none_character):
+        """Returns a codec with the same columns but another none_character."""
+
+        if none_character not in self.variants:
+            self.variants[none_character] = CsvCodec(fields=self.fields, columns=dict(zip(self.fields, self.columns)), none_character=none_character, record_fields=self.record_fields)
+
+        return self.variants[none_character]
@@ -0,0 +1,120 @@
+import os
+import re
+import math
+import mmap
+import struct
+from collections import OrderedDict
+
+from flask import current_app
+
+HGT_VOID = -32768    # value of missing data points in .hgt files
+HGT_FILENAME_PATTERN = re.compile(r"^([NS])(\d{2})([EW])(\d{3})\.hgt$", re.IGNORECASE)
+HGT_VALUE = struct.Struct(">h")
+
+
+class HgtTile:
+    """A memory-mapped SRTM .hgt file (big-endian int16, rows from north to south)."""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = int(math.sqrt(len(self.data) // 2))
+        if self.size * self.size * 2 != len(self.data):
+            self.close()
+            raise ValueError(f"File '{path}' is not a valid .hgt file.")
+
+    def get_value(self, row, col):
+        return HGT_VALUE.unpack_from(self.data, 2 * (row * self.size + col))[0]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+class ElevationService:
+    """Elevation lookup from SRTM .hgt tiles (e.g. the unzipped tiles from srtm/tiles.txt).
+
+    The tiles are memory-mapped on demand, at most max_open_tiles are kept open (LRU).
+    """
+
+    def __init__(self, path, max_open_tiles=64):
+        self.max_open_tiles = max_open_tiles
+        self.tile_paths = {}
+        self.open_tiles = OrderedDict()
+
+        for filename in os.listdir(path):
+            match = HGT_FILENAME_PATTERN.match(filename)
+            if match is None:
+                continue
+
+            latitude = int(match.group(2)) * (1 if match.group(1).upper() == "N" else -1)
+            longitude = int(match.group(4)) * (1 if match.group(3).upper() == "E" else -1)
+            self.tile_paths[(latitude, longitude)] = os.path.join(path, filename)
+
+    def get_tile(self, latitude, longitude):
+        """Returns the tile with the south west corner (latitude, longitude) or None if we don't have this tile."""
+
+        key = (latitude, longitude)
+        if key in self.open_tiles:
+            self.open_tiles.move_to_end(key)
+            return self.open_tiles[key]
+
+        if key not in self.tile_paths:
+            return None
+
+        tile = HgtTile(self.tile_paths[key])
+        self.open_tiles[key] = tile
+        if len(self.open_tiles) > self.max_open_tiles:
+            _, oldest_tile = self.open_tiles.popitem(last=False)
+            oldest_tile.close()
+
+        return tile
+
+    def get_elevation(self, latitude, longitude):
+        """Returns the bilinear interpolated elevation or None if there is no data for this location."""
+
+        tile_latitude = math.floor(latitude)
+        tile_longitude = math.floor(longitude)
+        tile = self.get_tile(tile_latitude, tile_longitude)
+        if tile is None:
+            return None
+
+        row = (tile_latitude + 1 - latitude) * (tile.size - 1)
+        col = (longitude - tile_longitude) * (tile.size - 1)
+        row0 = min(int(row), tile.size - 2)
+        col0 = min(int(col), tile.size - 2)
+        dy = row - row0
+        dx = col - col0
+
+        v00 = tile.get_value(row0, col0)
+        v01 = tile.get_value(row0, col0 + 1)
+        v10 = tile.get_value(row0 + 1, col0)
+        v11 = tile.get_value(row0 + 1, col0 + 1)
+        if HGT_VOID in (v00, v01, v10, v11):
+            return None
+
+        return (v00 * (1 - dx) + v01 * dx) * (1 - dy) + (v10 * (1 - dx) + v11 * dx) * dy
+
+    def close(self):
+        for tile in self.open_tiles.values():
+            tile.close()
+        self.open_tiles.clear()
+
+
+_elevation_service = None
+
+
+def get_elevation_service():
+    """Returns the ElevationService configured with ELEVATION_HGT_PATH or None if there is no such path."""
+
+    global _elevation_service
+
+    path = current_app.config.get("ELEVATION_HGT_PATH")
+    if not path:
+        return None
+
+    if _elevation_service is None:
+        _elevation_service = ElevationService(path, max_open_tiles=current_app.config.get("ELEVATION_MAX_OPEN_TILES", 64))
+        current_app.logger.info(f"Elevation service: found {len(_elevation_service.tile_paths)} tiles in '{path}'")
+
+    return _elevation_service
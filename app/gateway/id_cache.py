@@ -0,0 +1,75 @@
+import threading
+
+from psycopg2.extras import execute_values
+
+
+class IdCache:
+    """In-memory map name -> id for the table 'senders' or 'receivers'.
+
+    The map is warmed from the database with the first lookup. Unknown names are selected or,
+    with insert_sql, inserted as minimal rows which are completed later by the upserts.
+
+    :param str tablename: 'senders' or 'receivers'
+    :param str insert_sql: 'INSERT ... VALUES %s ... RETURNING name, id' for missing names (None: don't insert)
+    :param str insert_template: the VALUES template for insert_sql
+    :param str ignore_prefix: names with this prefix don't get an id
+    """
+
+    def __init__(self, tablename, insert_sql=None, insert_template=None, ignore_prefix=None):
+        self.tablename = tablename
+        self.insert_sql = insert_sql
+        self.insert_template = insert_template
+        self.ignore_prefix = ignore_prefix
+
+        self.ids = {}
+        self.warmed = False
+        self.lock = threading.Lock()
+
+    def get_ids(self, cursor, names):
+        """Returns the map name -> id which contains all of the given names known by the database.
+
+        New rows are committed immediately, so the ids are valid even if the caller rolls back.
+        """
+
+        with self.lock:
+            if not self.warmed:
+                cursor.execute(f"SELECT name, id FROM {self.tablename};")
+                self.ids.update(cursor.fetchall())
+                self.warmed = True
+
+            # sorted: concurrent upserts of the same table lock the rows in the same order (no deadlocks)
+            missing_names = sorted(name for name in names if name not in self.ids and not (self.ignore_prefix and name.startswith(self.ignore_prefix)))
+            if missing_names:
+                if self.insert_sql:
+                    rows = execute_values(cursor, self.insert_sql, [(name, ) for name in missing_names], template=self.insert_template, fetch=True)
+                    cursor.connection.commit()
+                else:
+                    cursor.execute(f"SELECT name, id FROM {self.tablename} WHERE name = ANY(%s);", (missing_names, ))
+                    rows = cursor.fetchall()
+                self.ids.update(rows)
+
+            return self.ids
+
+    def update(self, rows):
+        """Add (name, id) rows, e.g. from 'INSERT ... RETURNING name, id' after the commit."""
+
+        with self.lock:
+            self.ids.update(rows)
+
+    def clear(self):
+        with self.lock:
+            self.ids.clear()
+            self.warmed = False
+
+
+sender_id_cache = IdCache(
+    "senders",
+    insert_sql="INSERT INTO senders (name, aircraft_type) VALUES %s ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name RETURNING name, id",
+    insert_template="(%s, 'UNKNOWN')",
+    ignore_prefix="RND",
+)
+receiver_id_cache = IdCache(
+    "receivers",
+    insert_sql="INSERT INTO receivers (name) VALUES %s ON CONFLICT (name) DO UPDATE SET name = EXCLUDED.name RETURNING name, id",
+    insert_template="(%s)",
+)
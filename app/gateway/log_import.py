@@ -0,0 +1,342 @@
+import json
+import os
+import re
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from flask import current_app
+
+from app import create_app, db
+from app.collect.database import link_sender_infos
+from app.collect.statistics import rebuild_statistics
+from app.gateway.beacon_conversion import preclassify, aprs_string_to_record, record_to_csv_string, warm_receiver_position_cache, rejection_counter
+from app.gateway.message_handling import (
+    copy_lines,
+    SENDER_POSITION_BEACON_FIELDS, RECEIVER_POSITION_BEACON_FIELDS, RECEIVER_STATUS_BEACON_FIELDS,
+    SENDER_POSITION_TABLE_PGCOPY_ENCODER, RECEIVER_POSITION_PGCOPY_ENCODER, RECEIVER_STATUS_PGCOPY_ENCODER,
+)
+from app.gateway.process_tools import open_file
+from app.gateway.receiver_cache import add_relations
+from app.gateway.spatial_lookup import get_spatial_lookup
+
+# redis_target -> (table, columns, pgcopy encoder, chunk_time_interval of the hypertable like in 'flask database init')
+IMPORT_TABLES = {
+    'sender_position': ('sender_positions', SENDER_POSITION_BEACON_FIELDS, SENDER_POSITION_TABLE_PGCOPY_ENCODER, timedelta(hours=3)),
+    'receiver_position': ('receiver_positions', RECEIVER_POSITION_BEACON_FIELDS, RECEIVER_POSITION_PGCOPY_ENCODER, timedelta(days=1)),
+    'receiver_status': ('receiver_statuses', RECEIVER_STATUS_BEACON_FIELDS, RECEIVER_STATUS_PGCOPY_ENCODER, timedelta(days=1)),
+}
+
+EPOCH = datetime(1970, 1, 1)    # the chunks of the hypertables are aligned to the epoch
+DATE_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2})(?:_(\d{2})\b)?")
+
+# queue for the progress of the import worker processes (set by init_import_worker)
+progress_queue = None
+
+
+def get_reference_timestamp(filename):
+    """Returns the middle of the day (e.g. OGN_log.txt_2016-09-21) or of the hour (archives of the gateway,
+    e.g. OGN_log.txt_2016-09-21_13.gz) of a log file from its name or None.
+    """
+
+    match = DATE_PATTERN.search(os.path.basename(filename))
+    if match is None:
+        return None
+
+    day = datetime.strptime(match.group(1), "%Y-%m-%d")
+    return day + timedelta(hours=int(match.group(2)), minutes=30) if match.group(2) else day + timedelta(hours=12)
+
+
+def convert_log_lines(aprs_strings, reference_timestamp):
+    """Convert the aprs_strings of a log file to csv strings grouped by (redis_target, chunk).
+
+    The log files don't have the time of reception, so the timestamp of the previous beacon is used as
+    reference_timestamp for the parsing and each beacon gets its own timestamp as reference_timestamp.
+    Returns the groups and the reference_timestamp for the next aprs_strings.
+    """
+
+    ignore_dstcalls = current_app.config['GATEWAY_IGNORE_DSTCALLS']
+    ignore_names = current_app.config['GATEWAY_IGNORE_NAMES']
+
+    records = []
+    relations = []
+    for aprs_string in aprs_strings:
+        rejection_reason = preclassify(aprs_string, ignore_dstcalls, ignore_names)
+        if rejection_reason is not None:
+            rejection_counter[rejection_reason] += 1
+            continue
+
+        result = aprs_string_to_record(aprs_string, relations, reference_timestamp=reference_timestamp)
+        if result is not None:
+            redis_target, record = result
+            record.reference_timestamp = reference_timestamp = record.timestamp
+            records.append(result)
+
+    add_relations(relations)
+
+    groups = {}
+    for redis_target, record in records:
+        chunk_time_interval = IMPORT_TABLES[redis_target][3]
+        chunk = record.reference_timestamp - (record.reference_timestamp - EPOCH) % chunk_time_interval
+        groups.setdefault((redis_target, chunk), []).append(record_to_csv_string(redis_target, record))
+
+    return groups, reference_timestamp
+
+
+def init_import_worker(config_name, queue):
+    global progress_queue
+
+    app = create_app(config_name)
+    app.app_context().push()
+    warm_receiver_position_cache()
+    progress_queue = queue
+
+
+def get_imported_files(filenames):
+    """Returns filename -> (lines, start, end) of the files which are (partially) imported according to the table imported_files."""
+
+    rows = db.session.execute(
+        "SELECT filename, lines, start_time, end_time FROM imported_files WHERE filename = ANY(:filenames);",
+        {'filenames': list(filenames)},
+    ).fetchall()
+    db.session.remove()
+
+    return {filename: (lines, start, end) for filename, lines, start, end in rows}
+
+
+def import_file(job):
+    """COPY the beacons of a log file (from offset, in lines) into the hypertables. Runs in a worker process.
+
+    Each batch of lines is one transaction which also stores the new offset in imported_files, so a crash never
+    leads to duplicate beacons. After the commit (filename, offset, lines, start, end) is put into the progress queue.
+    At the end of the file the offset is None.
+    """
+
+    filename, offset, reference_timestamp, batch_lines = job
+
+    connection = db.engine.raw_connection()
+    cursor = connection.cursor()
+    try:
+        with open_file(filename) as f:
+            lines = (line.strip() for line in islice(f, offset, None))
+            while True:
+                aprs_strings = list(islice(lines, batch_lines))
+                if not aprs_strings:
+                    break
+
+                groups, reference_timestamp = convert_log_lines(aprs_strings, reference_timestamp)
+
+                # one COPY for each chunk of the hypertables
+                for (redis_target, chunk), csv_strings in sorted(groups.items()):
+                    tablename, columns, pgcopy_encoder, chunk_time_interval = IMPORT_TABLES[redis_target]
+                    copy_lines(cursor, tablename, columns, csv_strings, pgcopy_encoder)
+
+                offset += len(aprs_strings)
+                start = min((chunk for redis_target, chunk in groups), default=None)
+                end = max((chunk + IMPORT_TABLES[redis_target][3] for redis_target, chunk in groups), default=None)
+                cursor.execute("""
+                    INSERT INTO imported_files AS i (filename, lines, start_time, end_time)
+                    VALUES (%(filename)s, %(lines)s, %(start)s, %(end)s)
+                    ON CONFLICT (filename) DO UPDATE
+                    SET
+                        lines = EXCLUDED.lines,
+                        start_time = LEAST(i.start_time, EXCLUDED.start_time),
+                        end_time = GREATEST(i.end_time, EXCLUDED.end_time);
+                """, {'filename': filename, 'lines': offset, 'start': start, 'end': end})
+                connection.commit()
+
+                progress_queue.put((filename, offset, len(aprs_strings), start, end))
+    finally:
+        cursor.close()
+        connection.close()
+
+    progress_queue.put((filename, None, 0, None, None))
+
+
+class ImportState:
+    """Progress of an import (offset of each file and time range of the imported beacons), saved as json file to resume the import.
+
+    The offsets in the table imported_files are committed with the beacons, they take precedence (see sync()).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.start = None
+        self.end = None
+        self.rebuilt = True
+
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.files = state['files']
+            self.start = datetime.fromisoformat(state['start']) if state['start'] else None
+            self.end = datetime.fromisoformat(state['end']) if state['end'] else None
+            self.rebuilt = state['rebuilt']
+
+    def get_offset(self, filename):
+        return self.files.get(filename, {}).get('offset', 0)
+
+    def is_done(self, filename):
+        return self.files.get(filename, {}).get('done', False)
+
+    def update(self, filename, offset, start, end):
+        """Set the offset of the file (None: the file is done) and extend the time range by [start, end)."""
+
+        file_state = self.files.setdefault(filename, {'offset': 0, 'done': False})
+        if offset is None:
+            file_state['done'] = True
+        else:
+            file_state['offset'] = offset
+        if start is not None:
+            self.start = start if self.start is None else min(self.start, start)
+            self.end = end if self.end is None else max(self.end, end)
+            self.rebuilt = False
+
+    def sync(self, imported_files):
+        """Take the offsets and time ranges of the unfinished files from imported_files (filename -> (lines, start, end))."""
+
+        for filename, (lines, start, end) in imported_files.items():
+            if not self.is_done(filename) and lines > self.get_offset(filename):
+                self.update(filename, lines, start, end)
+
+    def save(self):
+        state = {
+            'files': self.files,
+            'start': self.start.isoformat() if self.start else None,
+            'end': self.end.isoformat() if self.end else None,
+            'rebuilt': self.rebuilt,
+        }
+
+        # write a new file and replace the old one, so a crash never leaves a broken state
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def rebuild_after_import(start, end):
+    """Update senders, receivers and the statistics for the beacons from start (inclusive) to end (exclusive).
+
+    The statistics of the affected days are computed again from the hypertables (not incrementally like in
+    the transfer), so the whole day is correct even if it contains beacons from the gateway, too.
+    """
+
+    first_day = datetime.combine(start.date(), time(0))
+    end_day = datetime.combine((end - timedelta(microseconds=1)).date(), time(0)) + timedelta(days=1)
+    parameters = {'start': start, 'end': end}
+
+    # Update agl (if the gateway couldn't compute it)
+    if current_app.config['TRANSFER_AGL_FROM_DATABASE']:
+        for tablename in ('sender_positions', 'receiver_positions'):
+            db.session.execute(f"""
+                UPDATE {tablename} AS tmp
+                SET
+                    agl = tmp.altitude - ST_Value(e.rast, tmp.location)
+                FROM elevation AS e
+                WHERE tmp.reference_timestamp >= :start AND tmp.reference_timestamp < :end AND tmp.agl IS NULL AND ST_Intersects(tmp.location, e.rast);
+            """, parameters)
+
+    # Update senders (the attributes only if the imported beacons are newer)
+    db.session.execute("""
+        INSERT INTO senders AS s (firstseen, lastseen, name, aircraft_type, stealth, address, software_version, hardware_version, real_address)
+        SELECT DISTINCT ON (sp.name)
+            MIN(sp.reference_timestamp) OVER (PARTITION BY sp.name) AS firstseen,
+            sp.reference_timestamp AS lastseen,
+
+            sp.name,
+            sp.aircraft_type,
+            sp.stealth,
+            sp.address,
+            sp.software_version,
+            sp.hardware_version,
+            sp.real_address
+        FROM sender_positions AS sp
+        WHERE sp.reference_timestamp >= :start AND sp.reference_timestamp < :end AND sp.name NOT LIKE 'RND%'
+        ORDER BY sp.name, sp.reference_timestamp DESC
+        ON CONFLICT (name) DO UPDATE
+        SET
+            firstseen = LEAST(s.firstseen, EXCLUDED.firstseen),
+            lastseen = GREATEST(s.lastseen, EXCLUDED.lastseen),
+            aircraft_type = CASE WHEN s.lastseen IS NULL OR EXCLUDED.lastseen >= s.lastseen THEN EXCLUDED.aircraft_type ELSE s.aircraft_type END,
+            stealth = CASE WHEN s.lastseen IS NULL OR EXCLUDED.lastseen >= s.lastseen THEN EXCLUDED.stealth ELSE s.stealth END,
+            address = CASE WHEN s.lastseen IS NULL OR EXCLUDED.lastseen >= s.lastseen THEN EXCLUDED.address ELSE s.address END,
+            software_version = COALESCE(s.software_version, EXCLUDED.software_version),
+            hardware_version = COALESCE(s.hardware_version, EXCLUDED.hardware_version),
+            real_address = COALESCE(s.real_address, EXCLUDED.real_address);
+    """, parameters)
+
+    # Update receivers from the status beacons ...
+    db.session.execute("""
+        INSERT INTO receivers AS r (firstseen, lastseen, name, timestamp, version, platform, cpu_temp, rec_input_noise)
+        SELECT DISTINCT ON (rs.name)
+            MIN(rs.reference_timestamp) OVER (PARTITION BY rs.name) AS firstseen,
+            rs.reference_timestamp AS lastseen,
+
+            rs.name,
+            rs.timestamp,
+
+            rs.version,
+            rs.platform,
+
+            rs.cpu_temp,
+            rs.rec_input_noise
+        FROM receiver_statuses AS rs
+        WHERE rs.reference_timestamp >= :start AND rs.reference_timestamp < :end
+        ORDER BY rs.name, rs.timestamp DESC
+        ON CONFLICT (name) DO UPDATE
+        SET
+            firstseen = LEAST(r.firstseen, EXCLUDED.firstseen),
+            lastseen = GREATEST(r.lastseen, EXCLUDED.lastseen),
+            timestamp = GREATEST(r.timestamp, EXCLUDED.timestamp),
+            version = CASE WHEN r.version IS NULL OR r.timestamp IS NULL OR EXCLUDED.timestamp >= r.timestamp THEN EXCLUDED.version ELSE r.version END,
+            platform = CASE WHEN r.platform IS NULL OR r.timestamp IS NULL OR EXCLUDED.timestamp >= r.timestamp THEN EXCLUDED.platform ELSE r.platform END,
+            cpu_temp = CASE WHEN r.timestamp IS NULL OR EXCLUDED.timestamp >= r.timestamp THEN EXCLUDED.cpu_temp ELSE r.cpu_temp END,
+            rec_input_noise = CASE WHEN r.timestamp IS NULL OR EXCLUDED.timestamp >= r.timestamp THEN EXCLUDED.rec_input_noise ELSE r.rec_input_noise END;
+    """, parameters)
+
+    # ... and from the position beacons
+    receivers = db.session.execute("""
+        INSERT INTO receivers AS r (firstseen, lastseen, name, timestamp, location, altitude, agl)
+        SELECT DISTINCT ON (rp.name)
+            MIN(rp.reference_timestamp) OVER (PARTITION BY rp.name) AS firstseen,
+            rp.reference_timestamp AS lastseen,
+
+            rp.name,
+            rp.timestamp,
+            rp.location,
+
+            rp.altitude,
+
+            rp.agl
+        FROM receiver_positions AS rp
+        WHERE rp.reference_timestamp >= :start AND rp.reference_timestamp < :end AND rp.name NOT LIKE 'RND%'
+        ORDER BY rp.name, rp.timestamp DESC
+        ON CONFLICT (name) DO UPDATE
+        SET
+            firstseen = LEAST(r.firstseen, EXCLUDED.firstseen),
+            lastseen = GREATEST(r.lastseen, EXCLUDED.lastseen),
+            timestamp = GREATEST(r.timestamp, EXCLUDED.timestamp),
+            location = CASE WHEN r.location IS NULL OR r.timestamp IS NULL OR EXCLUDED.timestamp >= r.timestamp THEN EXCLUDED.location ELSE r.location END,
+            altitude = CASE WHEN r.location IS NULL OR r.timestamp IS NULL OR EXCLUDED.timestamp >= r.timestamp THEN EXCLUDED.altitude ELSE r.altitude END,
+            agl = CASE WHEN r.location IS NULL OR r.timestamp IS NULL OR EXCLUDED.timestamp >= r.timestamp THEN EXCLUDED.agl ELSE r.agl END
+        RETURNING id, ST_X(location), ST_Y(location);
+    """, parameters).fetchall()
+
+    # Update receiver country and airport (only for new or moved receivers)
+    connection = db.session.connection().connection
+    cursor = connection.cursor()
+    spatial_lookup = get_spatial_lookup(cursor)
+    moved_receivers = spatial_lookup.get_moved({receiver_id: (longitude, latitude) for receiver_id, longitude, latitude in receivers if longitude is not None})
+    for receiver_id, (longitude, latitude) in moved_receivers.items():
+        db.session.execute(
+            "UPDATE receivers SET country_id = COALESCE(:country_id, country_id), airport_id = COALESCE(:airport_id, airport_id) WHERE id = :id;",
+            {'id': receiver_id, 'country_id': spatial_lookup.get_country_id(longitude, latitude), 'airport_id': spatial_lookup.get_airport_id(longitude, latitude)},
+        )
+    cursor.close()
+
+    db.session.commit()
+    spatial_lookup.update_locations(moved_receivers)
+
+    link_sender_infos()
+
+    rebuild_statistics(first_day, end_day)
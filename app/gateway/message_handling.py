@@ -1,10 +1,19 @@
 import os
 import time
-from io import StringIO
+from datetime import datetime
+from itertools import islice
+
+from flask import current_app
+from psycopg2.extras import execute_values
 
 from app import db
-from app.model import AircraftType
-from app.utils import get_sql_trustworthy
+from app.model import AircraftType, SenderPosition, ReceiverPosition, ReceiverStatus
+from app.gateway.csv_codec import CsvCodec, Column, REQUIRED, TRUTHY, NOT_NONE
+from app.gateway.id_cache import sender_id_cache, receiver_id_cache
+from app.gateway.statistics_aggregator import StatisticsAggregator, MAX, MIN, SUM, get_statistics_rebuilds
+from app.gateway.sender_cache import sender_cache, SENDER_ATTRIBUTES
+from app.gateway.spatial_lookup import get_spatial_lookup
+from app.gateway.pgcopy import PgCopyEncoder, IteratorFile
 
 basepath = os.path.dirname(os.path.realpath(__file__))
 
@@ -46,6 +55,7 @@ SENDER_POSITION_BEACON_FIELDS = [
     "location_mgrs",
     "location_mgrs_short",
     "agl",
+    "is_trustworthy",
 ]
 
 RECEIVER_POSITION_BEACON_FIELDS = [
@@ -80,6 +90,53 @@ RECEIVER_STATUS_BEACON_FIELDS = [
 ]
 
 
+# how the fields are written into the csv rows (all other fields: falsy values become NULL)
+SENDER_POSITION_COLUMNS = {
+    "reference_timestamp": Column(REQUIRED),
+    "name": Column(REQUIRED),
+    "dstcall": Column(REQUIRED),
+    "receiver_name": Column(REQUIRED),
+    "timestamp": Column(REQUIRED),
+    "location": Column(REQUIRED),
+    "altitude": Column(TRUTHY, converter=int),
+    "aircraft_type": Column(TRUTHY, converter=lambda aircraft_type: aircraft_type.name, default=AircraftType.UNKNOWN.name),
+    "location_mgrs": Column(REQUIRED),
+    "location_mgrs_short": Column(REQUIRED),
+    "agl": Column(NOT_NONE),
+    "is_trustworthy": Column(NOT_NONE),
+}
+
+RECEIVER_POSITION_COLUMNS = {
+    "reference_timestamp": Column(REQUIRED),
+    "name": Column(REQUIRED),
+    "dstcall": Column(REQUIRED),
+    "receiver_name": Column(REQUIRED),
+    "timestamp": Column(REQUIRED),
+    "location": Column(REQUIRED),
+    "altitude": Column(TRUTHY, converter=int),
+    "location_mgrs": Column(REQUIRED),
+    "location_mgrs_short": Column(REQUIRED),
+    "agl": Column(NOT_NONE),
+}
+
+RECEIVER_STATUS_COLUMNS = {
+    "reference_timestamp": Column(REQUIRED),
+    "name": Column(REQUIRED),
+    "dstcall": Column(REQUIRED),
+    "receiver_name": Column(REQUIRED),
+    "timestamp": Column(REQUIRED),
+    "version": Column(NOT_NONE),
+    "platform": Column(NOT_NONE),
+    "cpu_temp": Column(NOT_NONE),
+    "rec_input_noise": Column(NOT_NONE),
+}
+
+# codecs for PostgreSQL COPY (the sender position records also keep the coordinates for the relations)
+SENDER_POSITION_CODEC = CsvCodec(SENDER_POSITION_BEACON_FIELDS, SENDER_POSITION_COLUMNS, record_fields=("longitude", "latitude"))
+RECEIVER_POSITION_CODEC = CsvCodec(RECEIVER_POSITION_BEACON_FIELDS, RECEIVER_POSITION_COLUMNS)
+RECEIVER_STATUS_CODEC = CsvCodec(RECEIVER_STATUS_BEACON_FIELDS, RECEIVER_STATUS_COLUMNS)
+
+
 def sender_position_message_to_csv_string(message, none_character=''):
     """
     Convert sender_position_messages to csv string.
@@ -88,83 +145,168 @@ def sender_position_message_to_csv_string(message, none_character=''):
     :param str none_character: '' for a file, '\\N' for Postgresql COPY
     """
 
-    csv_string = "{0},{1},{2},{3},{4},{5},{6},{7},{8},{9},{10},{11},{12},{13},{14},{15},{16},{17},{18},{19},{20},{21},{22},{23},{24},{25},{26},{27},{28},{29},{30}\n".format(
-        message['reference_timestamp'],
-
-        message['name'],
-        message['dstcall'],
-        message['relay'] if 'relay' in message and message['relay'] else none_character,
-        message['receiver_name'],
-        message['timestamp'],
-        message['location'],
-
-        message['track'] if 'track' in message and message['track'] else none_character,
-        message['ground_speed'] if 'ground_speed' in message and message['ground_speed'] else none_character,
-        int(message['altitude']) if message['altitude'] else none_character,
-
-        message['address_type'] if 'address_type' in message and message['address_type'] else none_character,   # 10
-        message['aircraft_type'].name if 'aircraft_type' in message and message['aircraft_type'] else AircraftType.UNKNOWN.name,
-        message['stealth'] if 'stealth' in message and message['stealth'] else none_character,
-        message['address'] if 'address' in message and message['address'] else none_character,
-        message['climb_rate'] if 'climb_rate' in message and message['climb_rate'] else none_character,
-        message['turn_rate'] if 'turn_rate' in message and message['turn_rate'] else none_character,
-        message['signal_quality'] if 'signal_quality' in message and message['signal_quality'] else none_character,
-        message['error_count'] if 'error_count' in message and message['error_count'] else none_character,
-        message['frequency_offset'] if 'frequency_offset' in message and message['frequency_offset'] else none_character,
-        message['gps_quality_horizontal'] if 'gps_quality_horizontal' in message and message['gps_quality_horizontal'] else none_character,
-        message['gps_quality_vertical'] if 'gps_quality_vertical' in message and message['gps_quality_vertical'] else none_character,   # 20
-        message['software_version'] if 'software_version' in message and message['software_version'] else none_character,
-        message['hardware_version'] if 'hardware_version' in message and message['hardware_version'] else none_character,
-        message['real_address'] if 'real_address' in message and message['real_address'] else none_character,
-        message['signal_power'] if 'signal_power' in message and message['signal_power'] else none_character,
-
-        message['distance'] if 'distance' in message and message['distance'] else none_character,
-        message['bearing'] if 'bearing' in message and message['bearing'] else none_character,
-        message['normalized_quality'] if 'normalized_quality' in message and message['normalized_quality'] else none_character,
-
-        message['location_mgrs'],
-        message['location_mgrs_short'],
-        message['agl'] if 'agl' in message else none_character,
-    )
-    return csv_string
+    return SENDER_POSITION_CODEC.with_none_character(none_character).encode(message)
 
 
 def receiver_position_message_to_csv_string(message, none_character=''):
-    csv_string = "{0},{1},{2},{3},{4},{5},{6},{7},{8},{9}\n".format(
-        message['reference_timestamp'],
+    return RECEIVER_POSITION_CODEC.with_none_character(none_character).encode(message)
 
-        message['name'],
-        message['dstcall'],
-        message['receiver_name'],
-        message['timestamp'],
-        message['location'],
 
-        int(message['altitude']) if message['altitude'] else none_character,
+def receiver_status_message_to_csv_string(message, none_character=''):
+    return RECEIVER_STATUS_CODEC.with_none_character(none_character).encode(message)
 
-        message['location_mgrs'],
-        message['location_mgrs_short'],
-        message['agl'] if 'agl' in message else none_character,
-    )
-    return csv_string
 
+# The columns of the temporary tables and the encoders for the binary COPY (TRANSFER_COPY_FORMAT = 'binary')
+SENDER_POSITION_COPY_COLUMNS = SENDER_POSITION_BEACON_FIELDS + ['sender_id', 'receiver_id']
+SENDER_POSITION_PGCOPY_ENCODER = PgCopyEncoder.from_table(SenderPosition.__table__, SENDER_POSITION_COPY_COLUMNS, extra_types={'sender_id': db.Integer(), 'receiver_id': db.Integer()})
+SENDER_POSITION_TABLE_PGCOPY_ENCODER = PgCopyEncoder.from_table(SenderPosition.__table__, SENDER_POSITION_BEACON_FIELDS)  # COPY into sender_positions (flask gateway import)
+RECEIVER_POSITION_PGCOPY_ENCODER = PgCopyEncoder.from_table(ReceiverPosition.__table__, RECEIVER_POSITION_BEACON_FIELDS)
+RECEIVER_STATUS_PGCOPY_ENCODER = PgCopyEncoder.from_table(ReceiverStatus.__table__, RECEIVER_STATUS_BEACON_FIELDS)
 
-def receiver_status_message_to_csv_string(message, none_character=''):
-    csv_string = "{0},{1},{2},{3},{4},{5},{6},{7},{8}\n".format(
-        message['reference_timestamp'],
 
-        message['name'],
-        message['dstcall'],
-        message['receiver_name'],
-        message['timestamp'],
+COPY_BUFFER_SIZE = 65536     # bytes (or characters) which are sent to the database at once
+
+
+def copy_lines(cursor, tablename, columns, lines, pgcopy_encoder):
+    """COPY the csv strings into the table, as text or (with TRANSFER_COPY_FORMAT = 'binary') converted to the binary format.
+
+    The lines can be any iterable, they are consumed lazily while sending.
+    """
+
+    if current_app.config['TRANSFER_COPY_FORMAT'] == 'binary':
+        cursor.copy_expert(f"COPY {tablename} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)", IteratorFile(pgcopy_encoder.iter_encode(lines)), size=COPY_BUFFER_SIZE)
+    else:
+        cursor.copy_expert(f"COPY {tablename} ({', '.join(columns)}) FROM STDIN WITH (FORMAT text, DELIMITER ',')", IteratorFile(lines), size=COPY_BUFFER_SIZE)
+
+
+def iter_chunks(lines, chunk_size):
+    """Yields lists of up to chunk_size csv strings."""
+
+    iterator = iter(lines)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# The statistics of the batches are aggregated in memory and flushed with flush_statistics()
+SENDER_POSITION_STATISTICS = StatisticsAggregator(
+    tablename="sender_position_statistics",
+    key_columns=["date", "sender_id", "dstcall", "address_type", "aircraft_type", "stealth", "software_version", "hardware_version"],
+    aggregates=[("messages_count", SUM)],
+)
+
+COVERAGE_STATISTICS = StatisticsAggregator(
+    tablename="coverage_statistics",
+    key_columns=["date", "location_mgrs_short", "sender_id", "receiver_id", "is_trustworthy"],
+    aggregates=[("max_distance", MAX), ("max_normalized_quality", MAX), ("max_signal_quality", MAX), ("min_altitude", MIN), ("max_altitude", MAX), ("messages_count", SUM)],
+)
+
+RECEIVER_STATUS_STATISTICS = StatisticsAggregator(
+    tablename="receiver_status_statistics",
+    key_columns=["date", "receiver_id", "version", "platform"],
+    aggregates=[("messages_count", SUM)],
+)
+
+STATISTICS_AGGREGATORS = [SENDER_POSITION_STATISTICS, COVERAGE_STATISTICS, RECEIVER_STATUS_STATISTICS]
+
+
+def flush_statistics(force=False):
+    """Upsert the aggregated statistics if TRANSFER_STATISTICS_FLUSH_INTERVAL is over (or if force)."""
+
+    interval = current_app.config['TRANSFER_STATISTICS_FLUSH_INTERVAL']
+    aggregators = [aggregator for aggregator in STATISTICS_AGGREGATORS if force or aggregator.is_due(interval)]
+    if not aggregators:
+        return
+
+    connection = db.engine.raw_connection()
+    try:
+        for aggregator in aggregators:
+            aggregator.flush(connection)
+            current_app.logger.debug(aggregator.get_statistics_message())
+    finally:
+        connection.close()
+
+
+def add_sender_and_receiver_ids(cursor, lines):
+    """Appends the sender_id and the receiver_id (from the id caches) to the sender position csv strings."""
+
+    name_index = SENDER_POSITION_CODEC.index['name']
+    receiver_name_index = SENDER_POSITION_CODEC.index['receiver_name']
+    maxsplit = max(name_index, receiver_name_index) + 1
+    null = r'\N'
 
-        message['version'] if 'version' in message else none_character,
-        message['platform'] if 'platform' in message else none_character,
+    rows = []
+    names = []
+    receiver_names = []
+    for line in lines:
+        row = line.rstrip('\n')
+        values = row.split(',', maxsplit)
+        rows.append(row)
+        names.append(values[name_index])
+        receiver_names.append(values[receiver_name_index])
 
-        message['cpu_temp'] if 'cpu_temp' in message else none_character,
-        message['rec_input_noise'] if 'rec_input_noise' in message else none_character,
+    sender_ids = sender_id_cache.get_ids(cursor, set(names))
+    receiver_ids = receiver_id_cache.get_ids(cursor, set(receiver_names))
 
-    )
-    return csv_string
+    return [
+        f"{row},{sender_ids.get(name, null)},{receiver_ids.get(receiver_name, null)}\n"
+        for row, name, receiver_name in zip(rows, names, receiver_names)
+    ]
+
+
+class SenderCollector:
+    """Collects firstseen, lastseen and the attributes of each sender from sender position csv strings (chunk by chunk).
+
+    The attributes (a tuple of SENDER_ATTRIBUTES) are taken from the latest row of each sender.
+    """
+
+    def __init__(self):
+        self.name_index = SENDER_POSITION_CODEC.index['name']
+        self.timestamp_index = SENDER_POSITION_CODEC.index['reference_timestamp']
+        self.attribute_indices = [SENDER_POSITION_CODEC.index[attribute] for attribute in SENDER_ATTRIBUTES]
+        self.maxsplit = max([self.name_index, self.timestamp_index] + self.attribute_indices) + 1
+
+        self.rows = {}
+
+    def add(self, lines):
+        name_index = self.name_index
+        timestamp_index = self.timestamp_index
+        rows = self.rows
+
+        for line in lines:
+            values = line.split(',', self.maxsplit)
+            name = values[name_index]
+            if name.startswith('RND'):
+                continue
+
+            timestamp = values[timestamp_index]
+            row = rows.get(name)
+            if row is None:
+                rows[name] = [timestamp, timestamp, values]
+            elif timestamp < row[0]:
+                row[0] = timestamp
+            elif timestamp >= row[1]:
+                row[1] = timestamp
+                row[2] = values
+
+    def get_senders(self):
+        """Returns name -> (firstseen, lastseen, attributes)."""
+
+        null = r'\N'
+        return {
+            name: (datetime.fromisoformat(firstseen), datetime.fromisoformat(lastseen), tuple(None if values[i] == null else values[i] for i in self.attribute_indices))
+            for name, (firstseen, lastseen, values) in self.rows.items()
+        }
+
+
+def get_senders(lines):
+    """Returns name -> (firstseen, lastseen, attributes) for the senders in the sender position csv strings."""
+
+    sender_collector = SenderCollector()
+    sender_collector.add(lines)
+    return sender_collector.get_senders()
 
 
 def sender_position_csv_strings_to_db(lines):
@@ -173,119 +315,120 @@ def sender_position_csv_strings_to_db(lines):
 
     connection = db.engine.raw_connection()
     cursor = connection.cursor()
+    try:
+        # The lines are consumed chunk by chunk while the COPY is running, so the ids are looked up with a second connection
+        id_connection = db.engine.raw_connection()
+        id_cursor = id_connection.cursor()
+        sender_collector = SenderCollector()
+        chunk_size = current_app.config['TRANSFER_CHUNK_ROWS']
+
+        def lines_with_ids():
+            for chunk in iter_chunks(lines, chunk_size):
+                sender_collector.add(chunk)
+                yield from add_sender_and_receiver_ids(id_cursor, chunk)
+
+        try:
+            cursor.execute(f"CREATE TEMPORARY TABLE {tmp_tablename} (LIKE sender_positions, sender_id INTEGER, receiver_id INTEGER) ON COMMIT DROP;")
+            copy_lines(cursor, tmp_tablename, SENDER_POSITION_COPY_COLUMNS, lines_with_ids(), SENDER_POSITION_PGCOPY_ENCODER)
+        finally:
+            id_cursor.close()
+            id_connection.close()
+
+        # Update agl (if the gateway couldn't compute it)
+        if current_app.config['TRANSFER_AGL_FROM_DATABASE']:
+            cursor.execute(f"""
+                UPDATE {tmp_tablename} AS tmp
+                SET
+                    agl = tmp.altitude - ST_Value(e.rast, tmp.location)
+                FROM elevation AS e
+                WHERE tmp.agl IS NULL AND ST_Intersects(tmp.location, e.rast);
+            """)
+
+        # Update senders (only the senders with changed attributes or an outdated lastseen)
+        changed_senders = sender_cache.get_changed(sender_collector.get_senders(), lastseen_interval=current_app.config['TRANSFER_SENDER_LASTSEEN_INTERVAL'])
+        if changed_senders:
+            execute_values(cursor, """
+                INSERT INTO senders AS s (firstseen, lastseen, name, aircraft_type, stealth, address, software_version, hardware_version, real_address)
+                VALUES %s
+                ON CONFLICT (name) DO UPDATE
+                SET
+                    firstseen = COALESCE(s.firstseen, EXCLUDED.firstseen),
+                    lastseen = GREATEST(EXCLUDED.lastseen, s.lastseen),
+                    aircraft_type = EXCLUDED.aircraft_type,
+                    stealth = EXCLUDED.stealth,
+                    address = EXCLUDED.address,
+                    software_version = COALESCE(EXCLUDED.software_version, s.software_version),
+                    hardware_version = COALESCE(EXCLUDED.hardware_version, s.hardware_version),
+                    real_address = COALESCE(EXCLUDED.real_address, s.real_address);
+            """, [(firstseen, lastseen, name) + attributes for name, (firstseen, lastseen, attributes) in changed_senders.items()], page_size=1000)
+
+        # Update sender_infos FK -> senders (only for new senders, the rest is done by the import of the sender_infos)
+        new_addresses = sender_cache.get_new_addresses(changed_senders)
+        if new_addresses:
+            cursor.execute("""
+                UPDATE sender_infos AS si
+                SET sender_id = s.id
+                FROM senders AS s
+                WHERE si.sender_id IS NULL AND si.address = ANY(%s) AND s.address = si.address;
+            """, (new_addresses, ))
+
+        # Aggregate sender position statistics
+        cursor.execute(f"""
+            SELECT
+                tmp.reference_timestamp::DATE AS date,
+                tmp.sender_id,
+                tmp.dstcall,
+                tmp.address_type,
+                tmp.aircraft_type,
+                tmp.stealth,
+                tmp.software_version,
+                tmp.hardware_version,
+                COUNT(tmp.*) AS messages_count
+            FROM {tmp_tablename} AS tmp
+            WHERE tmp.sender_id IS NOT NULL
+            GROUP BY date, tmp.sender_id, tmp.dstcall, tmp.address_type, tmp.aircraft_type, tmp.stealth, tmp.software_version, tmp.hardware_version;
+        """)
+        sender_position_statistics = cursor.fetchall()
 
-    string_buffer = StringIO()
-    string_buffer.writelines(lines)
-    string_buffer.seek(0)
-
-    cursor.execute(f"CREATE TEMPORARY TABLE {tmp_tablename} (LIKE sender_positions) ON COMMIT DROP;")
-    cursor.copy_from(file=string_buffer, table=tmp_tablename, sep=",", columns=SENDER_POSITION_BEACON_FIELDS)
-
-    # Update agl
-    cursor.execute(f"""
-        UPDATE {tmp_tablename} AS tmp
-        SET
-            agl = tmp.altitude - ST_Value(e.rast, tmp.location)
-        FROM elevation AS e
-        WHERE ST_Intersects(tmp.location, e.rast);
-    """)
-
-    # Update senders
-    cursor.execute(f"""
-        INSERT INTO senders AS s (firstseen, lastseen, name, aircraft_type, stealth, address, software_version, hardware_version, real_address)
-        SELECT DISTINCT ON (tmp.name)
-            tmp.reference_timestamp AS firstseen,
-            tmp.reference_timestamp AS lastseen,
-
-            tmp.name,
-
-            tmp.aircraft_type,
-            tmp.stealth,
-            tmp.address,
-            tmp.software_version,
-            tmp.hardware_version,
-            tmp.real_address
-        FROM {tmp_tablename} AS tmp
-        WHERE tmp.name NOT LIKE 'RND%'
-        ON CONFLICT (name) DO UPDATE
-        SET
-            lastseen = GREATEST(EXCLUDED.lastseen, s.lastseen),
-            aircraft_type = EXCLUDED.aircraft_type,
-            stealth = EXCLUDED.stealth,
-            address = EXCLUDED.address,
-            software_version = COALESCE(EXCLUDED.software_version, s.software_version),
-            hardware_version = COALESCE(EXCLUDED.hardware_version, s.hardware_version),
-            real_address = COALESCE(EXCLUDED.real_address, s.real_address);
-    """)
-
-    # Update sender_infos FK -> senders
-    cursor.execute("""
-        UPDATE sender_infos AS si
-        SET sender_id = s.id
-        FROM senders AS s
-        WHERE si.sender_id IS NULL AND s.address = si.address;
-    """)
-
-    SQL_TRUSTWORTHY = get_sql_trustworthy(source_table_alias='tmp')
-
-    # Update sender position statistics
-    cursor.execute(f"""
-        INSERT INTO sender_position_statistics AS sps (date, sender_id, dstcall, address_type, aircraft_type, stealth, software_version, hardware_version, messages_count)
-        SELECT
-            tmp.reference_timestamp::DATE AS date,
-            s.id AS sender_id,
-            tmp.dstcall,
-            tmp.address_type,
-            tmp.aircraft_type,
-            tmp.stealth,
-            tmp.software_version,
-            tmp.hardware_version,
-            COUNT(tmp.*) AS messages_count
-        FROM {tmp_tablename} AS tmp
-        INNER JOIN senders AS s ON tmp.name = s.name
-        GROUP BY date, sender_id, tmp.dstcall, tmp.address_type, tmp.aircraft_type, tmp.stealth, tmp.software_version, tmp.hardware_version
-        ON CONFLICT (date, sender_id, dstcall, address_type, aircraft_type, stealth, software_version, hardware_version) DO UPDATE
-        SET
-            messages_count = EXCLUDED.messages_count + sps.messages_count;
-    """)
-
-    # Update coverage statistics
-    cursor.execute(f"""
-        INSERT INTO coverage_statistics AS rs (date, location_mgrs_short, sender_id, receiver_id, is_trustworthy, max_distance, max_normalized_quality, max_signal_quality, min_altitude, max_altitude, messages_count)
-        SELECT
-            tmp.reference_timestamp::DATE AS date,
-            tmp.location_mgrs_short,
-            tmp.sender_id,
-            tmp.receiver_id,
-
-            ({SQL_TRUSTWORTHY}) AS is_trustworthy,
-
-            MAX(tmp.distance) AS max_distance,
-            MAX(tmp.normalized_quality) AS max_normalized_quality,
-            MAX(tmp.signal_quality) AS max_signal_quality,
-            MIN(tmp.altitude) AS min_altitude,
-            MAX(tmp.altitude) AS max_altitude,
-            COUNT(tmp.*) AS messages_count
-        FROM (SELECT x.*, s.id AS sender_id, r.id AS receiver_id FROM {tmp_tablename} AS x INNER JOIN senders AS s ON x.name = s.name INNER JOIN receivers AS r ON x.receiver_name = r.name) AS tmp
-        GROUP BY date, location_mgrs_short, sender_id, receiver_id, is_trustworthy
-        ON CONFLICT (date, location_mgrs_short, sender_id, receiver_id, is_trustworthy) DO UPDATE
-        SET
-            max_distance = GREATEST(EXCLUDED.max_distance, rs.max_distance),
-            max_normalized_quality = GREATEST(EXCLUDED.max_normalized_quality, rs.max_normalized_quality),
-            messages_count = EXCLUDED.messages_count + rs.messages_count;
-    """)
-
-    # Insert all the beacons
-    all_fields = ', '.join(SENDER_POSITION_BEACON_FIELDS)
-    cursor.execute(f"""
-        INSERT INTO sender_positions ({all_fields})
-        SELECT {all_fields} FROM {tmp_tablename};
-    """)
-
-    connection.commit()
-
-    cursor.close()
-    connection.close()
+        # Aggregate coverage statistics
+        cursor.execute(f"""
+            SELECT
+                tmp.reference_timestamp::DATE AS date,
+                tmp.location_mgrs_short,
+                tmp.sender_id,
+                tmp.receiver_id,
+
+                tmp.is_trustworthy,
+
+                MAX(tmp.distance) AS max_distance,
+                MAX(tmp.normalized_quality) AS max_normalized_quality,
+                MAX(tmp.signal_quality) AS max_signal_quality,
+                MIN(tmp.altitude) AS min_altitude,
+                MAX(tmp.altitude) AS max_altitude,
+                COUNT(tmp.*) AS messages_count
+            FROM {tmp_tablename} AS tmp
+            WHERE tmp.sender_id IS NOT NULL AND tmp.receiver_id IS NOT NULL
+            GROUP BY date, tmp.location_mgrs_short, tmp.sender_id, tmp.receiver_id, tmp.is_trustworthy;
+        """)
+        coverage_statistics = cursor.fetchall()
+
+        # Insert all the beacons
+        all_fields = ', '.join(SENDER_POSITION_BEACON_FIELDS)
+        cursor.execute(f"""
+            INSERT INTO sender_positions ({all_fields})
+            SELECT {all_fields} FROM {tmp_tablename};
+        """)
+
+        # a rebuild of the statistics waits for this commit (and counts these beacons) or this commit waits for the rebuild
+        rebuilds = get_statistics_rebuilds(cursor, min(SENDER_POSITION_STATISTICS.rebuild_id, COVERAGE_STATISTICS.rebuild_id))
+
+        connection.commit()
+        sender_cache.update(changed_senders)
+        SENDER_POSITION_STATISTICS.add(sender_position_statistics, rebuilds)
+        COVERAGE_STATISTICS.add(coverage_statistics, rebuilds)
+    finally:
+        cursor.close()
+        connection.close()
 
 
 def receiver_position_csv_strings_to_db(lines):
@@ -294,92 +437,86 @@ def receiver_position_csv_strings_to_db(lines):
 
     connection = db.engine.raw_connection()
     cursor = connection.cursor()
+    try:
+        cursor.execute(f"CREATE TEMPORARY TABLE {tmp_tablename} (LIKE receiver_positions) ON COMMIT DROP;")
+        copy_lines(cursor, tmp_tablename, RECEIVER_POSITION_BEACON_FIELDS, lines, RECEIVER_POSITION_PGCOPY_ENCODER)
+
+        # Update agl (if the gateway couldn't compute it)
+        if current_app.config['TRANSFER_AGL_FROM_DATABASE']:
+            cursor.execute(f"""
+                UPDATE {tmp_tablename} AS tmp
+                SET
+                    agl = tmp.altitude - ST_Value(e.rast, tmp.location)
+                FROM elevation AS e
+                WHERE tmp.agl IS NULL AND ST_Intersects(tmp.location, e.rast);
+            """)
+
+        # Update receivers
+        cursor.execute(f"""
+            INSERT INTO receivers AS r (firstseen, lastseen, name, timestamp, location, altitude, agl)
+            SELECT DISTINCT ON (tmp.name)
+                tmp.reference_timestamp AS firstseen,
+                tmp.reference_timestamp AS lastseen,
 
-    string_buffer = StringIO()
-    string_buffer.writelines(lines)
-    string_buffer.seek(0)
-
-    cursor.execute(f"CREATE TEMPORARY TABLE {tmp_tablename} (LIKE receiver_positions) ON COMMIT DROP;")
-    cursor.copy_from(file=string_buffer, table=tmp_tablename, sep=",", columns=RECEIVER_POSITION_BEACON_FIELDS)
-
-    # Update agl
-    cursor.execute(f"""
-        UPDATE {tmp_tablename} AS tmp
-        SET
-            agl = tmp.altitude - ST_Value(e.rast, tmp.location)
-        FROM elevation AS e
-        WHERE ST_Intersects(tmp.location, e.rast);
-    """)
-
-    # Update receivers
-    cursor.execute(f"""
-        INSERT INTO receivers AS r (firstseen, lastseen, name, timestamp, location, altitude, agl)
-        SELECT DISTINCT ON (tmp.name)
-            tmp.reference_timestamp AS firstseen,
-            tmp.reference_timestamp AS lastseen,
-
-            tmp.name,
-            tmp.timestamp,
-            tmp.location,
-
-            tmp.altitude,
-
-            tmp.agl
-        FROM {tmp_tablename} AS tmp,
-        (
-            SELECT
                 tmp.name,
-                MAX(timestamp) AS timestamp
-            FROM {tmp_tablename} AS tmp
-            GROUP BY tmp.name
-        ) AS sq
-        WHERE tmp.name = sq.name AND tmp.timestamp = sq.timestamp AND tmp.name NOT LIKE 'RND%'
-        ON CONFLICT (name) DO UPDATE
-        SET
-            lastseen = EXCLUDED.lastseen,
-            timestamp = EXCLUDED.timestamp,
-            location = EXCLUDED.location,
-            altitude = EXCLUDED.altitude,
-
-            agl = EXCLUDED.agl;
-    """)
-
-    # Update receiver country
-    cursor.execute("""
-        UPDATE receivers AS r
-        SET
-            country_id = c.gid
-        FROM countries AS c
-        WHERE r.country_id IS NULL AND ST_Within(r.location, c.geom);
-    """)
-
-    # Update receiver airport
-    cursor.execute("""
-        UPDATE receivers AS r
-        SET
-            airport_id = (
-                SELECT id
-                FROM airports AS a
-                WHERE
-                    ST_Contains(a.border, r.location)
-                    AND a.style IN (2,4,5)
-                ORDER BY ST_DistanceSphere(a.location, r.location)
-                LIMIT 1
-            )
-        WHERE r.airport_id IS NULL;
-    """)
-
-    # Insert all the beacons
-    all_fields = ', '.join(RECEIVER_POSITION_BEACON_FIELDS)
-    cursor.execute(f"""
-        INSERT INTO receiver_positions ({all_fields})
-        SELECT {all_fields} FROM {tmp_tablename};
-    """)
-
-    connection.commit()
-
-    cursor.close()
-    connection.close()
+                tmp.timestamp,
+                tmp.location,
+
+                tmp.altitude,
+
+                tmp.agl
+            FROM {tmp_tablename} AS tmp,
+            (
+                SELECT
+                    tmp.name,
+                    MAX(timestamp) AS timestamp
+                FROM {tmp_tablename} AS tmp
+                GROUP BY tmp.name
+            ) AS sq
+            WHERE tmp.name = sq.name AND tmp.timestamp = sq.timestamp AND tmp.name NOT LIKE 'RND%'
+            ON CONFLICT (name) DO UPDATE
+            SET
+                firstseen = COALESCE(r.firstseen, EXCLUDED.firstseen),
+                lastseen = EXCLUDED.lastseen,
+                timestamp = EXCLUDED.timestamp,
+                location = EXCLUDED.location,
+                altitude = EXCLUDED.altitude,
+
+                agl = EXCLUDED.agl
+            RETURNING name, id, ST_X(location), ST_Y(location);
+        """)
+        receivers = cursor.fetchall()
+        receiver_ids = [(name, receiver_id) for name, receiver_id, longitude, latitude in receivers]
+
+        # Update receiver country and airport (only for new or moved receivers, an unknown country or airport doesn't replace the old one)
+        spatial_lookup = get_spatial_lookup(cursor)
+        moved_receivers = spatial_lookup.get_moved({receiver_id: (longitude, latitude) for name, receiver_id, longitude, latitude in receivers if longitude is not None})
+        if moved_receivers:
+            execute_values(cursor, """
+                UPDATE receivers AS r
+                SET
+                    country_id = COALESCE(v.country_id, r.country_id),
+                    airport_id = COALESCE(v.airport_id, r.airport_id)
+                FROM (VALUES %s) AS v(id, country_id, airport_id)
+                WHERE r.id = v.id;
+            """, [
+                (receiver_id, spatial_lookup.get_country_id(longitude, latitude), spatial_lookup.get_airport_id(longitude, latitude))
+                for receiver_id, (longitude, latitude) in moved_receivers.items()
+            ], template="(%s, %s::integer, %s::integer)")
+
+        # Insert all the beacons
+        all_fields = ', '.join(RECEIVER_POSITION_BEACON_FIELDS)
+        cursor.execute(f"""
+            INSERT INTO receiver_positions ({all_fields})
+            SELECT {all_fields} FROM {tmp_tablename};
+        """)
+
+        connection.commit()
+        receiver_id_cache.update(receiver_ids)
+        spatial_lookup.update_locations(moved_receivers)
+    finally:
+        cursor.close()
+        connection.close()
 
 
 def receiver_status_csv_strings_to_db(lines):
@@ -388,72 +525,73 @@ def receiver_status_csv_strings_to_db(lines):
 
     connection = db.engine.raw_connection()
     cursor = connection.cursor()
+    try:
+        cursor.execute(f"CREATE TEMPORARY TABLE {tmp_tablename} (LIKE receiver_statuses) ON COMMIT DROP;")
+        copy_lines(cursor, tmp_tablename, RECEIVER_STATUS_BEACON_FIELDS, lines, RECEIVER_STATUS_PGCOPY_ENCODER)
 
-    string_buffer = StringIO()
-    string_buffer.writelines(lines)
-    string_buffer.seek(0)
-
-    cursor.execute(f"CREATE TEMPORARY TABLE {tmp_tablename} (LIKE receiver_statuses) ON COMMIT DROP;")
-    cursor.copy_from(file=string_buffer, table=tmp_tablename, sep=",", columns=RECEIVER_STATUS_BEACON_FIELDS)
-
-    # Update receivers
-    cursor.execute(f"""
-        INSERT INTO receivers AS r (firstseen, lastseen, name, timestamp, version, platform, cpu_temp, rec_input_noise)
-        SELECT DISTINCT ON (tmp.name)
-            tmp.reference_timestamp AS firstseen,
-            tmp.reference_timestamp AS lastseen,
+        # Update receivers
+        cursor.execute(f"""
+            INSERT INTO receivers AS r (firstseen, lastseen, name, timestamp, version, platform, cpu_temp, rec_input_noise)
+            SELECT DISTINCT ON (tmp.name)
+                tmp.reference_timestamp AS firstseen,
+                tmp.reference_timestamp AS lastseen,
 
-            tmp.name,
-            tmp.timestamp,
-
-            tmp.version,
-            tmp.platform,
-
-            tmp.cpu_temp,
-            tmp.rec_input_noise
-        FROM {tmp_tablename} AS tmp,
-        (
+                tmp.name,
+                tmp.timestamp,
+
+                tmp.version,
+                tmp.platform,
+
+                tmp.cpu_temp,
+                tmp.rec_input_noise
+            FROM {tmp_tablename} AS tmp,
+            (
+                SELECT
+                    tmp.name,
+                    MAX(timestamp) AS timestamp
+                FROM {tmp_tablename} AS tmp
+                GROUP BY tmp.name
+            ) AS sq
+            WHERE tmp.name = sq.name AND tmp.timestamp = sq.timestamp
+            ON CONFLICT (name) DO UPDATE
+            SET
+                firstseen = COALESCE(r.firstseen, EXCLUDED.firstseen),
+                lastseen = EXCLUDED.lastseen,
+                timestamp = EXCLUDED.timestamp,
+                version = EXCLUDED.version,
+                platform = EXCLUDED.platform,
+                cpu_temp = EXCLUDED.cpu_temp,
+                rec_input_noise = EXCLUDED.rec_input_noise
+            RETURNING name, id;
+        """)
+        receiver_ids = cursor.fetchall()
+
+        # Aggregate receiver status statistics (all receivers of the batch were upserted above, so we take the ids of RETURNING)
+        cursor.execute(f"""
             SELECT
+                tmp.reference_timestamp::DATE AS date,
                 tmp.name,
-                MAX(timestamp) AS timestamp
+                COALESCE(tmp.version, ''),
+                COALESCE(tmp.platform, ''),
+                COUNT(tmp.*) AS messages_count
             FROM {tmp_tablename} AS tmp
-            GROUP BY tmp.name
-        ) AS sq
-        WHERE tmp.name = sq.name AND tmp.timestamp = sq.timestamp
-        ON CONFLICT (name) DO UPDATE
-        SET
-            lastseen = EXCLUDED.lastseen,
-            timestamp = EXCLUDED.timestamp,
-            version = EXCLUDED.version,
-            platform = EXCLUDED.platform,
-            cpu_temp = EXCLUDED.cpu_temp,
-            rec_input_noise = EXCLUDED.rec_input_noise;
-    """)
-
-    # Update receiver position statistics
-    cursor.execute(f"""
-        INSERT INTO receiver_status_statistics AS rss (date, receiver_id, version, platform, messages_count)
-        SELECT
-            tmp.reference_timestamp::DATE AS date,
-            r.id AS receiver_id,
-            COALESCE(tmp.version, ''),
-            COALESCE(tmp.platform, ''),
-            COUNT(tmp.*) AS messages_count
-        FROM {tmp_tablename} AS tmp INNER JOIN receivers AS r ON tmp.name = r.name
-        GROUP BY tmp.reference_timestamp::DATE, r.id, tmp.version, tmp.platform
-        ON CONFLICT (date, receiver_id, version, platform) DO UPDATE
-        SET
-            messages_count = EXCLUDED.messages_count + rss.messages_count;
-    """)
-
-    # Insert all the beacons
-    all_fields = ', '.join(RECEIVER_STATUS_BEACON_FIELDS)
-    cursor.execute(f"""
-        INSERT INTO receiver_statuses ({all_fields})
-        SELECT {all_fields} FROM {tmp_tablename};
-    """)
-
-    connection.commit()
-
-    cursor.close()
-    connection.close()
+            GROUP BY tmp.reference_timestamp::DATE, tmp.name, COALESCE(tmp.version, ''), COALESCE(tmp.platform, '');
+        """)
+        ids = dict(receiver_ids)
+        receiver_status_statistics = [(date, ids[name], version, platform, messages_count) for date, name, version, platform, messages_count in cursor.fetchall()]
+
+        # Insert all the beacons
+        all_fields = ', '.join(RECEIVER_STATUS_BEACON_FIELDS)
+        cursor.execute(f"""
+            INSERT INTO receiver_statuses ({all_fields})
+            SELECT {all_fields} FROM {tmp_tablename};
+        """)
+
+        rebuilds = get_statistics_rebuilds(cursor, RECEIVER_STATUS_STATISTICS.rebuild_id)
+
+        connection.commit()
+        RECEIVER_STATUS_STATISTICS.add(receiver_status_statistics, rebuilds)
+        receiver_id_cache.update(receiver_ids)
+    finally:
+        cursor.close()
+        connection.close()
@@ -0,0 +1,163 @@
+import os
+import multiprocessing
+import queue
+from collections import Counter
+
+from flask import current_app
+
+from app import create_app
+from app.gateway.beacon_conversion import aprs_strings_to_csv_strings, aprs_string_to_csv_string, warm_receiver_position_cache, receiver_position_cache, rejection_counter, REJECTION_REASONS
+
+STOP = None                 # sentinel which tells a worker to quit
+WORKER_BATCH_SIZE = 200     # max. number of lines a worker parses before it sends the results
+
+
+def get_route_key(aprs_string):
+    """Returns the name of the receiver which is responsible for this aprs_string.
+
+    The parser calculates distance and bearing from the last known receiver position, so all beacons
+    of a receiver (its own position and the beacons it received) must be parsed by the same worker.
+    This also keeps the order of the beacons for each receiver.
+    """
+
+    header = aprs_string.split(':', 1)[0]
+    name, _, path = header.partition('>')
+    if 'qAC' in path:
+        return name     # the receiver itself
+    else:
+        return path.rsplit(',', 1)[-1]
+
+
+def parse_worker(input_queue, output_queue, counter, rejection_counts, receiver_cache_counts, config_name):
+    """Parse aprs_strings from input_queue and put lists of (redis_target, csv_string) into output_queue.
+
+    counter is the number of processed lines, rejection_counts the number of rejected lines for each of REJECTION_REASONS
+    and receiver_cache_counts the hits and misses of the receiver position cache.
+    """
+
+    app = create_app(config_name)
+    with app.app_context():
+        warm_receiver_position_cache()
+
+        running = True
+        while running:
+            aprs_strings = [input_queue.get()]
+            while len(aprs_strings) < WORKER_BATCH_SIZE:
+                try:
+                    aprs_strings.append(input_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if STOP in aprs_strings:
+                aprs_strings = aprs_strings[:aprs_strings.index(STOP)]
+                running = False
+
+            try:
+                results = aprs_strings_to_csv_strings(aprs_strings)
+            except Exception:
+                # convert them one by one, so we lose only the broken lines
+                results = []
+                for aprs_string in aprs_strings:
+                    try:
+                        result = aprs_string_to_csv_string(aprs_string)
+                    except Exception as e:
+                        current_app.logger.error(f"Failed to convert '{aprs_string}': {e}")
+                        continue
+
+                    if result is not None:
+                        results.append(result)
+
+            with counter.get_lock():
+                counter.value += len(aprs_strings)
+            with rejection_counts.get_lock():
+                for i, reason in enumerate(REJECTION_REASONS):
+                    rejection_counts[i] = rejection_counter[reason]
+            with receiver_cache_counts.get_lock():
+                receiver_cache_counts[0] = receiver_position_cache.hits
+                receiver_cache_counts[1] = receiver_position_cache.misses
+
+            if results:
+                output_queue.put(results)
+
+
+class ParsePool:
+    """Parse aprs_strings in several worker processes.
+
+    The caller (e.g. the AprsClient callback) just submits raw lines, the workers do the parsing,
+    the MGRS calculation and the csv serialization. All queues are bounded, so a slow consumer
+    slows down the reader instead of eating up all the memory (and lines are dropped if it doesn't move at all).
+    """
+
+    def __init__(self, workers, queue_size=10000, submit_timeout=1.0, config_name=None):
+        self.workers = workers
+        self.submit_timeout = submit_timeout
+        self.dropped = 0
+        self.config_name = config_name or os.getenv('FLASK_CONFIG') or 'default'
+
+        self.input_queues = [multiprocessing.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.output_queue = multiprocessing.Queue(maxsize=queue_size)
+        self.counters = [multiprocessing.Value('Q', 0) for _ in range(workers)]
+        self.rejection_counts = [multiprocessing.Array('Q', len(REJECTION_REASONS)) for _ in range(workers)]
+        self.receiver_cache_counts = [multiprocessing.Array('Q', 2) for _ in range(workers)]
+        self.processes = []
+
+    def start(self):
+        for input_queue, counter, rejection_counts, receiver_cache_counts in zip(self.input_queues, self.counters, self.rejection_counts, self.receiver_cache_counts):
+            process = multiprocessing.Process(target=parse_worker, args=(input_queue, self.output_queue, counter, rejection_counts, receiver_cache_counts, self.config_name), daemon=True)
+            process.start()
+            self.processes.append(process)
+
+    def stop(self, timeout=5):
+        for input_queue in self.input_queues:
+            input_queue.put(STOP)
+
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+
+    def submit(self, aprs_string):
+        """Put the aprs_string into the queue of the responsible worker.
+
+        If this queue is still full after submit_timeout seconds the aprs_string is dropped (and counted in self.dropped),
+        so a stuck consumer can't block the aprs client forever.
+        """
+
+        index = hash(get_route_key(aprs_string)) % self.workers
+        try:
+            self.input_queues[index].put(aprs_string, timeout=self.submit_timeout)
+        except queue.Full:
+            self.dropped += 1
+
+    def get_results(self, timeout=1):
+        """Returns a list of (redis_target, csv_string) or an empty list if there was nothing within timeout."""
+
+        try:
+            return self.output_queue.get(timeout=timeout)
+        except queue.Empty:
+            return []
+
+    def get_counters(self):
+        """Returns the number of processed lines for each worker."""
+
+        return [counter.value for counter in self.counters]
+
+    def get_rejection_counter(self):
+        """Returns reason -> number of rejected lines of all workers."""
+
+        rejections = Counter()
+        for rejection_counts in self.rejection_counts:
+            with rejection_counts.get_lock():
+                rejections.update(dict(zip(REJECTION_REASONS, rejection_counts)))
+        return rejections
+
+    def get_receiver_cache_counts(self):
+        """Returns the hits and the misses of the receiver position caches of all workers."""
+
+        hits = misses = 0
+        for receiver_cache_counts in self.receiver_cache_counts:
+            with receiver_cache_counts.get_lock():
+                hits += receiver_cache_counts[0]
+                misses += receiver_cache_counts[1]
+        return hits, misses
@@ -0,0 +1,149 @@
+import struct
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from geoalchemy2.types import Geometry
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)    # signature, flags, header extension length
+PGCOPY_TRAILER = struct.pack(">h", -1)
+PG_EPOCH = datetime(2000, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+FIELD_COUNT = struct.Struct(">h")
+LENGTH = struct.Struct(">i")
+NULL_FIELD = LENGTH.pack(-1)
+
+# length and value of the fixed size types
+INT2 = struct.Struct(">ih")
+INT4 = struct.Struct(">ii")
+INT8 = struct.Struct(">iq")
+FLOAT4 = struct.Struct(">if")
+FLOAT8 = struct.Struct(">id")
+BOOL_TRUE = LENGTH.pack(1) + b"\x01"
+BOOL_FALSE = LENGTH.pack(1) + b"\x00"
+
+EWKB_POINT = struct.Struct("<BIIdd")    # little endian, type POINT with SRID flag, srid, x, y
+EWKB_POINT_TYPE = 0x20000001
+EWKB_POINT_LENGTH = LENGTH.pack(EWKB_POINT.size)
+
+
+def encode_text(value):
+    data = value.encode("utf-8")
+    return LENGTH.pack(len(data)) + data
+
+
+def encode_timestamp(value):
+    return INT8.pack(8, (datetime.fromisoformat(value) - PG_EPOCH) // ONE_MICROSECOND)
+
+
+def encode_bool(value):
+    return BOOL_TRUE if value in ("True", "true", "t") else BOOL_FALSE
+
+
+def encode_point(value):
+    """Encodes 'SRID=4326;POINT(x y)' as EWKB."""
+
+    srid, point = value.split(";")
+    x, y = point[point.index("(") + 1:point.index(")")].split()
+    return EWKB_POINT_LENGTH + EWKB_POINT.pack(1, EWKB_POINT_TYPE, int(srid[5:]), float(x), float(y))
+
+
+def get_field_encoder(column_type):
+    """Returns the function which encodes a text value into a binary COPY field (length and data) for this column type."""
+
+    if isinstance(column_type, Geometry):
+        return encode_point
+    elif isinstance(column_type, sa.Enum):     # binary representation of an enum is its label
+        return encode_text
+    elif isinstance(column_type, sa.SmallInteger):
+        return lambda value: INT2.pack(2, int(value))
+    elif isinstance(column_type, sa.BigInteger):
+        return lambda value: INT8.pack(8, int(value))
+    elif isinstance(column_type, sa.Integer):
+        return lambda value: INT4.pack(4, int(value))
+    elif isinstance(column_type, sa.Float):
+        if column_type.precision is not None and column_type.precision <= 24:  # this is a 'real'
+            return lambda value: FLOAT4.pack(4, float(value))
+        else:
+            return lambda value: FLOAT8.pack(8, float(value))
+    elif isinstance(column_type, sa.DateTime):
+        return encode_timestamp
+    elif isinstance(column_type, sa.Boolean):
+        return encode_bool
+    elif isinstance(column_type, sa.String):
+        return encode_text
+    else:
+        raise ValueError(f"Binary COPY of type {column_type} is not supported")
+
+
+class PgCopyEncoder:
+    """Encodes the csv strings of the transfer (COPY text format with ',' and '\\N') into the binary COPY format.
+
+    The server doesn't have to parse floats, timestamps and EWKT strings anymore, but the column types must
+    match exactly, so the encoders are taken from the SQLAlchemy column types.
+
+    :param list column_types: the SQLAlchemy types in the order of the csv columns
+    """
+
+    def __init__(self, column_types, none_character=r"\N"):
+        self.encoders = [get_field_encoder(column_type) for column_type in column_types]
+        self.none_character = none_character
+        self.field_count = FIELD_COUNT.pack(len(self.encoders))
+
+    @classmethod
+    def from_table(cls, table, columns, extra_types=None):
+        """Create an encoder for the columns of a SQLAlchemy table (extra_types: types of columns which are not in the table)."""
+
+        extra_types = extra_types or {}
+        return cls([extra_types[column] if column in extra_types else table.columns[column].type for column in columns])
+
+    def encode_row(self, line):
+        values = line.rstrip("\n").split(",")
+        if len(values) != len(self.encoders):
+            raise ValueError(f"Expected {len(self.encoders)} values, got {len(values)}: {line}")
+
+        null = self.none_character
+        return self.field_count + b"".join([NULL_FIELD if value == null else encoder(value) for value, encoder in zip(values, self.encoders)])
+
+    def iter_encode(self, lines):
+        """Yields the COPY data (header, rows and trailer) while consuming the lines lazily."""
+
+        yield PGCOPY_HEADER
+        yield from map(self.encode_row, lines)
+        yield PGCOPY_TRAILER
+
+    def encode(self, lines):
+        """Returns the complete COPY data (header, rows and trailer)."""
+
+        return b"".join(self.iter_encode(lines))
+
+
+class IteratorFile:
+    """A read-only file object for cursor.copy_expert() which pulls its data lazily from an iterator of strings (or bytes).
+
+    Only the data of one read() is in memory, so the COPY data of a batch doesn't have to be materialized.
+    """
+
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.rest = None
+
+    def read(self, size=-1):
+        chunks = [self.rest] if self.rest else []
+        length = len(self.rest) if self.rest else 0
+        self.rest = None
+
+        while size < 0 or length < size:
+            chunk = next(self.iterator, None)
+            if chunk is None:
+                break
+            chunks.append(chunk)
+            length += len(chunk)
+
+        if not chunks:
+            return ""
+
+        data = chunks[0][:0].join(chunks)
+        if 0 <= size < len(data):
+            data, self.rest = data[:size], data[size:]
+        return data
@@ -1,23 +1,36 @@
 import os
 import gzip
+import io
 import time
 from contextlib import contextmanager
 
+try:
+    import zstandard
+except ImportError:     # optional, only needed for zstd compressed archives of the gateway
+    zstandard = None
+
 from flask import current_app
 from app import db
 
 
 @contextmanager
 def open_file(filename):
-    """Opens a regular OR gzipped textfile for reading."""
+    """Opens a regular, gzipped OR zstd compressed textfile for reading.
+
+    The lines are decoded as utf-8 like in the aprs client of the gateway (and written by the ArchiveWriter).
+    """
 
     file = open(filename, "rb")
-    a = file.read(2)
+    a = file.read(4)
     file.close()
-    if a == b"\x1f\x8b":
-        file = gzip.open(filename, "rt", encoding="latin-1")
+    if a[:2] == b"\x1f\x8b":
+        file = gzip.open(filename, "rt", encoding="utf-8", errors="replace")
+    elif a == b"\x28\xb5\x2f\xfd":
+        if zstandard is None:
+            raise ValueError(f"Reading the zstd compressed file '{filename}' needs the package 'zstandard'")
+        file = io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"), read_across_frames=True), encoding="utf-8", errors="replace")
     else:
-        file = open(filename, "rt", encoding="latin-1")
+        file = open(filename, "rt", encoding="utf-8", errors="replace")
 
     try:
         yield file
@@ -0,0 +1,109 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+from ogn.parser.utils import CheapRuler, normalized_quality
+
+VECTORIZE_MIN_BATCH = 32    # smaller batches are calculated without numpy (less overhead)
+
+
+class ReceiverPositionCache:
+    """Bounded LRU map receiver name -> (longitude, latitude) for the relations of the sender positions.
+
+    It replaces the unbounded position dict of ogn.parser (calculate_relations=True). The cache is warmed
+    from receivers.location and updated with the position beacons. Like in ogn.parser these are all position
+    beacons, because some receivers (e.g. FANET ground stations) don't send receiver beacons. The receivers
+    stay in the cache because they are looked up all the time.
+    """
+
+    def __init__(self, maxsize=50000):
+        self.maxsize = maxsize
+        self.positions = OrderedDict()
+
+        self.reset_statistics()
+
+    def warm(self, rows):
+        """Add (name, longitude, latitude) rows, e.g. from the table 'receivers' (the latest ones last)."""
+
+        for name, longitude, latitude in rows:
+            self.update(name, longitude, latitude)
+
+    def update(self, name, longitude, latitude):
+        self.positions[name] = (longitude, latitude)
+        self.positions.move_to_end(name)
+        if len(self.positions) > self.maxsize:
+            self.positions.popitem(last=False)
+
+    def get(self, name):
+        position = self.positions.get(name)
+        if position is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.positions.move_to_end(name)
+        return position
+
+    def clear(self):
+        self.positions.clear()
+
+    def reset_statistics(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get_statistics_message(self):
+        lookups = self.hits + self.misses
+        hit_rate = f"{100 * self.hits / lookups:.1f}%" if lookups else "-"
+        return f"{len(self.positions)} receivers, {hit_rate} hits, {self.misses} misses"
+
+
+def get_relations(longitudes, latitudes, receiver_longitudes, receiver_latitudes):
+    """Returns the distances (m) and the bearings (deg) from the senders to the receivers (numpy arrays).
+
+    Vectorized version of ogn.parser.utils.CheapRuler with the mean latitude of sender and receiver.
+    """
+
+    longitudes, latitudes = np.asarray(longitudes), np.asarray(latitudes)
+    receiver_longitudes, receiver_latitudes = np.asarray(receiver_longitudes), np.asarray(receiver_latitudes)
+
+    c = np.cos((latitudes + receiver_latitudes) / 2.0 * math.pi / 180)
+    c2 = 2 * c * c - 1
+    c3 = 2 * c * c2 - c
+    c4 = 2 * c * c3 - c2
+    c5 = 2 * c * c4 - c3
+    kx = 1000 * (111.41513 * c - 0.09455 * c3 + 0.00012 * c5)
+    ky = 1000 * (111.13209 - 0.56605 * c2 + 0.0012 * c4)
+
+    dx = (receiver_longitudes - longitudes) * kx
+    dy = (receiver_latitudes - latitudes) * ky
+    distances = np.sqrt(dx * dx + dy * dy)
+
+    bearings = np.arctan2(-dy, dx) * 180 / math.pi + 90
+    bearings = np.where(bearings < 0, bearings + 360, bearings)
+    bearings = np.where((dx == 0) & (dy == 0), 0, bearings)
+
+    return distances, bearings
+
+
+def add_relations(relations):
+    """Adds distance, bearing (int) and normalized_quality to the sender position records of the (record, (receiver_longitude, receiver_latitude)) pairs."""
+
+    if len(relations) < VECTORIZE_MIN_BATCH:
+        for record, receiver_position in relations:
+            cheap_ruler = CheapRuler((record.latitude + receiver_position[1]) / 2.0)
+            record.distance = cheap_ruler.distance((record.longitude, record.latitude), receiver_position)
+            record.bearing = cheap_ruler.bearing((record.longitude, record.latitude), receiver_position)
+    else:
+        distances, bearings = get_relations(
+            [record.longitude for record, receiver_position in relations],
+            [record.latitude for record, receiver_position in relations],
+            [receiver_position[0] for record, receiver_position in relations],
+            [receiver_position[1] for record, receiver_position in relations],
+        )
+        for (record, receiver_position), distance, bearing in zip(relations, distances.tolist(), bearings.tolist()):
+            record.distance = distance
+            record.bearing = bearing
+
+    for record, receiver_position in relations:
+        bearing = int(record.bearing)
+        record.bearing = bearing if bearing < 360 else 0
+        record.normalized_quality = normalized_quality(record.distance, record.signal_quality) if record.signal_quality is not None else None
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections import defaultdict
+
+from redis.exceptions import RedisError
+
+
+class RedisBatchWriter:
+    """Collect the csv strings for each redis target and write them with one redis pipeline.
+
+    The rows are flushed if there are batch_size rows or if the oldest row waits longer than
+    batch_interval seconds. The interval is checked when a row is added, if the feed can be quiet
+    start_timer() checks it in a background thread, too.
+
+    With a spool the rows are not lost if redis is unreachable: they are appended to the spool and
+    replayed (up to replay_rows at once) when redis is back. As long as the spool is not empty the new
+    rows are appended behind the spooled rows, so the order is kept.
+    """
+
+    def __init__(self, transport, batch_size=500, batch_interval=0.05, spool=None, retry_interval=5.0, replay_rows=10000, logger=None):
+        self.transport = transport
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.spool = spool
+        self.retry_interval = retry_interval
+        self.replay_rows = replay_rows
+        self.logger = logger
+        self.next_retry_time = 0.0
+        self.lock = threading.RLock()
+        self.stop_event = threading.Event()
+        self.timer = None
+
+        self.rows = defaultdict(list)
+        self.row_count = 0
+        self.first_row_time = None
+
+        self.reset_statistics()
+
+    def add(self, redis_target, csv_string):
+        with self.lock:
+            if self.row_count == 0:
+                self.first_row_time = time.time()
+
+            self.rows[redis_target].append(csv_string)
+            self.row_count += 1
+
+            if self.row_count >= self.batch_size:
+                self.flush()
+            else:
+                self.flush_if_due()
+
+    def flush_if_due(self):
+        with self.lock:
+            if self.row_count > 0 and time.time() - self.first_row_time >= self.batch_interval:
+                self.flush()
+            else:
+                self.replay_if_due()
+
+    def start_timer(self):
+        """Call flush_if_due every batch_interval seconds in a background thread."""
+
+        self.stop_event.clear()
+        self.timer = threading.Thread(target=self.run_timer, daemon=True)
+        self.timer.start()
+
+    def stop_timer(self):
+        if self.timer is not None:
+            self.stop_event.set()
+            self.timer.join()
+            self.timer = None
+
+    def run_timer(self):
+        while not self.stop_event.wait(self.batch_interval):
+            try:
+                self.flush_if_due()
+            except RedisError as e:
+                # no spool: the rows stay and the next add() (or the timer after retry_interval) tries it again
+                if self.logger is not None:
+                    self.logger.warning(f"Failed to flush {self.row_count} rows to redis: {e}")
+                self.stop_event.wait(self.retry_interval)
+
+    def write(self, rows):
+        pipeline = self.transport.redis_client.pipeline(transaction=False)
+        for redis_target, csv_strings in rows.items():
+            self.transport.write(pipeline, redis_target, csv_strings)
+        pipeline.execute()
+
+    def flush(self):
+        with self.lock:
+            if self.row_count == 0:
+                return
+
+            if self.spool is not None and not self.spool.is_empty():
+                self.spool_rows()
+                self.replay_if_due()
+                return
+
+            start = time.time()
+            try:
+                self.write(self.rows)
+            except RedisError as e:
+                if self.spool is None:
+                    raise
+                if self.logger is not None:
+                    self.logger.warning(f"Redis is unreachable, spooling the beacons to '{self.spool.path}': {e}")
+                self.spool_rows()
+                self.next_retry_time = time.time() + self.retry_interval
+                return
+            end = time.time()
+
+            self.flush_counter += 1
+            self.flushed_rows += self.row_count
+            self.flush_duration += end - start
+            self.max_flush_duration = max(self.max_flush_duration, end - start)
+            self.max_row_latency = max(self.max_row_latency, end - self.first_row_time)
+
+            self.clear_rows()
+
+    def spool_rows(self):
+        self.spool.append(self.rows)
+        self.clear_rows()
+
+    def clear_rows(self):
+        self.rows = defaultdict(list)
+        self.row_count = 0
+        self.first_row_time = None
+
+    def replay_if_due(self):
+        """Replay spooled rows into redis (if redis was unreachable at most retry_interval seconds ago we wait)."""
+
+        if self.spool is None or self.spool.is_empty() or time.time() < self.next_retry_time:
+            return
+
+        try:
+            self.spool.replay(self.write, max_rows=self.replay_rows)
+        except RedisError:
+            self.next_retry_time = time.time() + self.retry_interval
+            return
+
+        if self.spool.is_empty() and self.logger is not None:
+            self.logger.warning("Redis is reachable again, the spool is replayed")
+
+    def reset_statistics(self):
+        self.flush_counter = 0
+        self.flushed_rows = 0
+        self.flush_duration = 0.0
+        self.max_flush_duration = 0.0
+        self.max_row_latency = 0.0
+        if self.spool is not None:
+            self.spool.reset_statistics()
+
+    def get_statistics_message(self):
+        """Returns a summary of the flushes since the last reset."""
+
+        if self.flush_counter == 0:
+            message = "no flushes"
+        else:
+            message = (
+                f"{self.flush_counter} flushes, "
+                f"avg {self.flushed_rows / self.flush_counter:.0f} rows/flush, "
+                f"avg {1000 * self.flush_duration / self.flush_counter:.1f} ms/flush, "
+                f"max {1000 * self.max_flush_duration:.1f} ms/flush, "
+                f"max latency {1000 * self.max_row_latency:.1f} ms"
+            )
+
+        if self.spool is not None and (self.spool.spooled_rows > 0 or not self.spool.is_empty()):
+            message += f", spool: {self.spool.get_statistics_message()}"
+        return message
@@ -0,0 +1,67 @@
+from datetime import timedelta
+
+SENDER_ATTRIBUTES = ["aircraft_type", "stealth", "address", "software_version", "hardware_version", "real_address"]
+ADDRESS_INDEX = SENDER_ATTRIBUTES.index("address")
+
+
+class SenderCache:
+    """The sender attributes (and lastseen) as they were written to the table 'senders' by this process.
+
+    A sender needs an upsert if its attributes changed or if its lastseen in the database is older than
+    lastseen_interval seconds.
+    """
+
+    def __init__(self):
+        self.senders = {}
+
+        self.reset_statistics()
+
+    def get_changed(self, senders, lastseen_interval):
+        """Returns the senders which need an upsert.
+
+        :param dict senders: name -> (firstseen, lastseen, attributes) with datetimes and a tuple of SENDER_ATTRIBUTES
+        :param lastseen_interval: seconds
+        """
+
+        lastseen_interval = timedelta(seconds=lastseen_interval)
+
+        changed = {}
+        for name, (firstseen, lastseen, attributes) in senders.items():
+            written = self.senders.get(name)
+            if written is None or written[0] != attributes or lastseen - written[1] >= lastseen_interval:
+                changed[name] = (firstseen, lastseen, attributes)
+
+        self.written_senders += len(changed)
+        self.skipped_senders += len(senders) - len(changed)
+        return changed
+
+    def get_new_addresses(self, senders):
+        """Returns the addresses of the senders which are new for this process or which have a new address."""
+
+        addresses = set()
+        for name, (firstseen, lastseen, attributes) in senders.items():
+            address = attributes[ADDRESS_INDEX]
+            written = self.senders.get(name)
+            if address is not None and (written is None or written[0][ADDRESS_INDEX] != address):
+                addresses.add(address)
+
+        return sorted(addresses)
+
+    def update(self, senders):
+        """Remember the written senders (call this after the commit)."""
+
+        for name, (firstseen, lastseen, attributes) in senders.items():
+            self.senders[name] = (attributes, lastseen)
+
+    def clear(self):
+        self.senders = {}
+
+    def reset_statistics(self):
+        self.written_senders = 0
+        self.skipped_senders = 0
+
+    def get_statistics_message(self):
+        return f"senders: {self.written_senders} upserts written, {self.skipped_senders} skipped, {len(self.senders)} cached"
+
+
+sender_cache = SenderCache()
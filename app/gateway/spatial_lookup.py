@@ -0,0 +1,133 @@
+import math
+from collections import defaultdict
+
+from shapely import wkb
+from shapely.geometry import Point
+from shapely.prepared import prep
+
+EARTH_RADIUS = 6370986      # same radius as PostGIS ST_DistanceSphere
+AIRPORT_STYLES = (2, 4, 5)  # landable airports
+
+
+class GridIndex:
+    """Maps the cells of a longitude/latitude grid to the items whose bounding box touches the cell."""
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+
+    def insert(self, bounds, item):
+        min_x, min_y, max_x, max_y = bounds
+        for x in range(math.floor(min_x / self.cell_size), math.floor(max_x / self.cell_size) + 1):
+            for y in range(math.floor(min_y / self.cell_size), math.floor(max_y / self.cell_size) + 1):
+                self.cells[(x, y)].append(item)
+
+    def query(self, longitude, latitude):
+        return self.cells.get((math.floor(longitude / self.cell_size), math.floor(latitude / self.cell_size)), [])
+
+
+def get_sphere_distance(longitude1, latitude1, longitude2, latitude2):
+    phi1 = math.radians(latitude1)
+    phi2 = math.radians(latitude2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(longitude2 - longitude1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+class SpatialLookup:
+    """Country and airport of a location with prepared geometries in grid indexes.
+
+    The results are the same as in SQL: the country is the country which contains the location (ST_Within)
+    and the airport is the nearest landable airport whose border contains the location.
+
+    :param list countries: (gid, geometry)
+    :param list airports: (id, border, longitude, latitude)
+    """
+
+    def __init__(self, countries, airports, country_cell_size=1.0, airport_cell_size=0.1, version=None):
+        self.version = version
+
+        self.country_index = GridIndex(country_cell_size)
+        for gid, geometry in countries:
+            self.country_index.insert(geometry.bounds, (gid, prep(geometry)))
+
+        self.airport_index = GridIndex(airport_cell_size)
+        for airport_id, border, longitude, latitude in airports:
+            self.airport_index.insert(border.bounds, (airport_id, prep(border), longitude, latitude))
+
+        self.locations = {}
+
+    @staticmethod
+    def get_database_version(cursor):
+        """Returns the number and max. id of the countries and the airports, so an import is noticed without loading the geometries."""
+
+        cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) FROM countries WHERE geom IS NOT NULL),
+                (SELECT MAX(gid) FROM countries),
+                (SELECT COUNT(*) FROM airports WHERE border IS NOT NULL),
+                (SELECT MAX(id) FROM airports);
+        """)
+        return tuple(cursor.fetchone())
+
+    @classmethod
+    def from_database(cls, cursor):
+        version = cls.get_database_version(cursor)
+        cursor.execute("SELECT gid, ST_AsBinary(geom) FROM countries WHERE geom IS NOT NULL;")
+        countries = [(gid, wkb.loads(bytes(geom))) for gid, geom in cursor.fetchall()]
+
+        cursor.execute(f"SELECT id, ST_AsBinary(border), ST_X(location), ST_Y(location) FROM airports WHERE border IS NOT NULL AND style IN {AIRPORT_STYLES};")
+        airports = [(airport_id, wkb.loads(bytes(border)), longitude, latitude) for airport_id, border, longitude, latitude in cursor.fetchall()]
+
+        return cls(countries, airports, version=version)
+
+    def get_country_id(self, longitude, latitude):
+        point = Point(longitude, latitude)
+        for gid, geometry in self.country_index.query(longitude, latitude):
+            if geometry.contains(point):
+                return gid
+
+        return None
+
+    def get_airport_id(self, longitude, latitude):
+        point = Point(longitude, latitude)
+        nearest_id = None
+        nearest_distance = None
+        for airport_id, border, airport_longitude, airport_latitude in self.airport_index.query(longitude, latitude):
+            if not border.contains(point):
+                continue
+
+            distance = math.inf if airport_longitude is None else get_sphere_distance(longitude, latitude, airport_longitude, airport_latitude)
+            if nearest_distance is None or distance < nearest_distance:
+                nearest_id = airport_id
+                nearest_distance = distance
+
+        return nearest_id
+
+    def get_moved(self, locations):
+        """Returns the locations (id -> (longitude, latitude)) which are new or different since update_locations()."""
+
+        return {receiver_id: location for receiver_id, location in locations.items() if self.locations.get(receiver_id) != location}
+
+    def update_locations(self, locations):
+        self.locations.update(locations)
+
+
+_spatial_lookup = None
+
+
+def get_spatial_lookup(cursor):
+    """Returns the SpatialLookup (loaded with the given cursor at the first call and again after an import of countries or airports)."""
+
+    global _spatial_lookup
+
+    if _spatial_lookup is None or _spatial_lookup.version != SpatialLookup.get_database_version(cursor):
+        _spatial_lookup = SpatialLookup.from_database(cursor)
+
+    return _spatial_lookup
+
+
+def reset_spatial_lookup():
+    """Forget the SpatialLookup, e.g. after an import of countries or airports."""
+
+    global _spatial_lookup
+    _spatial_lookup = None
@@ -0,0 +1,167 @@
+import os
+import struct
+import time
+from collections import defaultdict
+
+from app.gateway.transport import REDIS_TARGETS
+
+RECORD_HEADER = struct.Struct(">BI")    # index of the redis target, length of the csv string
+SEGMENT_SUFFIX = ".spool"
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+class Spool:
+    """Append-only local spool for the csv strings of the gateway (if redis is unreachable).
+
+    The rows are stored as binary records (redis target, length, utf-8 csv string) in numbered segment
+    files. replay() reads the segments in order and deletes a segment after all of its rows are written.
+    So the rows are delivered at least once: a segment which was partially replayed before the gateway
+    stopped is replayed again from its beginning.
+
+    :param str path: directory of the segment files
+    :param int segment_size: start a new segment if the current one is bigger than this (bytes)
+    :param str fsync: 'always' (after each append), 'interval' (at most every fsync_interval seconds) or 'never' (leave it to the OS)
+    """
+
+    def __init__(self, path, segment_size=16 * 1024 * 1024, fsync="interval", fsync_interval=1.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy '{fsync}', expected one of {FSYNC_POLICIES}")
+
+        self.path = path
+        self.segment_size = segment_size
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+
+        # the directory is created with the first segment, so reading commands (e.g. 'flask gateway transport_info') don't create it
+        filenames = os.listdir(path) if os.path.isdir(path) else []
+        self.segments = sorted(int(filename[:-len(SEGMENT_SUFFIX)]) for filename in filenames if filename.endswith(SEGMENT_SUFFIX))
+        self.size = sum(os.path.getsize(self.get_filename(number)) for number in self.segments)
+
+        self.file = None
+        self.file_number = None
+        self.last_fsync = time.time()
+        self.read_offset = 0
+
+        self.reset_statistics()
+
+    def get_filename(self, number):
+        return os.path.join(self.path, f"{number:010d}{SEGMENT_SUFFIX}")
+
+    def is_empty(self):
+        return not self.segments
+
+    def append(self, rows):
+        """Append the rows (redis_target -> list of csv strings)."""
+
+        records = []
+        count = 0
+        for redis_target, csv_strings in rows.items():
+            index = REDIS_TARGETS.index(redis_target)
+            for csv_string in csv_strings:
+                data = csv_string.encode("utf-8")
+                records.append(RECORD_HEADER.pack(index, len(data)))
+                records.append(data)
+            count += len(csv_strings)
+        data = b"".join(records)
+
+        if self.file is None:
+            os.makedirs(self.path, exist_ok=True)
+            self.file_number = self.segments[-1] + 1 if self.segments else 1
+            self.file = open(self.get_filename(self.file_number), "ab")
+            self.segments.append(self.file_number)
+
+        self.file.write(data)
+        self.size += len(data)
+        self.spooled_rows += count
+
+        if self.fsync == "always" or (self.fsync == "interval" and time.time() - self.last_fsync >= self.fsync_interval):
+            self.sync()
+
+        if self.file.tell() >= self.segment_size:
+            self.close_segment()
+
+    def sync(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.last_fsync = time.time()
+
+    def close_segment(self):
+        if self.file is None:
+            return
+
+        if self.fsync != "never":
+            self.sync()
+        self.file.close()
+        self.file = None
+        self.file_number = None
+
+    def read_segment(self, number, offset, max_rows):
+        """Returns the rows (redis_target -> list of csv strings), their count, the new offset and whether the segment is complete."""
+
+        with open(self.get_filename(number), "rb") as f:
+            f.seek(offset)
+            data = f.read()
+
+        rows = defaultdict(list)
+        count = 0
+        position = 0
+        while count < max_rows and position + RECORD_HEADER.size <= len(data):
+            index, length = RECORD_HEADER.unpack_from(data, position)
+            end = position + RECORD_HEADER.size + length
+            if end > len(data):     # incomplete record (the gateway stopped while writing)
+                position = len(data)
+                break
+            rows[REDIS_TARGETS[index]].append(data[position + RECORD_HEADER.size:end].decode("utf-8"))
+            count += 1
+            position = end
+
+        complete = position + RECORD_HEADER.size > len(data)
+        return rows, count, offset + position, complete
+
+    def replay(self, write, max_rows):
+        """Pass up to max_rows rows in their original order to write(rows) (rows: redis_target -> list of csv strings).
+
+        If write() raises, the rows stay in the spool. Returns the number of replayed rows.
+        """
+
+        start = time.time()
+        replayed = 0
+        while self.segments and replayed < max_rows:
+            number = self.segments[0]
+            if number == self.file_number:
+                self.close_segment()    # new rows go to the next segment
+
+            rows, count, offset, complete = self.read_segment(number, self.read_offset, max_rows - replayed)
+            if count > 0:
+                write(rows)
+            replayed += count
+
+            if complete:
+                filename = self.get_filename(number)
+                self.size -= os.path.getsize(filename)
+                os.remove(filename)
+                self.segments.pop(0)
+                self.read_offset = 0
+            else:
+                self.read_offset = offset
+
+        self.replayed_rows += replayed
+        self.replay_duration += time.time() - start
+        return replayed
+
+    def close(self):
+        self.close_segment()
+
+    def reset_statistics(self):
+        self.spooled_rows = 0
+        self.replayed_rows = 0
+        self.replay_duration = 0.0
+
+    def get_statistics_message(self):
+        """Returns the size of the spool and the rows spooled and replayed since the last reset."""
+
+        message = f"{len(self.segments)} segments, {self.size / 1024 / 1024:.1f} MB, {self.spooled_rows} rows spooled, {self.replayed_rows} rows replayed"
+        if self.replay_duration > 0:
+            message += f" ({self.replayed_rows / self.replay_duration:.0f} rows/s)"
+        return message
@@ -0,0 +1,154 @@
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+MAX = "max"
+MIN = "min"
+SUM = "sum"
+
+
+def combine_max(a, b):
+    return b if a is None else a if b is None else max(a, b)
+
+
+def combine_min(a, b):
+    return b if a is None else a if b is None else min(a, b)
+
+
+def combine_sum(a, b):
+    return a + b
+
+
+COMBINE = {MAX: combine_max, MIN: combine_min, SUM: combine_sum}
+SQL_COMBINE = {MAX: "GREATEST({excluded}, {current})", MIN: "LEAST({excluded}, {current})", SUM: "{excluded} + {current}"}
+
+# PostgreSQL advisory lock: shared while beacons with statistics are committed or the statistics are upserted,
+# exclusive while the statistics of a day are rebuilt (see app.collect.statistics)
+STATISTICS_REBUILD_LOCK = 727464
+
+
+def get_statistics_rebuilds(cursor, rebuild_id):
+    """Take the shared rebuild lock (until the end of the transaction) and return the rebuilds after rebuild_id: a list of (id, tablename, date).
+
+    Beacons committed in this transaction are not seen by the returned rebuilds, but by all later ones.
+    """
+
+    cursor.execute("SELECT pg_advisory_xact_lock_shared(%s);", (STATISTICS_REBUILD_LOCK, ))
+    cursor.execute("SELECT id, tablename, date FROM statistics_rebuilds WHERE id > %s ORDER BY id;", (rebuild_id, ))
+    return cursor.fetchall()
+
+
+class StatisticsAggregator:
+    """Aggregates the rows of a statistics table in memory and upserts the deltas with flush().
+
+    A row is a tuple with the values of the key columns followed by the values of the aggregate columns.
+
+    If a day of the table is rebuilt from the hypertables, the rows of this day which were aggregated before are dropped
+    (the rebuild counted their beacons). rebuild_id is the last rebuild which was applied.
+
+    :param str tablename: the statistics table (with an unique index on the key columns)
+    :param list key_columns: the columns of the unique index, the first one is the date
+    :param list aggregates: (column, MAX|MIN|SUM) for all other columns
+    """
+
+    def __init__(self, tablename, key_columns, aggregates):
+        self.tablename = tablename
+        self.key_columns = list(key_columns)
+        self.aggregates = list(aggregates)
+        self.key_length = len(self.key_columns)
+        self.combines = [COMBINE[function] for column, function in self.aggregates]
+
+        all_columns = ", ".join(self.key_columns + [column for column, function in self.aggregates])
+        updates = ", ".join(f"{column} = " + SQL_COMBINE[function].format(excluded=f"EXCLUDED.{column}", current=f"t.{column}") for column, function in self.aggregates)
+        self.upsert_sql = f"INSERT INTO {tablename} AS t ({all_columns}) VALUES %s ON CONFLICT ({', '.join(self.key_columns)}) DO UPDATE SET {updates}"
+
+        self.rows = {}
+        self.rebuild_id = 0
+        self.lock = threading.Lock()
+        self.last_flush = time.time()
+        self.reset_statistics()
+
+    def add(self, rows, rebuilds=()):
+        """Add rows, e.g. the result of a GROUP BY over a batch.
+
+        rebuilds are the result of get_statistics_rebuilds() in the transaction of the batch, they are applied before the rows are added.
+        """
+
+        with self.lock:
+            self.apply_rebuilds(rebuilds)
+            for row in rows:
+                self.merge(tuple(row[:self.key_length]), row[self.key_length:])
+            self.added_rows += len(rows)
+
+    def merge(self, key, values):
+        current = self.rows.get(key)
+        if current is None:
+            self.rows[key] = list(values)
+        else:
+            for i, combine in enumerate(self.combines):
+                current[i] = combine(current[i], values[i])
+
+    def apply_rebuilds(self, rebuilds):
+        """Drop the rows of the rebuilt days (the caller holds the lock)."""
+
+        for rebuild_id, tablename, date in rebuilds:
+            if rebuild_id <= self.rebuild_id:
+                continue
+            if tablename == self.tablename:
+                for key in [key for key in self.rows if key[0] == date]:
+                    del self.rows[key]
+                    self.dropped_rows += 1
+            self.rebuild_id = rebuild_id
+
+    def is_due(self, interval):
+        return time.time() - self.last_flush >= interval
+
+    def flush(self, connection):
+        """Upsert and commit the aggregated rows. If this fails the rows are kept for the next flush."""
+
+        with self.lock:
+            self.last_flush = time.time()
+            if not self.rows:
+                return 0
+
+        cursor = connection.cursor()
+        rows = {}
+        try:
+            rebuilds = get_statistics_rebuilds(cursor, self.rebuild_id)
+            with self.lock:
+                self.apply_rebuilds(rebuilds)
+                rows, self.rows = self.rows, {}
+
+            if rows:
+                execute_values(cursor, self.upsert_sql, [key + tuple(values) for key, values in rows.items()], page_size=1000)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            with self.lock:
+                for key, values in rows.items():
+                    self.merge(key, values)
+            raise
+        finally:
+            cursor.close()
+
+        with self.lock:
+            self.flushed_rows += len(rows)
+        return len(rows)
+
+    def clear(self):
+        with self.lock:
+            self.rows = {}
+
+    def reset_statistics(self):
+        self.added_rows = 0
+        self.flushed_rows = 0
+        self.dropped_rows = 0
+
+    def get_statistics_message(self):
+        """Returns the number of aggregated and upserted rows since the last reset."""
+
+        message = f"{self.tablename}: {self.added_rows} rows aggregated into {self.flushed_rows} upserts, {len(self.rows)} waiting"
+        if self.dropped_rows:
+            message += f", {self.dropped_rows} dropped (rebuilt days)"
+        return message
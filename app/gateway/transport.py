@@ -0,0 +1,250 @@
+import os
+import socket
+import time
+
+from flask import current_app
+from redis.exceptions import ResponseError
+
+from app import redis_client
+
+REDIS_TARGETS = ('receiver_status', 'receiver_position', 'sender_status', 'sender_position')
+
+
+class SortedSetTransport:
+    """The csv strings are stored in sorted sets (score: time of insertion).
+
+    Reading pops the rows, so they are lost if the transfer fails afterwards.
+    """
+
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+
+    def write(self, pipeline, redis_target, csv_strings):
+        score = str(time.time())
+        pipeline.zadd(name=redis_target, mapping={csv_string: score for csv_string in csv_strings}, nx=True)
+
+    def read(self, redis_target, count):
+        """Returns a list of csv strings and a token for ack()."""
+
+        csv_strings = [member.decode('utf-8') for member, score in self.redis_client.zpopmin(redis_target, count)]
+        return csv_strings, None
+
+    def read_chunks(self, redis_target, count, chunk_size):
+        """Yields lists of up to chunk_size csv strings and their tokens for ack() until count rows are read."""
+
+        while count > 0:
+            csv_strings, token = self.read(redis_target, min(count, chunk_size))
+            if not csv_strings:
+                return
+            yield csv_strings, token
+            count -= len(csv_strings)
+
+    def ack(self, redis_target, token):
+        pass
+
+    def get_info(self, redis_target):
+        return {'length': self.redis_client.zcard(redis_target)}
+
+
+class StreamTransport:
+    """The csv strings are stored in redis streams which are read by a consumer group.
+
+    The rows are acknowledged (and deleted) after they are in the database, so several transfer
+    processes can share the load and the rows of a crashed transfer are delivered again after
+    claim_idle_time seconds.
+    """
+
+    FIELD = 'row'
+
+    def __init__(self, redis_client, maxlen, group, consumer, claim_idle_time):
+        self.redis_client = redis_client
+        self.maxlen = maxlen
+        self.group = group
+        self.consumer = consumer
+        self.claim_idle_time = claim_idle_time
+
+        self.groups_created = set()
+
+    def write(self, pipeline, redis_target, csv_strings):
+        for csv_string in csv_strings:
+            pipeline.xadd(redis_target, {self.FIELD: csv_string}, maxlen=self.maxlen, approximate=True)
+
+    def create_group(self, redis_target):
+        if redis_target in self.groups_created:
+            return
+
+        try:
+            self.redis_client.xgroup_create(redis_target, self.group, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self.groups_created.add(redis_target)
+
+    def read(self, redis_target, count):
+        """Returns a list of csv strings and a token for ack()."""
+
+        csv_strings = []
+        entry_ids = []
+        for chunk_csv_strings, chunk_entry_ids in self.read_chunks(redis_target, count, count):
+            csv_strings += chunk_csv_strings
+            entry_ids += chunk_entry_ids
+        return csv_strings, entry_ids
+
+    def read_chunks(self, redis_target, count, chunk_size):
+        """Yields lists of up to chunk_size csv strings and their tokens for ack() until count rows are read.
+
+        First we take our own unacknowledged rows (the last transfer failed), then the rows of other
+        consumers which are pending for too long (the consumer crashed) and then new rows.
+        Our own pending rows are paged by their entry id because they stay pending until ack().
+        """
+
+        self.create_group(redis_target)
+
+        last_id = '0'
+        while count > 0:
+            requested = min(count, chunk_size)
+            entries = self.read_group(redis_target, last_id, requested)
+            if not entries:
+                break
+            last_id = entries[-1][0]
+            count -= len(entries)
+            yield self.split_entries(entries)
+            if len(entries) < requested:
+                break
+
+        if count > 0:
+            entries = self.claim(redis_target, min(count, chunk_size))
+            if entries:
+                count -= len(entries)
+                yield self.split_entries(entries)
+
+        while count > 0:
+            entries = self.read_group(redis_target, '>', min(count, chunk_size))
+            if not entries:
+                break
+            count -= len(entries)
+            yield self.split_entries(entries)
+
+    def split_entries(self, entries):
+        csv_strings = [fields[self.FIELD.encode()].decode('utf-8') for entry_id, fields in entries]
+        entry_ids = [entry_id for entry_id, fields in entries]
+        return csv_strings, entry_ids
+
+    def read_group(self, redis_target, stream_id, count):
+        entries = []
+        for _, stream_entries in self.redis_client.xreadgroup(self.group, self.consumer, {redis_target: stream_id}, count=count):
+            entries += stream_entries
+
+        # entries which are pending but already deleted have no fields
+        deleted_ids = [entry_id for entry_id, fields in entries if not fields]
+        if deleted_ids:
+            self.redis_client.xack(redis_target, self.group, *deleted_ids)
+
+        return [(entry_id, fields) for entry_id, fields in entries if fields]
+
+    def claim(self, redis_target, count):
+        min_idle_time = int(1000 * self.claim_idle_time)
+
+        # page through the pending rows, our own pending rows could hide the stale rows of other consumers
+        stale_ids = []
+        start_id = '-'
+        while len(stale_ids) < count:
+            pending_entries = self.redis_client.xpending_range(redis_target, self.group, min=start_id, max='+', count=count)
+            stale_ids += [entry['message_id'] for entry in pending_entries if entry['time_since_delivered'] >= min_idle_time and entry['consumer'].decode('utf-8') != self.consumer]
+            if len(pending_entries) < count:
+                break
+            milliseconds, sequence = pending_entries[-1]['message_id'].decode('utf-8').split('-')
+            start_id = f"{milliseconds}-{int(sequence) + 1}"
+        stale_ids = stale_ids[:count]
+        if not stale_ids:
+            return []
+
+        current_app.logger.warning(f"{redis_target}: claimed {len(stale_ids)} rows which were pending longer than {self.claim_idle_time}s")
+        return [(entry_id, fields) for entry_id, fields in self.redis_client.xclaim(redis_target, self.group, self.consumer, min_idle_time, stale_ids) if fields]
+
+    def ack(self, redis_target, token):
+        if not token:
+            return
+
+        pipeline = self.redis_client.pipeline(transaction=False)
+        pipeline.xack(redis_target, self.group, *token)
+        pipeline.xdel(redis_target, *token)
+        pipeline.execute()
+
+    def get_info(self, redis_target):
+        """Returns the length of the stream, the number of pending (delivered but not acknowledged) rows and the age of the oldest pending row."""
+
+        self.create_group(redis_target)
+
+        pending = self.redis_client.xpending(redis_target, self.group)
+        info = {'length': self.redis_client.xlen(redis_target), 'pending': pending['pending'], 'pending_lag': 0.0}
+        if pending['pending'] > 0:
+            oldest_id = pending['min'].decode('utf-8')
+            info['pending_lag'] = time.time() - int(oldest_id.split('-')[0]) / 1000
+        return info
+
+
+class TransferBatch:
+    """Up to count csv strings of a redis target which are read lazily in chunks of chunk_size rows while iterating.
+
+    So a transfer holds only one chunk of csv strings in memory, regardless of the batch size.
+    The batch can be iterated once, ack() acknowledges all the rows which have been read.
+    """
+
+    def __init__(self, transport, redis_target, count, chunk_size):
+        self.transport = transport
+        self.redis_target = redis_target
+        self.chunks = transport.read_chunks(redis_target, count, chunk_size)
+
+        self.first_chunk = None
+        self.tokens = []
+        self.rows = 0
+
+    def next_chunk(self):
+        for csv_strings, token in self.chunks:
+            self.tokens.append(token)
+            self.rows += len(csv_strings)
+            return csv_strings
+        return []
+
+    def is_empty(self):
+        if self.first_chunk is None:
+            self.first_chunk = self.next_chunk()
+        return not self.first_chunk
+
+    def __iter__(self):
+        if not self.is_empty():
+            first_chunk, self.first_chunk = self.first_chunk, []
+            yield from first_chunk
+
+        chunk = self.next_chunk()
+        while chunk:
+            yield from chunk
+            chunk = self.next_chunk()
+
+    def skip(self):
+        """Read all the rows without using them (for targets which are not stored)."""
+
+        for csv_string in self:
+            pass
+
+    def ack(self):
+        for token in self.tokens:
+            self.transport.ack(self.redis_target, token)
+
+
+def get_transport():
+    """Returns the transport configured with TRANSPORT ('sorted_set' or 'stream')."""
+
+    if current_app.config['TRANSPORT'] == 'stream':
+        return StreamTransport(
+            redis_client,
+            maxlen=current_app.config['TRANSPORT_STREAM_MAXLEN'],
+            group=current_app.config['TRANSPORT_STREAM_GROUP'],
+            consumer=f"{socket.gethostname()}-{os.getpid()}",
+            claim_idle_time=current_app.config['TRANSPORT_STREAM_CLAIM_IDLE_TIME'],
+        )
+    elif current_app.config['TRANSPORT'] == 'sorted_set':
+        return SortedSetTransport(redis_client)
+    else:
+        raise ValueError(f"Unknown TRANSPORT '{current_app.config['TRANSPORT']}'")
@@ -5,6 +5,7 @@ from .sender import Sender
 from .sender_info_origin import SenderInfoOrigin
 from .sender_info import SenderInfo
 from .sender_position import SenderPosition
+from .sender_position_downsampled import SenderPositionDownsampled
 from .receiver_position import ReceiverPosition
 from .receiver_status import ReceiverStatus
 from .receiver import Receiver
@@ -13,6 +14,8 @@ from .takeoff_landing import TakeoffLanding
 from .airport import Airport
 from .logbook import Logbook
 from .frequency_scan_file import FrequencyScanFile
+from .imported_file import ImportedFile
+from .statistics_rebuild import StatisticsRebuild
 
 from .geo import Location
 
@@ -0,0 +1,15 @@
+from app import db
+
+
+class ImportedFile(db.Model):
+    """Progress of 'flask gateway import' for a log file. It is written in the same transaction as the beacons, so a resumed import never copies them twice."""
+
+    __tablename__ = "imported_files"
+
+    filename = db.Column(db.String, primary_key=True)
+    lines = db.Column(db.BigInteger, nullable=False, default=0)     # lines of the file which are in the database
+    start_time = db.Column(db.DateTime)                             # time range of the chunks with the imported beacons
+    end_time = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return "<ImportedFile: %s,%s>" % (self.filename, self.lines)
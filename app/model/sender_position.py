@@ -60,3 +60,4 @@ class SenderPosition(db.Model):
     location_mgrs = db.Column(db.String(15))                # full mgrs (15 chars)
     location_mgrs_short = db.Column(db.String(9))           # reduced mgrs (9 chars), e.g. used for melissas range tool
     agl = db.Column(db.Float(precision=2))
+    is_trustworthy = db.Column(db.Boolean)                  # see app.utils.is_trustworthy
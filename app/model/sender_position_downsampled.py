@@ -0,0 +1,33 @@
+from geoalchemy2.types import Geometry
+from app import db
+
+from .aircraft_type import AircraftType
+
+
+class SenderPositionDownsampled(db.Model):
+    """The track of the senders after the retention of the full-rate sender positions: one position per sender and interval (see app.collect.retention)."""
+
+    __tablename__ = "sender_positions_downsampled"
+
+    reference_timestamp = db.Column(db.DateTime, primary_key=True)
+
+    name = db.Column(db.String, primary_key=True)
+    receiver_name = db.Column(db.String(9))
+    timestamp = db.Column(db.DateTime)
+    location = db.Column("location", Geometry("POINT", srid=4326))
+
+    track = db.Column(db.SmallInteger)
+    ground_speed = db.Column(db.Float(precision=2))
+    altitude = db.Column(db.Float(precision=2))
+
+    address = db.Column(db.String)
+    aircraft_type = db.Column(db.Enum(AircraftType), nullable=False, default=AircraftType.UNKNOWN)
+    climb_rate = db.Column(db.Float(precision=2))
+    turn_rate = db.Column(db.Float(precision=2))
+    error_count = db.Column(db.SmallInteger)
+
+    normalized_quality = db.Column(db.Float(precision=2))
+    agl = db.Column(db.Float(precision=2))
+    is_trustworthy = db.Column(db.Boolean)
+
+    __table_args__ = (db.Index('idx_sender_positions_downsampled_name_timestamp', 'name', 'timestamp'), )
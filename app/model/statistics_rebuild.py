@@ -0,0 +1,18 @@
+from app import db
+
+
+class StatisticsRebuild(db.Model):
+    """A day of a statistics table which was computed again from the hypertables (see app.collect.statistics).
+
+    The transfers drop their aggregated deltas of this day if they were aggregated before the rebuild, the rebuild counted these beacons.
+    """
+
+    __tablename__ = "statistics_rebuilds"
+
+    id = db.Column(db.Integer, primary_key=True)
+    tablename = db.Column(db.String, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    rebuilt_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return "<StatisticsRebuild: %s,%s,%s>" % (self.id, self.tablename, self.date)
@@ -2,4 +2,4 @@ from .sql_tasks import update_statistics, update_sender_direction_statistics
 
 from .orm_tasks import transfer_to_database
 from .orm_tasks import update_takeoff_landings, update_logbook, update_logbook_max_altitude
-from .orm_tasks import import_ddb
+from .orm_tasks import import_ddb, compress_chunks, purge_old_data
@@ -1,3 +1,8 @@
+import os
+
+from flask import current_app
+from celery.signals import worker_process_shutdown
+
 from datetime import datetime, timedelta
 
 from app.collect.logbook import update_takeoff_landings as logbook_update_takeoff_landings, update_logbook as logbook_update
@@ -6,8 +11,11 @@ from app.collect.logbook import update_max_altitudes as logbook_update_max_altit
 from app.collect.database import read_ddb, merge_sender_infos
 
 from app.collect.gateway import transfer_from_redis_to_database
+from app.gateway.message_handling import flush_statistics, STATISTICS_AGGREGATORS
+from app.collect.compression import compress_chunks as compression_compress_chunks
+from app.collect.retention import purge_old_data as retention_purge_old_data
 
-from app import db, celery
+from app import db, celery, create_app
 
 
 @celery.task(name="transfer_to_database")
@@ -18,6 +26,17 @@ def transfer_to_database():
     return result
 
 
+@worker_process_shutdown.connect
+def flush_transfer_statistics(**kwargs):
+    """Upsert the statistics which 'transfer_to_database' aggregated in memory before the worker process stops."""
+
+    if not any(aggregator.rows for aggregator in STATISTICS_AGGREGATORS):
+        return
+
+    with create_app(os.getenv('FLASK_CONFIG') or 'default').app_context():
+        flush_statistics(force=True)
+
+
 @celery.task(name="update_takeoff_landings")
 def update_takeoff_landings(last_minutes):
     """Compute takeoffs and landings."""
@@ -51,3 +70,21 @@ def import_ddb():
     sender_info_dicts = read_ddb()
     result = merge_sender_infos(sender_info_dicts)
     return result
+
+
+@celery.task(name="compress_chunks")
+def compress_chunks(compress_after=None):
+    """Compress the chunks of the position hypertables which are older than compress_after (default: TIMESCALEDB_COMPRESS_AFTER)."""
+
+    if compress_after is None:
+        compress_after = current_app.config["TIMESCALEDB_COMPRESS_AFTER"]
+    result = compression_compress_chunks(compress_after=compress_after)
+    return result
+
+
+@celery.task(name="purge_old_data")
+def purge_old_data():
+    """Downsample and drop the old sender positions (see RETENTION_RAW_DAYS)."""
+
+    result = retention_purge_old_data()
+    return result
@@ -82,16 +82,33 @@ def open_file(filename):
         return f
 
 
-def get_sql_trustworthy(source_table_alias):
-    MIN_DISTANCE = 1000
-    MAX_DISTANCE = 640000
-    MAX_NORMALIZED_QUALITY = 40     # this is enough for > 640km
-    MAX_ERROR_COUNT = 9
-    MAX_CLIMB_RATE = 50
+# Thresholds for a trustworthy sender position (used by is_trustworthy and get_sql_trustworthy)
+TRUSTWORTHY_MIN_DISTANCE = 1000
+TRUSTWORTHY_MAX_DISTANCE = 640000
+TRUSTWORTHY_MAX_NORMALIZED_QUALITY = 40     # this is enough for > 640km
+TRUSTWORTHY_MAX_ERROR_COUNT = 9
+TRUSTWORTHY_MAX_CLIMB_RATE = 50
+
+
+def is_trustworthy(distance, normalized_quality, error_count, climb_rate):
+    """Python version of get_sql_trustworthy. Falsy values are treated as NULL (like in the gateway csv strings)."""
+
+    if not distance or not TRUSTWORTHY_MIN_DISTANCE <= distance <= TRUSTWORTHY_MAX_DISTANCE:
+        return False
+    if not normalized_quality or normalized_quality > TRUSTWORTHY_MAX_NORMALIZED_QUALITY:
+        return False
+    if error_count and error_count > TRUSTWORTHY_MAX_ERROR_COUNT:
+        return False
+    if climb_rate and not -TRUSTWORTHY_MAX_CLIMB_RATE <= climb_rate <= TRUSTWORTHY_MAX_CLIMB_RATE:
+        return False
 
+    return True
+
+
+def get_sql_trustworthy(source_table_alias):
     return f"""
-            ({source_table_alias}.distance IS NOT NULL AND {source_table_alias}.distance BETWEEN {MIN_DISTANCE} AND {MAX_DISTANCE})
-        AND ({source_table_alias}.normalized_quality IS NOT NULL AND {source_table_alias}.normalized_quality <= {MAX_NORMALIZED_QUALITY})
-        AND ({source_table_alias}.error_count IS NULL OR {source_table_alias}.error_count <= {MAX_ERROR_COUNT})
-        AND ({source_table_alias}.climb_rate IS NULL OR {source_table_alias}.climb_rate BETWEEN -{MAX_CLIMB_RATE} AND {MAX_CLIMB_RATE})
+            ({source_table_alias}.distance IS NOT NULL AND {source_table_alias}.distance BETWEEN {TRUSTWORTHY_MIN_DISTANCE} AND {TRUSTWORTHY_MAX_DISTANCE})
+        AND ({source_table_alias}.normalized_quality IS NOT NULL AND {source_table_alias}.normalized_quality <= {TRUSTWORTHY_MAX_NORMALIZED_QUALITY})
+        AND ({source_table_alias}.error_count IS NULL OR {source_table_alias}.error_count <= {TRUSTWORTHY_MAX_ERROR_COUNT})
+        AND ({source_table_alias}.climb_rate IS NULL OR {source_table_alias}.climb_rate BETWEEN -{TRUSTWORTHY_MAX_CLIMB_RATE} AND {TRUSTWORTHY_MAX_CLIMB_RATE})
     """
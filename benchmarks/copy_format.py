@@ -0,0 +1,87 @@
+"""Benchmark for the text and the binary COPY of the transfer.
+
+Copies the beacons from tests/gateway/valid_messages (repeated up to --rows) into temporary tables and
+measures the rows/s, the client CPU (encoding) and the CPU of the database backend (parsing).
+The backend CPU is read from /proc, so it is only available if the database runs on this machine.
+
+Usage: python -m benchmarks.copy_format [--config default] [--rows 100000]
+"""
+
+import argparse
+import os
+import time
+
+from flask import current_app
+
+from app import create_app, db
+from app.gateway.message_handling import (
+    sender_position_message_to_csv_string, receiver_position_message_to_csv_string, receiver_status_message_to_csv_string,
+    SENDER_POSITION_COPY_COLUMNS, RECEIVER_POSITION_BEACON_FIELDS, RECEIVER_STATUS_BEACON_FIELDS,
+    SENDER_POSITION_PGCOPY_ENCODER, RECEIVER_POSITION_PGCOPY_ENCODER, RECEIVER_STATUS_PGCOPY_ENCODER,
+    copy_lines,
+)
+from benchmarks.csv_codec import get_messages
+
+
+def get_backend_cpu_time(pid):
+    """Returns the CPU time (seconds) of a local process or None."""
+
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")    # utime + stime
+
+
+def benchmark(name, table_definition, columns, lines, pgcopy_encoder):
+    for copy_format in ("text", "binary"):
+        current_app.config["TRANSFER_COPY_FORMAT"] = copy_format
+
+        connection = db.engine.raw_connection()
+        cursor = connection.cursor()
+        cursor.execute("SELECT pg_backend_pid();")
+        pid = cursor.fetchone()[0]
+        cursor.execute(f"CREATE TEMPORARY TABLE benchmark_copy ({table_definition}) ON COMMIT DROP;")
+
+        server_start = get_backend_cpu_time(pid)
+        client_start = time.process_time()
+        start = time.time()
+        copy_lines(cursor, "benchmark_copy", columns, lines, pgcopy_encoder)
+        duration = time.time() - start
+        client_duration = time.process_time() - client_start
+        server_end = get_backend_cpu_time(pid)
+
+        connection.rollback()
+        cursor.close()
+        connection.close()
+
+        server_cpu = f"{1e6 * (server_end - server_start) / len(lines):6.2f} us/row" if server_start is not None and server_end is not None else "   n/a"
+        print(f"{name:18s} {copy_format:6s} | {len(lines) / duration:9.0f} rows/s | client: {1e6 * client_duration / len(lines):6.2f} us/row | server: {server_cpu}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark for the text and the binary COPY of the transfer.")
+    parser.add_argument("--config", default="default", help="app configuration (with the database)")
+    parser.add_argument("--rows", type=int, default=100000, help="number of rows for each table")
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    with app.app_context():
+        messages = get_messages()
+
+        def repeat(lines):
+            return (lines * (args.rows // len(lines) + 1))[:args.rows]
+
+        sender_position_lines = [sender_position_message_to_csv_string(message, none_character=r"\N").rstrip("\n") + ",1,1\n" for message in messages["sender_position"]]
+        receiver_position_lines = [receiver_position_message_to_csv_string(message, none_character=r"\N") for message in messages["receiver_position"]]
+        receiver_status_lines = [receiver_status_message_to_csv_string(message, none_character=r"\N") for message in messages["receiver_status"]]
+
+        benchmark("sender_position", "LIKE sender_positions, sender_id INTEGER, receiver_id INTEGER", SENDER_POSITION_COPY_COLUMNS, repeat(sender_position_lines), SENDER_POSITION_PGCOPY_ENCODER)
+        benchmark("receiver_position", "LIKE receiver_positions", RECEIVER_POSITION_BEACON_FIELDS, repeat(receiver_position_lines), RECEIVER_POSITION_PGCOPY_ENCODER)
+        benchmark("receiver_status", "LIKE receiver_statuses", RECEIVER_STATUS_BEACON_FIELDS, repeat(receiver_status_lines), RECEIVER_STATUS_PGCOPY_ENCODER)
+
+
+if __name__ == "__main__":
+    main()
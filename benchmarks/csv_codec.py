@@ -0,0 +1,153 @@
+"""Microbenchmark for the csv encoding of beacon messages.
+
+Compares the per row cost of the former str.format based encoders with the CsvCodec
+and checks that both produce identical rows.
+
+Usage: python -m benchmarks.csv_codec [--repeat 2000]
+"""
+
+import argparse
+import glob
+import os
+import timeit
+
+from app import create_app
+from app.model import AircraftType
+from app.gateway.beacon_conversion import aprs_string_to_record
+from app.gateway.message_handling import SENDER_POSITION_CODEC, RECEIVER_POSITION_CODEC, RECEIVER_STATUS_CODEC
+
+VALID_MESSAGES_PATH = os.path.join(os.path.dirname(__file__), "..", "tests", "gateway", "valid_messages")
+
+
+# --- the encoders before the CsvCodec ---
+def legacy_sender_position_message_to_csv_string(message, none_character=''):
+    csv_string = "{0},{1},{2},{3},{4},{5},{6},{7},{8},{9},{10},{11},{12},{13},{14},{15},{16},{17},{18},{19},{20},{21},{22},{23},{24},{25},{26},{27},{28},{29},{30},{31}\n".format(
+        message['reference_timestamp'],
+
+        message['name'],
+        message['dstcall'],
+        message['relay'] if 'relay' in message and message['relay'] else none_character,
+        message['receiver_name'],
+        message['timestamp'],
+        message['location'],
+
+        message['track'] if 'track' in message and message['track'] else none_character,
+        message['ground_speed'] if 'ground_speed' in message and message['ground_speed'] else none_character,
+        int(message['altitude']) if message['altitude'] else none_character,
+
+        message['address_type'] if 'address_type' in message and message['address_type'] else none_character,   # 10
+        message['aircraft_type'].name if 'aircraft_type' in message and message['aircraft_type'] else AircraftType.UNKNOWN.name,
+        message['stealth'] if 'stealth' in message and message['stealth'] else none_character,
+        message['address'] if 'address' in message and message['address'] else none_character,
+        message['climb_rate'] if 'climb_rate' in message and message['climb_rate'] else none_character,
+        message['turn_rate'] if 'turn_rate' in message and message['turn_rate'] else none_character,
+        message['signal_quality'] if 'signal_quality' in message and message['signal_quality'] else none_character,
+        message['error_count'] if 'error_count' in message and message['error_count'] else none_character,
+        message['frequency_offset'] if 'frequency_offset' in message and message['frequency_offset'] else none_character,
+        message['gps_quality_horizontal'] if 'gps_quality_horizontal' in message and message['gps_quality_horizontal'] else none_character,
+        message['gps_quality_vertical'] if 'gps_quality_vertical' in message and message['gps_quality_vertical'] else none_character,   # 20
+        message['software_version'] if 'software_version' in message and message['software_version'] else none_character,
+        message['hardware_version'] if 'hardware_version' in message and message['hardware_version'] else none_character,
+        message['real_address'] if 'real_address' in message and message['real_address'] else none_character,
+        message['signal_power'] if 'signal_power' in message and message['signal_power'] else none_character,
+
+        message['distance'] if 'distance' in message and message['distance'] else none_character,
+        message['bearing'] if 'bearing' in message and message['bearing'] else none_character,
+        message['normalized_quality'] if 'normalized_quality' in message and message['normalized_quality'] else none_character,
+
+        message['location_mgrs'],
+        message['location_mgrs_short'],
+        message['agl'] if 'agl' in message else none_character,
+        message['is_trustworthy'] if message.get('is_trustworthy') is not None else none_character,
+    )
+    return csv_string
+
+
+def legacy_receiver_position_message_to_csv_string(message, none_character=''):
+    csv_string = "{0},{1},{2},{3},{4},{5},{6},{7},{8},{9}\n".format(
+        message['reference_timestamp'],
+
+        message['name'],
+        message['dstcall'],
+        message['receiver_name'],
+        message['timestamp'],
+        message['location'],
+
+        int(message['altitude']) if message['altitude'] else none_character,
+
+        message['location_mgrs'],
+        message['location_mgrs_short'],
+        message['agl'] if 'agl' in message else none_character,
+    )
+    return csv_string
+
+
+def legacy_receiver_status_message_to_csv_string(message, none_character=''):
+    csv_string = "{0},{1},{2},{3},{4},{5},{6},{7},{8}\n".format(
+        message['reference_timestamp'],
+
+        message['name'],
+        message['dstcall'],
+        message['receiver_name'],
+        message['timestamp'],
+
+        message['version'] if 'version' in message else none_character,
+        message['platform'] if 'platform' in message else none_character,
+
+        message['cpu_temp'] if 'cpu_temp' in message else none_character,
+        message['rec_input_noise'] if 'rec_input_noise' in message else none_character,
+
+    )
+    return csv_string
+
+
+def get_messages():
+    """Returns the parsed messages from tests/gateway/valid_messages for each table."""
+
+    messages = {"sender_position": [], "receiver_position": [], "receiver_status": []}
+    for filename in sorted(glob.glob(os.path.join(VALID_MESSAGES_PATH, "*.txt"))):
+        with open(filename) as f:
+            for line in f:
+                if line.startswith("#") or not line.strip():
+                    continue
+
+                result = aprs_string_to_record(line.strip())
+                if result is None:
+                    continue
+
+                redis_target, record = result
+                message = {field: value for field, value in record.as_dict().items() if value is not None}
+                message["raw_message"] = line.strip()
+                messages[redis_target].append(message)
+
+    return messages
+
+
+def benchmark(name, messages, legacy_encoder, codec, repeat):
+    for message in messages:
+        assert legacy_encoder(message, none_character=r"\N") == codec.encode(message), f"Different output for {message['raw_message']}"
+
+    rows = len(messages) * repeat
+    legacy = timeit.timeit(lambda: [legacy_encoder(message, none_character=r"\N") for message in messages], number=repeat)
+    single = timeit.timeit(lambda: [codec.encode(message) for message in messages], number=repeat)
+    batch = timeit.timeit(lambda: codec.encode_batch(messages), number=repeat)
+
+    print(f"{name:18s} {len(messages):4d} msgs | before: {1e6 * legacy / rows:6.2f} us/row | codec: {1e6 * single / rows:6.2f} us/row | codec batch: {1e6 * batch / rows:6.2f} us/row | speedup: {legacy / batch:4.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark for the csv encoding of beacon messages.")
+    parser.add_argument("--repeat", type=int, default=2000, help="how often the messages are encoded")
+    args = parser.parse_args()
+
+    app = create_app("testing")
+    with app.app_context():
+        messages = get_messages()
+
+    benchmark("sender_position", messages["sender_position"], legacy_sender_position_message_to_csv_string, SENDER_POSITION_CODEC, args.repeat)
+    benchmark("receiver_position", messages["receiver_position"], legacy_receiver_position_message_to_csv_string, RECEIVER_POSITION_CODEC, args.repeat)
+    benchmark("receiver_status", messages["receiver_status"], legacy_receiver_status_message_to_csv_string, RECEIVER_STATUS_CODEC, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Memory benchmark for the records of the beacon conversion (parse -> micro-batch -> encode).
+
+Converts the beacons of tests/gateway/valid_messages with the former message dicts and with the
+records of the CsvCodec, checks that both give identical csv rows and measures the memory held by
+a micro-batch and the peak of the whole conversion with tracemalloc.
+
+Usage: python -m benchmarks.message_records [--batch-size 1000] [--repeat 10]
+"""
+
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+
+from ogn.parser import parse
+from ogn.parser.utils import CheapRuler, normalized_quality
+
+from app import create_app
+from app.model import AircraftType
+from app.gateway.beacon_conversion import aprs_string_to_record, record_to_csv_string, get_mgrs, receiver_position_cache, RECEIVER_BEACON_TYPES
+from app.gateway.elevation import get_elevation_service
+from app.gateway.message_handling import receiver_status_message_to_csv_string, receiver_position_message_to_csv_string, sender_position_message_to_csv_string
+from app.utils import is_trustworthy
+
+VALID_MESSAGES_PATH = os.path.join(os.path.dirname(__file__), "..", "tests", "gateway", "valid_messages")
+
+
+def get_aprs_strings():
+    aprs_strings = []
+    for filename in sorted(glob.glob(os.path.join(VALID_MESSAGES_PATH, "*.txt"))):
+        with open(filename) as f:
+            aprs_strings.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    return aprs_strings
+
+
+# --- the conversion with message dicts before the records ---
+def legacy_aprs_string_to_message(aprs_string):
+    try:
+        message = parse(aprs_string)
+    except Exception:
+        return None
+
+    if message['aprs_type'] not in ('position', 'status'):
+        return None
+    elif message['aprs_type'] == 'position':
+        latitude = message["latitude"]
+        longitude = message["longitude"]
+        message["location"] = "SRID=4326;POINT({} {})".format(longitude, latitude)
+        message["location_mgrs"], message["location_mgrs_short"] = get_mgrs(latitude, longitude)
+
+        elevation_service = get_elevation_service()
+        if elevation_service is not None and message.get('altitude') is not None:
+            elevation = elevation_service.get_elevation(latitude, longitude)
+            if elevation is not None:
+                message['agl'] = message['altitude'] - elevation
+
+        receiver_position_cache.update(message['name'], longitude, latitude)
+        if message['beacon_type'] not in RECEIVER_BEACON_TYPES:
+            receiver_position = receiver_position_cache.get(message['receiver_name'])
+            if receiver_position is not None:
+                cheap_ruler = CheapRuler((latitude + receiver_position[1]) / 2.0)
+                message['distance'] = cheap_ruler.distance((longitude, latitude), receiver_position)
+                bearing = int(cheap_ruler.bearing((longitude, latitude), receiver_position))
+                message['bearing'] = bearing if bearing < 360 else 0
+                message['normalized_quality'] = normalized_quality(message['distance'], message['signal_quality']) if 'signal_quality' in message else None
+
+        if "aircraft_type" in message:
+            message["aircraft_type"] = AircraftType(message["aircraft_type"]) if message["aircraft_type"] in AircraftType.list() else AircraftType.UNKNOWN
+
+        if "gps_quality" in message:
+            if message["gps_quality"] is not None and "horizontal" in message["gps_quality"]:
+                message["gps_quality_horizontal"] = message["gps_quality"]["horizontal"]
+                message["gps_quality_vertical"] = message["gps_quality"]["vertical"]
+            del message["gps_quality"]
+
+    return message
+
+
+def legacy_message_to_csv_string(message):
+    if message['beacon_type'] in RECEIVER_BEACON_TYPES:
+        if message['aprs_type'] == 'status':
+            return receiver_status_message_to_csv_string(message, none_character=r'\N')
+        return receiver_position_message_to_csv_string(message, none_character=r'\N')
+    elif message['aprs_type'] == 'position':
+        message['is_trustworthy'] = is_trustworthy(message.get('distance'), message.get('normalized_quality'), message.get('error_count'), message.get('climb_rate'))
+        return sender_position_message_to_csv_string(message, none_character=r'\N')
+    return None
+
+
+def convert_with_dicts(aprs_strings):
+    batch = [message for message in map(legacy_aprs_string_to_message, aprs_strings) if message is not None]
+    return batch, lambda: [csv_string for csv_string in map(legacy_message_to_csv_string, batch) if csv_string is not None]
+
+
+def convert_with_records(aprs_strings):
+    # relations=None: the relations are calculated one at a time like in the former conversion
+    batch = [result for result in map(aprs_string_to_record, aprs_strings) if result is not None]
+    return batch, lambda: [record_to_csv_string(redis_target, record) for redis_target, record in batch]
+
+
+def measure(name, convert, aprs_strings):
+    receiver_position_cache.clear()
+    get_mgrs.cache_clear()
+    convert(aprs_strings)   # warm up (the receivers are known and the MGRS cache is filled like in the running gateway)
+
+    tracemalloc.start()
+    batch, encode = convert(aprs_strings)
+    batch_size, _ = tracemalloc.get_traced_memory()
+    csv_strings = encode()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:8s} batch: {batch_size / len(batch):7.0f} bytes/beacon | peak: {peak / 1024:7.0f} KiB")
+    return csv_strings
+
+
+def measure_times(conversions, aprs_strings, repeat):
+    """Time the conversions alternately and show the best run of each, so a busy machine affects all of them alike."""
+
+    durations = {name: float('inf') for name, convert in conversions}
+    for _ in range(repeat):
+        for name, convert in conversions:
+            start = time.perf_counter()
+            encode = convert(aprs_strings)[1]
+            encode()
+            durations[name] = min(durations[name], time.perf_counter() - start)
+
+    for name, duration in durations.items():
+        print(f"{name:8s} {1e6 * duration / len(aprs_strings):6.2f} us/beacon")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory benchmark for the records of the beacon conversion.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="number of aprs_strings of the micro-batch")
+    parser.add_argument("--repeat", type=int, default=10, help="number of timed runs of each conversion (the best one is shown)")
+    args = parser.parse_args()
+
+    aprs_strings = get_aprs_strings()
+    aprs_strings = (aprs_strings * (args.batch_size // len(aprs_strings) + 1))[:args.batch_size]
+
+    app = create_app("testing")
+    with app.app_context():
+        dict_csv_strings = measure("dicts", convert_with_dicts, aprs_strings)
+        record_csv_strings = measure("records", convert_with_records, aprs_strings)
+        measure_times([("dicts", convert_with_dicts), ("records", convert_with_records)], aprs_strings, args.repeat)
+
+    # the reference_timestamp is the time of the parsing
+    assert [row.split(",", 1)[1] for row in dict_csv_strings] == [row.split(",", 1)[1] for row in record_csv_strings], "Different csv rows"
+    print(f"{len(record_csv_strings)} identical csv rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Microbenchmark for the cached MGRS conversion of the beacon conversion.
+
+Converts the positions of tests/gateway/valid_messages with and without the cache and checks that
+both give identical results. With --repeat each position is sent several times (like parking aircraft
+and receivers do), the first round is always a cache miss.
+
+Usage: python -m benchmarks.mgrs_cache [--repeat 20]
+"""
+
+import argparse
+import glob
+import os
+import time
+
+from ogn.parser import parse
+
+from app.gateway.beacon_conversion import get_mgrs, mgrs
+
+VALID_MESSAGES_PATH = os.path.join(os.path.dirname(__file__), "..", "tests", "gateway", "valid_messages")
+
+
+def get_locations():
+    """Returns (latitude, longitude) of the position beacons in tests/gateway/valid_messages."""
+
+    locations = []
+    for filename in sorted(glob.glob(os.path.join(VALID_MESSAGES_PATH, "*.txt"))):
+        with open(filename) as f:
+            for line in f:
+                if line.startswith("#") or not line.strip():
+                    continue
+
+                try:
+                    message = parse(line.strip())
+                except Exception:
+                    continue
+
+                if message["aprs_type"] == "position":
+                    locations.append((message["latitude"], message["longitude"]))
+
+    return locations
+
+
+def uncached_mgrs(latitude, longitude):
+    location_mgrs = mgrs.toMGRS(latitude, longitude)
+    if isinstance(location_mgrs, bytes):
+        location_mgrs = location_mgrs.decode("utf-8")
+    return location_mgrs, location_mgrs[0:5] + location_mgrs[5:7] + location_mgrs[10:12]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark for the cached MGRS conversion.")
+    parser.add_argument("--repeat", type=int, default=20, help="how often each position is sent")
+    args = parser.parse_args()
+
+    locations = get_locations() * args.repeat
+
+    start = time.time()
+    uncached_results = [uncached_mgrs(latitude, longitude) for latitude, longitude in locations]
+    uncached_duration = time.time() - start
+
+    get_mgrs.cache_clear()
+    start = time.time()
+    cached_results = [get_mgrs(latitude, longitude) for latitude, longitude in locations]
+    cached_duration = time.time() - start
+
+    assert uncached_results == cached_results, "Different results"
+
+    cache_info = get_mgrs.cache_info()
+    print(f"{len(locations)} positions ({len(locations) // args.repeat} different), hit rate: {cache_info.hits / len(locations):.0%}, identical results")
+    print(f"toMGRS:   {1e6 * uncached_duration / len(locations):6.2f} us/position")
+    print(f"get_mgrs: {1e6 * cached_duration / len(locations):6.2f} us/position (speedup: {uncached_duration / cached_duration:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Microbenchmark for the relations (distance, bearing, normalized_quality) of the sender positions.
+
+Compares the CheapRuler of ogn.parser (one position at a time) with the vectorized calculation
+of add_relations() for several micro-batch sizes.
+
+Usage: python -m benchmarks.relations [--positions 20000]
+"""
+
+import argparse
+import random
+import time
+
+from ogn.parser.utils import CheapRuler
+
+from app.gateway.receiver_cache import get_relations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark for the relations of the sender positions.")
+    parser.add_argument("--positions", type=int, default=20000, help="number of sender positions")
+    args = parser.parse_args()
+
+    receivers = [(random.uniform(-10, 30), random.uniform(35, 65)) for _ in range(1000)]
+    pairs = []
+    for _ in range(args.positions):
+        receiver = random.choice(receivers)
+        pairs.append(((receiver[0] + random.uniform(-1, 1), receiver[1] + random.uniform(-1, 1)), receiver))
+
+    start = time.time()
+    for sender, receiver in pairs:
+        cheap_ruler = CheapRuler((sender[1] + receiver[1]) / 2.0)
+        cheap_ruler.distance(sender, receiver)
+        cheap_ruler.bearing(sender, receiver)
+    scalar_duration = time.time() - start
+    print(f"CheapRuler:           {1e6 * scalar_duration / len(pairs):6.2f} us/position")
+
+    for batch_size in (16, 64, 200, 1000):
+        start = time.time()
+        for i in range(0, len(pairs), batch_size):
+            batch = pairs[i:i + batch_size]
+            get_relations(
+                [sender[0] for sender, receiver in batch],
+                [sender[1] for sender, receiver in batch],
+                [receiver[0] for sender, receiver in batch],
+                [receiver[1] for sender, receiver in batch],
+            )
+        duration = time.time() - start
+        print(f"vectorized ({batch_size:4d}/batch): {1e6 * duration / len(pairs):6.2f} us/position (speedup: {scalar_duration / duration:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
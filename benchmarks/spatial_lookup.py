@@ -0,0 +1,85 @@
+"""Benchmark for the country and airport assignment of receivers.
+
+Compares the former SQL path (ST_Within against all countries and the correlated airport subquery)
+with the SpatialLookup of the transfer and checks that both give the same results.
+Needs a database with countries and airports (flask database import_airports ...).
+
+Usage: python -m benchmarks.spatial_lookup [--config default] [--points 2000]
+"""
+
+import argparse
+import random
+import time
+
+from app import create_app, db
+from app.gateway.spatial_lookup import SpatialLookup, AIRPORT_STYLES
+
+SQL_LOOKUP = f"""
+    SELECT
+        (SELECT c.gid FROM countries AS c WHERE ST_Within(v.location, c.geom) LIMIT 1) AS country_id,
+        (
+            SELECT a.id
+            FROM airports AS a
+            WHERE ST_Contains(a.border, v.location) AND a.style IN {AIRPORT_STYLES}
+            ORDER BY ST_DistanceSphere(a.location, v.location)
+            LIMIT 1
+        ) AS airport_id
+    FROM (
+        SELECT i, ST_SetSRID(ST_MakePoint(longitude, latitude), 4326) AS location
+        FROM unnest(%s::float8[], %s::float8[]) WITH ORDINALITY AS t(longitude, latitude, i)
+    ) AS v
+    ORDER BY v.i;
+"""
+
+
+def get_points(cursor, count):
+    """Returns the receiver locations and random points near the airports (half of each)."""
+
+    cursor.execute("SELECT ST_X(location), ST_Y(location) FROM receivers WHERE location IS NOT NULL LIMIT %s;", (count // 2, ))
+    points = cursor.fetchall()
+
+    cursor.execute(f"SELECT ST_X(location), ST_Y(location) FROM airports WHERE location IS NOT NULL AND style IN {AIRPORT_STYLES} ORDER BY random() LIMIT %s;", (count - len(points), ))
+    points += [(longitude + random.uniform(-0.02, 0.02), latitude + random.uniform(-0.02, 0.02)) for longitude, latitude in cursor.fetchall()]
+
+    return points
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark for the country and airport assignment of receivers.")
+    parser.add_argument("--config", default="default", help="app configuration (with the database)")
+    parser.add_argument("--points", type=int, default=2000, help="number of locations")
+    args = parser.parse_args()
+
+    app = create_app(args.config)
+    with app.app_context():
+        connection = db.engine.raw_connection()
+        cursor = connection.cursor()
+
+        points = get_points(cursor, args.points)
+        longitudes = [longitude for longitude, latitude in points]
+        latitudes = [latitude for longitude, latitude in points]
+
+        start = time.time()
+        cursor.execute(SQL_LOOKUP, (longitudes, latitudes))
+        sql_results = cursor.fetchall()
+        sql_duration = time.time() - start
+
+        start = time.time()
+        spatial_lookup = SpatialLookup.from_database(cursor)
+        load_duration = time.time() - start
+
+        start = time.time()
+        lookup_results = [(spatial_lookup.get_country_id(longitude, latitude), spatial_lookup.get_airport_id(longitude, latitude)) for longitude, latitude in points]
+        lookup_duration = time.time() - start
+
+        cursor.close()
+        connection.close()
+
+    differences = sum(1 for sql_result, lookup_result in zip(sql_results, lookup_results) if tuple(sql_result) != lookup_result)
+    print(f"{len(points)} locations, {differences} different results")
+    print(f"SQL:           {1e3 * sql_duration / len(points):8.3f} ms/location")
+    print(f"SpatialLookup: {1e3 * lookup_duration / len(points):8.3f} ms/location (+ {load_duration:.1f}s for loading)")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,53 @@ class BaseConfig:
 
     APRS_USER = "OGNPYTHON"
 
+    # Transport between gateway and transfer: 'sorted_set' or 'stream' (redis streams with consumer groups and acknowledgements)
+    # Before switching the transport the redis keys must be empty (see 'flask gateway transport_info')
+    TRANSPORT = "sorted_set"
+    TRANSPORT_STREAM_MAXLEN = 2000000           # approx. max. rows per stream (older rows are dropped)
+    TRANSPORT_STREAM_GROUP = "transfer"
+    TRANSPORT_STREAM_CLAIM_IDLE_TIME = 300      # rows of a crashed transfer are delivered again after this time (seconds)
+
+    # Gateway stuff
+    GATEWAY_REDIS_BATCH_SIZE = 500          # write the parsed beacons to redis when we have this many ...
+    GATEWAY_REDIS_BATCH_INTERVAL = 0.05     # ... or when the oldest beacon waits longer than this (seconds)
+    GATEWAY_PARSE_SUBMIT_TIMEOUT = 1.0      # 'flask gateway run --workers': drop a line if the queue of its parser process is still full after this time (seconds)
+    GATEWAY_RECEIVER_CACHE_SIZE = 50000     # max. positions for the distance/bearing of the sender positions to their receivers (warmed from the database)
+    GATEWAY_IGNORE_DSTCALLS = ()            # drop the beacons with these dstcalls before parsing, e.g. ("OGSPOT", "OGINRE")
+    GATEWAY_IGNORE_NAMES = ()               # drop the beacons with names starting with these prefixes before parsing
+    GATEWAY_SPOOL_PATH = os.environ.get("GATEWAY_SPOOL_PATH")   # if redis is unreachable the beacons are spooled here and replayed later (None: drop them), use an absolute path
+    GATEWAY_SPOOL_SEGMENT_SIZE = 16 * 1024 * 1024   # max. bytes per spool file
+    GATEWAY_SPOOL_FSYNC = "interval"        # "always": fsync after each write, "interval": every GATEWAY_SPOOL_FSYNC_INTERVAL seconds, "never": leave it to the OS
+    GATEWAY_SPOOL_FSYNC_INTERVAL = 1.0      # seconds
+    GATEWAY_SPOOL_RETRY_INTERVAL = 5.0      # try to reach redis again after this time (seconds)
+    GATEWAY_SPOOL_REPLAY_ROWS = 10000       # max. rows which are replayed at once
+    GATEWAY_ARCHIVE_PATH = os.environ.get("GATEWAY_ARCHIVE_PATH")   # write every raw line into hourly archive files here (None: no archive)
+    GATEWAY_ARCHIVE_COMPRESSION = "gzip"    # "gzip" or "zstd" (needs the package zstandard)
+    GATEWAY_ARCHIVE_QUEUE_SIZE = 100000     # max. lines waiting for the archive writer, more are dropped
+
+    # Transfer stuff
+    TRANSFER_MAX_BATCH_ROWS = 100000        # max. rows per redis target and transfer
+    TRANSFER_CHUNK_ROWS = 5000              # rows which are read from redis at once while copying (bounds the memory of a transfer)
+    TRANSFER_TARGET_LATENCY = 2.0           # 'flask gateway transfer --follow': target duration of a transfer (seconds)
+    TRANSFER_STATISTICS_FLUSH_INTERVAL = 600    # upsert the statistics which the transfer aggregates in memory after this time (seconds), they are lost if the process crashes
+    TRANSFER_SENDER_LASTSEEN_INTERVAL = 60      # update senders.lastseen at most once in this time (seconds) if nothing else changed
+    TRANSFER_COPY_FORMAT = "text"               # "text": COPY the csv strings, "binary": convert them to the binary COPY format (less server CPU)
+
+    # TimescaleDB compression of the position hypertables (see 'flask database enable_compression')
+    # Compressed chunks are read only: 'flask gateway import' cannot add beacons to them, so keep this longer than the transfer lags behind
+    TIMESCALEDB_COMPRESS_AFTER = "7 days"
+
+    # Retention of the sender positions (see the task 'purge_old_data' and 'flask database purge')
+    RETENTION_RAW_DAYS = None               # keep the full-rate sender positions for this many days (None: keep them forever) ...
+    RETENTION_DOWNSAMPLE_INTERVAL = 10      # ... but before they are dropped keep one position per sender and interval (seconds) with the lowest error_count ...
+    RETENTION_DOWNSAMPLED_MONTHS = 12       # ... for this many months (None: keep them forever)
+
+    # Elevation stuff: if ELEVATION_HGT_PATH points to the unzipped SRTM tiles (see srtm/), the gateway computes the AGL.
+    # Otherwise (or if there is no tile for a location) the transfer computes it from the 'elevation' table in the database.
+    ELEVATION_HGT_PATH = os.environ.get("ELEVATION_HGT_PATH")
+    ELEVATION_MAX_OPEN_TILES = 64
+    TRANSFER_AGL_FROM_DATABASE = True
+
     # Upload configuration
     MAX_CONTENT_LENGTH = 1024 * 1024    # max. 1MB
     UPLOAD_EXTENSIONS = ['.csv']
@@ -31,6 +78,7 @@ class DefaultConfig(BaseConfig):
     from celery.schedules import crontab
     from datetime import timedelta
 
+    # Remove "transfer_to_database" if you run 'flask gateway transfer --follow'
     CELERYBEAT_SCHEDULE = {
         "transfer_to_database": {"task": "transfer_to_database", "schedule": timedelta(minutes=1)},
         "update_statistics": {"task": "update_statistics", "schedule": timedelta(minutes=5)},
@@ -39,9 +87,10 @@ class DefaultConfig(BaseConfig):
         "update_logbook_previous_day": {"task": "update_logbook", "schedule": crontab(hour=1, minute=0), "kwargs": {"day_offset": -1}},
 
         "update_ddb_daily": {"task": "import_ddb", "schedule": timedelta(days=1)},
+        "compress_chunks": {"task": "compress_chunks", "schedule": crontab(hour=2, minute=0)},
         #"update_logbook_max_altitude": {"task": "update_logbook_max_altitude", "schedule": timedelta(minutes=1), "kwargs": {"offset_days": 0}},
 
-        #"purge_old_data": {"task": "purge_old_data", "schedule": timedelta(hours=1), "kwargs": {"max_hours": 48}},
+        "purge_old_data": {"task": "purge_old_data", "schedule": crontab(hour=3, minute=0)},
     }
 
     FLASK_PROFILER = {
@@ -33,7 +33,7 @@ setup(
         'Programming Language :: Python :: 3.9-dev'
     ],
     keywords='gliding ogn',
-    packages=find_packages(exclude=['tests', 'tests.*']),
+    packages=find_packages(exclude=['tests', 'tests.*', 'benchmarks', 'benchmarks.*']),
     install_requires=[
         'Flask==2.0.2',
         'Flask-SQLAlchemy==2.5.1',
@@ -62,6 +62,9 @@ setup(
         'flydenity==0.1.6',
         'gunicorn==20.1.0'
     ],
+    extras_require={
+        'zstd': ['zstandard==0.17.0'],
+    },
     test_require=[
         'pytest==5.0.1',
         'flake8==1.1.1',
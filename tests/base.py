@@ -1,5 +1,9 @@
 import unittest
 from app import create_app, db
+from app.gateway.id_cache import sender_id_cache, receiver_id_cache
+from app.gateway.message_handling import STATISTICS_AGGREGATORS
+from app.gateway.sender_cache import sender_cache
+from app.gateway.spatial_lookup import reset_spatial_lookup
 
 
 class TestBaseDB(unittest.TestCase):
@@ -9,6 +13,14 @@ class TestBaseDB(unittest.TestCase):
         self.app_context = self.app.app_context()
         self.app_context.push()
 
+        # the ids of the senders and receivers are not valid anymore
+        sender_id_cache.clear()
+        receiver_id_cache.clear()
+        for aggregator in STATISTICS_AGGREGATORS:
+            aggregator.clear()
+        sender_cache.clear()
+        reset_spatial_lookup()
+
         db.session.execute("DROP TABLE IF EXISTS elevation;")
         db.session.commit()
 
@@ -31,6 +43,7 @@ class TestBaseDB(unittest.TestCase):
         #db.session.execute("SELECT create_hypertable('sender_statuses', 'reference_timestamp', chunk_time_interval => interval '1 day', if_not_exists => TRUE);")
         db.session.execute("SELECT create_hypertable('receiver_positions', 'reference_timestamp', chunk_time_interval => interval '1 day', if_not_exists => TRUE);")
         db.session.execute("SELECT create_hypertable('receiver_statuses', 'reference_timestamp', chunk_time_interval => interval '1 day', if_not_exists => TRUE);")
+        db.session.execute("SELECT create_hypertable('sender_positions_downsampled', 'reference_timestamp', chunk_time_interval => interval '7 days', if_not_exists => TRUE);")
         db.session.commit()
 
         # ... and insert some countries
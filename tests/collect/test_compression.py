@@ -0,0 +1,44 @@
+import unittest
+from datetime import datetime
+
+from tests.base import TestBaseDB, db
+
+from app.collect.compression import enable_compression, compress_chunks, get_chunk_sizes
+from app.collect.reprocess import get_chunks, reprocess_chunk
+
+
+class TestCompression(TestBaseDB):
+    def setUp(self):
+        super().setUp()
+
+        db.session.execute("INSERT INTO sender_positions(name, receiver_name, location, altitude, timestamp, reference_timestamp, signal_quality, distance, normalized_quality) VALUES('FLRDDEFF7', 'Koenigsdf', 'SRID=4326;POINT(11.4 47.8)', 604, '2016-07-02 10:47:12', '2016-07-02 10:47:12', 7.0, 20000, NULL)")
+        db.session.execute("INSERT INTO sender_positions(name, receiver_name, location, altitude, timestamp, reference_timestamp, signal_quality, distance, normalized_quality) VALUES('FLRDDEFF7', 'Koenigsdf', 'SRID=4326;POINT(11.4 47.8)', 605, '2016-07-02 10:47:16', '2016-07-02 10:47:16', 7.0, 20000, NULL)")
+        db.session.commit()
+
+    def test_compress_chunks(self):
+        enable_compression(compress_after="7 days")
+        self.assertEqual(compress_chunks(compress_after="7 days"), 1)
+        self.assertEqual(compress_chunks(compress_after="7 days"), 0)
+
+        chunk_sizes = get_chunk_sizes('sender_positions')
+        self.assertEqual(len(chunk_sizes), 1)
+        self.assertTrue(chunk_sizes[0].is_compressed)
+        self.assertIsNotNone(chunk_sizes[0].compressed_bytes)
+
+        altitudes = db.session.execute("SELECT altitude FROM sender_positions WHERE name = 'FLRDDEFF7' ORDER BY timestamp").fetchall()
+        self.assertEqual([row[0] for row in altitudes], [604, 605])
+
+    def test_reprocess_compressed_chunk(self):
+        enable_compression(compress_after="7 days")
+        compress_chunks(compress_after="7 days")
+
+        start, end = datetime(2016, 7, 2), datetime(2016, 7, 3)
+        changed_rows = sum(reprocess_chunk((chunk, "normalized_quality", start, end))[1] for chunk in get_chunks(start, end))
+        self.assertEqual(changed_rows, 2)
+
+        # the chunk is compressed again
+        self.assertTrue(get_chunk_sizes('sender_positions')[0].is_compressed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import logging
+import threading
+import unittest
+from unittest import mock
+
+from app import create_app
+from app.collect.gateway import TRANSFER_STAGES, follow_redis_to_database, transfer_batch, transfer_from_redis_to_database
+
+
+class Transport:
+    """One chunk of rows per redis target, records the acknowledged targets."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.acked = []
+
+    def read_chunks(self, redis_target, count, chunk_size):
+        if self.rows.get(redis_target):
+            yield self.rows[redis_target][:count], f"token {redis_target}"
+
+    def ack(self, redis_target, token):
+        self.acked.append(redis_target)
+
+
+class Clock:
+    """Replaces the module 'time' of app.collect.gateway: transfers take rows / rows_per_second seconds, sleeping takes no time."""
+
+    def __init__(self, rows_per_second):
+        self.rows_per_second = rows_per_second
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+class TestTransferBatch(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.lock = threading.Lock()
+        self.started = {redis_target: threading.Event() for redis_target in TRANSFER_STAGES}
+        self.transport = Transport({redis_target: ["row\n"] for redis_target in ('receiver_status', 'receiver_position', 'sender_status', 'sender_position')})
+
+    def get_stages(self, failing_target=None, waits_for=None):
+        def get_stage(redis_target):
+            def stage(lines):
+                with self.lock:
+                    self.events.append(("start", redis_target))
+                self.started[redis_target].set()
+                if waits_for and redis_target in waits_for:
+                    self.started[waits_for[redis_target]].wait(timeout=5)
+                list(lines)
+                if redis_target == failing_target:
+                    raise ValueError(f"{redis_target} failed")
+                with self.lock:
+                    self.events.append(("end", redis_target))
+            return stage
+
+        return {redis_target: (get_stage(redis_target), dependencies) for redis_target, (function, dependencies) in TRANSFER_STAGES.items()}
+
+    def test_stage_order(self):
+        # receiver_status only finishes if sender_position starts meanwhile
+        with create_app("testing").app_context(), mock.patch.dict(TRANSFER_STAGES, self.get_stages(waits_for={'receiver_status': 'sender_position'})):
+            counts, durations = transfer_batch(self.transport, 10)
+
+        self.assertEqual(counts, {'receiver_status': 1, 'receiver_position': 1, 'sender_status': 1, 'sender_position': 1})
+
+        # both receiver stages upsert all columns of the receivers, so they run one after the other ...
+        self.assertLess(self.events.index(("end", "receiver_position")), self.events.index(("start", "receiver_status")))
+
+        # ... and the sender positions overlap with them (the receiver id cache inserts unknown receivers)
+        self.assertLess(self.events.index(("start", "sender_position")), self.events.index(("end", "receiver_status")))
+        self.assertEqual(sorted(self.transport.acked), ['receiver_position', 'receiver_status', 'sender_position', 'sender_status'])
+
+    def test_failed_stage_is_not_acknowledged(self):
+        with create_app("testing").app_context(), mock.patch.dict(TRANSFER_STAGES, self.get_stages(failing_target="receiver_position")):
+            with self.assertRaisesRegex(ValueError, "receiver_position failed"):
+                transfer_batch(self.transport, 10)
+
+        # the rows of the failed stage and of the stages which depend on it stay in redis
+        self.assertEqual(self.transport.acked, ['sender_position'])
+        self.assertNotIn(("start", "receiver_status"), self.events)
+
+
+class TestTransferFromRedisToDatabase(unittest.TestCase):
+    def test_transport_info_only_with_debug_logging(self):
+        counts = {'receiver_status': 0, 'receiver_position': 0, 'sender_status': 0, 'sender_position': 1}
+        app = create_app("testing")
+        with app.app_context(), \
+                mock.patch("app.collect.gateway.get_transport") as get_transport, \
+                mock.patch("app.collect.gateway.transfer_batch", return_value=(counts, {})), \
+                mock.patch("app.collect.gateway.flush_statistics") as flush_statistics:
+            app.logger.setLevel(logging.INFO)
+            transfer_from_redis_to_database()
+            get_transport.return_value.get_info.assert_not_called()
+
+            # the statistics are only upserted if TRANSFER_STATISTICS_FLUSH_INTERVAL is over
+            flush_statistics.assert_called_once_with()
+
+            app.logger.setLevel(logging.DEBUG)
+            transfer_from_redis_to_database()
+            self.assertEqual(get_transport.return_value.get_info.call_count, 4)
+
+
+class TestFollowRedisToDatabase(unittest.TestCase):
+    def test_adaptive_batch_size(self):
+        clock = Clock(rows_per_second=10000)
+        waiting_rows = [1000, 15000, 100]
+        batch_sizes = []
+
+        def transfer_batch(transport, batch_size):
+            if not waiting_rows:
+                raise KeyboardInterrupt
+            batch_sizes.append(batch_size)
+            rows = min(batch_size, waiting_rows.pop(0))
+            clock.now += rows / clock.rows_per_second
+            return {'receiver_status': 0, 'receiver_position': 0, 'sender_status': 0, 'sender_position': rows}, {}
+
+        with create_app("testing").app_context(), \
+                mock.patch("app.collect.gateway.time", clock), \
+                mock.patch("app.collect.gateway.get_transport"), \
+                mock.patch("app.collect.gateway.transfer_batch", transfer_batch), \
+                mock.patch("app.collect.gateway.flush_statistics") as flush_statistics:
+            with self.assertRaises(KeyboardInterrupt):
+                follow_redis_to_database(target_latency=2.0, max_batch_rows=15000, min_batch_rows=1000)
+
+        # backlog: the batch grows to the throughput * target latency (20000 rows), but not above max_batch_rows
+        self.assertEqual(batch_sizes, [1000, 15000, 15000])
+
+        # idle queue: wait until a transfer would take the target latency
+        self.assertEqual(len(clock.sleeps), 1)
+        self.assertAlmostEqual(clock.sleeps[0], 2.0 - 100 / 10000)
+
+        # the statistics are flushed after each transfer and forced at the end
+        self.assertEqual(flush_statistics.call_args_list[-1], mock.call(force=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
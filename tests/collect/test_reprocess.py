@@ -0,0 +1,56 @@
+import unittest
+from datetime import datetime
+
+from tests.base import TestBaseDB, db
+
+from app.collect.reprocess import get_chunks, reprocess_chunk
+from app.collect.statistics import rebuild_statistics
+from app.gateway.beacon_conversion import get_mgrs
+
+
+class TestReprocess(TestBaseDB):
+    def setUp(self):
+        super().setUp()
+
+        db.session.execute("INSERT INTO sender_positions(name, receiver_name, location, altitude, timestamp, reference_timestamp, signal_quality, distance, normalized_quality, location_mgrs, location_mgrs_short) VALUES('FLRDDEFF7', 'Koenigsdf', 'SRID=4326;POINT(11.4 47.8)', 604, '2016-07-02 10:47:12', '2016-07-02 10:47:12', 7.0, 20000, NULL, 'wrong', 'wrong')")
+        db.session.execute("INSERT INTO sender_positions(name, receiver_name, location, altitude, timestamp, reference_timestamp, signal_quality, distance, normalized_quality, location_mgrs, location_mgrs_short) VALUES('FLRDDEFF7', 'Koenigsdf', 'SRID=4326;POINT(11.4 47.8)', 605, '2016-07-03 10:47:12', '2016-07-03 10:47:12', 7.0, 20000, NULL, 'wrong', 'wrong')")
+        db.session.commit()
+
+    def reprocess(self, column, start, end):
+        return sum(reprocess_chunk((chunk, column, start, end))[1] for chunk in get_chunks(start, end))
+
+    def test_reprocess_location_mgrs(self):
+        changed_rows = self.reprocess("location_mgrs", datetime(2016, 7, 2), datetime(2016, 7, 3))
+        self.assertEqual(changed_rows, 1)
+
+        rows = db.session.execute("SELECT location_mgrs, location_mgrs_short FROM sender_positions ORDER BY reference_timestamp").fetchall()
+        self.assertEqual(tuple(rows[0]), get_mgrs(47.8, 11.4))
+        self.assertEqual(tuple(rows[1]), ("wrong", "wrong"))
+
+        # nothing left to do
+        self.assertEqual(self.reprocess("location_mgrs", datetime(2016, 7, 2), datetime(2016, 7, 3)), 0)
+
+    def test_reprocess_normalized_quality(self):
+        changed_rows = self.reprocess("normalized_quality", datetime(2016, 7, 2), datetime(2016, 7, 4))
+        self.assertEqual(changed_rows, 2)
+
+        normalized_quality, is_trustworthy = db.session.execute("SELECT normalized_quality, is_trustworthy FROM sender_positions LIMIT 1").fetchone()
+        self.assertAlmostEqual(normalized_quality, 7.0 + 20 * 0.30103, places=3)
+
+        # is_trustworthy depends on normalized_quality
+        self.assertIsNotNone(is_trustworthy)
+
+    def test_rebuild_statistics(self):
+        db.session.execute("INSERT INTO senders(name) VALUES('FLRDDEFF7')")
+        db.session.execute("INSERT INTO receivers(name) VALUES('Koenigsdf')")
+        db.session.commit()
+
+        self.reprocess("location_mgrs", datetime(2016, 7, 2), datetime(2016, 7, 3))
+        rebuild_statistics(datetime(2016, 7, 2), datetime(2016, 7, 3), ('coverage_statistics', ))
+
+        rows = db.session.execute("SELECT date, location_mgrs_short, messages_count FROM coverage_statistics").fetchall()
+        self.assertEqual([tuple(row) for row in rows], [(datetime(2016, 7, 2).date(), get_mgrs(47.8, 11.4)[1], 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from datetime import datetime, timedelta
+
+from tests.base import TestBaseDB, db
+
+from app.collect.retention import downsample_sender_positions, drop_sender_positions, validate_retention_config
+from config import DefaultConfig
+
+
+class TestRetentionConfig(unittest.TestCase):
+    def get_config(self, **kwargs):
+        config = {key: getattr(DefaultConfig, key) for key in dir(DefaultConfig) if key.isupper()}
+        config.update(kwargs)
+        return config
+
+    def test_validate_retention_config(self):
+        validate_retention_config(self.get_config(RETENTION_RAW_DAYS=None))
+        validate_retention_config(self.get_config(RETENTION_RAW_DAYS=3))
+
+        # 'update_logbook_previous_day' needs the sender positions of yesterday
+        with self.assertRaises(ValueError):
+            validate_retention_config(self.get_config(RETENTION_RAW_DAYS=2))
+
+        with self.assertRaises(ValueError):
+            validate_retention_config(self.get_config(RETENTION_RAW_DAYS=60, RETENTION_DOWNSAMPLED_MONTHS=1))
+
+
+class TestRetention(TestBaseDB):
+    def setUp(self):
+        super().setUp()
+
+        for timestamp, error_count in (('10:47:11', 2), ('10:47:12', 0), ('10:47:14', 1), ('10:47:21', 3)):
+            db.session.execute(f"INSERT INTO sender_positions(name, receiver_name, location, altitude, timestamp, reference_timestamp, error_count) VALUES('FLRDDEFF7', 'Koenigsdf', 'SRID=4326;POINT(11.4 47.8)', 604, '2016-07-02 {timestamp}', '2016-07-02 {timestamp}', {error_count})")
+        db.session.execute("INSERT INTO sender_positions(name, receiver_name, location, altitude, timestamp, reference_timestamp, error_count) VALUES('FLRDDEFF7', 'Koenigsdf', 'SRID=4326;POINT(11.4 47.8)', 604, '2016-07-05 10:47:12', '2016-07-05 10:47:12', 0)")
+        db.session.commit()
+
+    def test_downsample_sender_positions(self):
+        self.assertEqual(downsample_sender_positions(end=datetime(2016, 7, 3), interval=10), 2)
+
+        timestamps = db.session.execute("SELECT timestamp FROM sender_positions_downsampled ORDER BY timestamp").fetchall()
+        self.assertEqual([row[0] for row in timestamps], [datetime(2016, 7, 2, 10, 47, 12), datetime(2016, 7, 2, 10, 47, 21)])
+
+        # the next run continues after the last downsampled day
+        self.assertEqual(downsample_sender_positions(end=datetime(2016, 7, 6), interval=10), 1)
+
+    def test_drop_sender_positions(self):
+        self.assertEqual(drop_sender_positions(older_than=datetime(2016, 7, 3)), 1)
+
+        self.assertEqual(db.session.execute("SELECT COUNT(*) FROM sender_positions").scalar(), 1)
+        self.assertEqual(drop_sender_positions(older_than=datetime(2016, 7, 3) - timedelta(days=1)), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from app.gateway.archive import ArchiveWriter
+from app.gateway.process_tools import open_file
+
+
+class TestArchive(unittest.TestCase):
+    def test_archive_writer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive = ArchiveWriter(directory)
+            archive.start()
+            archive.add("FLRDDEB4F>APRS,qAS,EDER:/065957h5025.71N/01018.85E'099/043/A=004316", received=datetime(2016, 9, 21, 6, 59, 58))
+            archive.add("ICA4B1B9F>APRS,qAS,LSZB:/070001h4649.67N/00732.61E'241/127/A=004641", received=datetime(2016, 9, 21, 7, 0, 2))
+            archive.stop()
+
+            # a restart within the same hour appends to the archive
+            archive = ArchiveWriter(directory)
+            archive.start()
+            archive.add("# aprsc 2.1.4-g408ed49", received=datetime(2016, 9, 21, 7, 10))
+            archive.stop()
+
+            self.assertEqual(sorted(os.listdir(directory)), [
+                "OGN_log.txt_2016-09-21_06.gz", "OGN_log.txt_2016-09-21_06.gz.json",
+                "OGN_log.txt_2016-09-21_07.gz", "OGN_log.txt_2016-09-21_07.gz.json",
+            ])
+
+            with open_file(os.path.join(directory, "OGN_log.txt_2016-09-21_07.gz")) as f:
+                self.assertEqual(f.read().splitlines(), ["ICA4B1B9F>APRS,qAS,LSZB:/070001h4649.67N/00732.61E'241/127/A=004641", "# aprsc 2.1.4-g408ed49"])
+
+            with open(os.path.join(directory, "OGN_log.txt_2016-09-21_07.gz.json")) as f:
+                self.assertEqual(json.load(f), {"lines": 2, "first": "2016-09-21T07:00:02", "last": "2016-09-21T07:10:00"})
+
+    def test_archive_is_read_with_the_same_encoding(self):
+        aprs_string = "FLRDDA5BA>APRS,qAS,LFMX:/160829h4415.41N/00600.03E'342/049/A=005524 Müller Flugplatz Köln"
+        with tempfile.TemporaryDirectory() as directory:
+            archive = ArchiveWriter(directory)
+            archive.start()
+            archive.add(aprs_string, received=datetime(2016, 9, 21, 16, 8, 30))
+            archive.stop()
+
+            with open_file(os.path.join(directory, "OGN_log.txt_2016-09-21_16.gz")) as f:
+                self.assertEqual(f.read().splitlines(), [aprs_string])
+
+    def test_archive_writer_drops_lines_if_the_queue_is_full(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive = ArchiveWriter(directory, queue_size=2)
+            for i in range(5):
+                archive.add(f"line {i}")
+            self.assertEqual(archive.dropped, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import unittest
+
+from ogn.parser import parse
+
+from app import create_app
+from app.model import AircraftType
+from app.gateway.beacon_conversion import preclassify, get_mgrs, aprs_string_to_record, record_to_csv_string
+
+VALID_MESSAGES_PATH = os.path.join(os.path.dirname(__file__), "valid_messages")
+
+
+class TestBeaconConversion(unittest.TestCase):
+    def test_preclassify(self):
+        self.assertEqual(preclassify("# aprsc 2.1.4-g408ed49 17 Mar 2018 09:30:36 GMT GLIDERN1 37.187.40.234:10152"), "server_comment")
+        self.assertEqual(preclassify("FLRDD89C9>OGFLR,qAS,LIDH"), "malformed")
+        self.assertEqual(preclassify("FLRDD89C9>OGFLR,qAS,LIDH:_115054h"), "aprs_type")
+        self.assertEqual(preclassify("FLRDD89C9>OGFLR,qAS,LIDH:>115054h h0d v0.2.7"), "sender_status")
+
+        position = "FLRDD89C9>OGFLR,qAS,LIDH:/115054h4543.22N/01132.84E'260/072/A=002542 !W10! id06DD89C9 +198fpm -0.8rot 7.0dB 0e +0.7kHz gps2x3"
+        self.assertIsNone(preclassify(position))
+        self.assertEqual(preclassify(position, ignore_dstcalls=("OGFLR", )), "ignored_dstcall")
+        self.assertEqual(preclassify(position, ignore_names=("FLRDD", )), "ignored_name")
+
+        self.assertIsNone(preclassify("LILH>OGNSDR,TCPIP*,qAC,GLIDERN2:>132201h v0.2.7.RPI-GPU CPU:0.7 RAM:770.2/968.2MB"))
+        self.assertIsNone(preclassify("Lachens>APRS,TCPIP*,qAC,GLIDERN2:>165334h v0.2.1 CPU:0.3 RAM:1764.4/2121.4MB"))
+
+    def test_preclassify_rejects_only_unwanted_beacons(self):
+        for filename in os.listdir(VALID_MESSAGES_PATH):
+            with open(os.path.join(VALID_MESSAGES_PATH, filename)) as f:
+                for line in f:
+                    aprs_string = line.strip()
+                    if not aprs_string or preclassify(aprs_string) is None:
+                        continue
+
+                    try:
+                        message = parse(aprs_string)
+                    except Exception:
+                        continue
+                    wanted = message["aprs_type"] == "position" or (message["aprs_type"] == "status" and message["beacon_type"] in ("aprs_receiver", "receiver"))
+                    self.assertFalse(wanted, aprs_string)
+
+    def test_get_mgrs(self):
+        get_mgrs.cache_clear()
+        self.assertEqual(get_mgrs(45.72035, 11.547333333333333), ("32TPR9823566133", "32TPR9866"))
+        self.assertEqual(get_mgrs(45.72035, 11.547333333333333), ("32TPR9823566133", "32TPR9866"))
+        self.assertEqual(get_mgrs.cache_info().hits, 1)
+
+    def test_aprs_string_to_record(self):
+        app = create_app("testing")
+        with app.app_context():
+            aprs_string_to_record("LIDH>APRS,TCPIP*,qAC,GLIDERN2:/115000h4543.22NI01132.84E&/A=000528")
+            redis_target, record = aprs_string_to_record("FLRDD89C9>OGFLR,qAS,LIDH:/115054h4543.22N/01132.84E'260/072/A=002542 !W10! id06DD89C9 +198fpm -0.8rot 7.0dB 0e +0.7kHz gps2x3")
+            csv_string = record_to_csv_string(redis_target, record)
+
+            self.assertIsNone(aprs_string_to_record("FLRDD89C9>OGFLR,qAS,LIDH:>115054h h0d v0.2.7"))
+
+        self.assertEqual(redis_target, "sender_position")
+        self.assertEqual(record.aircraft_type, AircraftType.GLIDER_OR_MOTOR_GLIDER)
+        self.assertEqual((record.gps_quality_horizontal, record.gps_quality_vertical), (2, 3))
+        self.assertEqual(record.location_mgrs, get_mgrs(record.latitude, record.longitude)[0])
+        self.assertIsNotNone(record.distance)
+        self.assertIn(",GLIDER_OR_MOTOR_GLIDER,", csv_string)
+
+
+if __name__ == "__main__":
+    unittest.main()
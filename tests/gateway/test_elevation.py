@@ -0,0 +1,58 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from app.gateway.elevation import ElevationService, HGT_VOID
+
+
+def write_hgt_file(path, values):
+    with open(path, "wb") as f:
+        for row in values:
+            f.write(struct.pack(f">{len(row)}h", *row))
+
+
+class TestElevation(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+
+        # 3x3 tiles: the first row is the northern edge, the first column is the western edge
+        write_hgt_file(os.path.join(self.tempdir.name, "N45E011.hgt"), [[100, 200, 300], [400, 500, 600], [700, 800, 900]])
+        write_hgt_file(os.path.join(self.tempdir.name, "S01W001.hgt"), [[HGT_VOID, 0, 0], [0, 0, 0], [0, 0, 10]])
+        write_hgt_file(os.path.join(self.tempdir.name, "readme.txt"), [[0]])
+
+        self.elevation_service = ElevationService(self.tempdir.name, max_open_tiles=1)
+
+    def tearDown(self):
+        self.elevation_service.close()
+        self.tempdir.cleanup()
+
+    def test_tiles(self):
+        self.assertEqual(set(self.elevation_service.tile_paths.keys()), {(45, 11), (-1, -1)})
+
+    def test_get_elevation(self):
+        # grid points
+        self.assertEqual(self.elevation_service.get_elevation(45.5, 11.5), 500)
+        self.assertEqual(self.elevation_service.get_elevation(45.0, 11.0), 700)
+        self.assertAlmostEqual(self.elevation_service.get_elevation(45.999999, 11.0), 100, places=2)
+        self.assertAlmostEqual(self.elevation_service.get_elevation(45.0, 11.999999), 900, places=2)
+
+        # bilinear interpolation
+        self.assertAlmostEqual(self.elevation_service.get_elevation(45.75, 11.25), 300)
+        self.assertAlmostEqual(self.elevation_service.get_elevation(45.25, 11.5), 650)
+
+        # southern / western hemisphere
+        self.assertAlmostEqual(self.elevation_service.get_elevation(-0.75, -0.25), 2.5)
+
+        # void data or no tile
+        self.assertIsNone(self.elevation_service.get_elevation(-0.1, -0.9))
+        self.assertIsNone(self.elevation_service.get_elevation(50.0, 8.0))
+
+    def test_lru(self):
+        self.elevation_service.get_elevation(45.5, 11.5)
+        self.elevation_service.get_elevation(-0.5, -0.5)
+        self.assertEqual(list(self.elevation_service.open_tiles.keys()), [(-1, -1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from app import create_app
+from app.gateway.beacon_conversion import CODECS
+from app.gateway.log_import import ImportState, convert_log_lines, get_reference_timestamp
+
+LOG_FILE = os.path.join(os.path.dirname(__file__), "..", "commands", "OGN_log.txt_2016-09-21")
+
+
+class TestLogImport(unittest.TestCase):
+    def test_get_reference_timestamp(self):
+        self.assertEqual(get_reference_timestamp(LOG_FILE), datetime(2016, 9, 21, 12))
+        self.assertEqual(get_reference_timestamp("/data/2016-09-21/OGN_log.txt_2016-09-22.gz"), datetime(2016, 9, 22, 12))
+        self.assertEqual(get_reference_timestamp("archive/OGN_log.txt_2016-09-22_07.gz"), datetime(2016, 9, 22, 7, 30))
+        self.assertIsNone(get_reference_timestamp("OGN_log.txt"))
+
+    def test_convert_log_lines(self):
+        with open(LOG_FILE) as f:
+            aprs_strings = [line.strip() for line in f]
+
+        app = create_app("testing")
+        with app.app_context():
+            groups, reference_timestamp = convert_log_lines(aprs_strings, datetime(2016, 9, 21, 12))
+
+        self.assertEqual(reference_timestamp, datetime(2016, 9, 21, 7, 2, 55))
+        self.assertEqual(set(groups), {
+            ("sender_position", datetime(2016, 9, 21, 6)),
+            ("receiver_position", datetime(2016, 9, 21)),
+            ("receiver_status", datetime(2016, 9, 21)),
+        })
+
+        # the beacons get their own timestamp as reference_timestamp
+        for (redis_target, chunk), csv_strings in groups.items():
+            timestamp_index = CODECS[redis_target].index["timestamp"]
+            for csv_string in csv_strings:
+                values = csv_string.split(",")
+                self.assertEqual(values[0], values[timestamp_index])
+
+    def test_import_state(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "import_state.json")
+
+            state = ImportState(path)
+            state.update("a.txt", 50000, datetime(2016, 9, 21, 6), datetime(2016, 9, 22))
+            state.update("a.txt", 80000, datetime(2016, 9, 21, 3), datetime(2016, 9, 21, 9))
+            state.update("b.txt", None, None, None)
+            state.save()
+
+            state = ImportState(path)
+            self.assertEqual(state.get_offset("a.txt"), 80000)
+            self.assertFalse(state.is_done("a.txt"))
+            self.assertTrue(state.is_done("b.txt"))
+            self.assertEqual((state.start, state.end), (datetime(2016, 9, 21, 3), datetime(2016, 9, 22)))
+            self.assertFalse(state.rebuilt)
+
+            # a crash after the commit of a batch but before the state file was saved
+            state.sync({"a.txt": (100000, datetime(2016, 9, 21, 0), datetime(2016, 9, 21, 3)), "b.txt": (10, None, None)})
+            self.assertEqual(state.get_offset("a.txt"), 100000)
+            self.assertTrue(state.is_done("b.txt"))
+            self.assertEqual((state.start, state.end), (datetime(2016, 9, 21, 0), datetime(2016, 9, 22)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from app.model import AircraftType
+from app.gateway.csv_codec import CsvCodec, Column, REQUIRED, NOT_NONE
+from app.gateway.id_cache import sender_id_cache, receiver_id_cache
+from app.gateway.message_handling import SENDER_POSITION_BEACON_FIELDS, sender_position_message_to_csv_string, receiver_status_message_to_csv_string, SENDER_POSITION_CODEC, add_sender_and_receiver_ids, get_senders
+from app.gateway.sender_cache import SenderCache
+
+
+class TestMessageHandling(unittest.TestCase):
+    def test_csv_codec(self):
+        codec = CsvCodec(["name", "altitude", "agl", "climb_rate"], {"name": Column(REQUIRED), "altitude": Column(converter=int), "agl": Column(NOT_NONE)})
+
+        self.assertEqual(codec.encode({"name": "FLRDD0815", "altitude": 1234.5, "agl": 0.0, "climb_rate": 0.0}), "FLRDD0815,1234,0.0,\\N\n")
+        self.assertEqual(codec.encode({"name": "FLRDD0815", "agl": None}), "FLRDD0815,\\N,\\N,\\N\n")
+        self.assertEqual(codec.with_none_character('').encode({"name": "FLRDD0815"}), "FLRDD0815,,,\n")
+        self.assertEqual(codec.encode_batch([{"name": "A"}, {"name": "B"}]), "A,\\N,\\N,\\N\nB,\\N,\\N,\\N\n")
+
+        with self.assertRaises(KeyError):
+            codec.encode({"altitude": 1234.5})
+
+    def test_sender_position_message_to_csv_string(self):
+        message = {
+            "reference_timestamp": datetime(2020, 1, 1, 12, 0, 1),
+            "name": "FLRDD89C9",
+            "dstcall": "OGFLR",
+            "relay": None,
+            "receiver_name": "LIDH",
+            "timestamp": datetime(2020, 1, 1, 11, 50, 54),
+            "location": "SRID=4326;POINT(11.547333333333333 45.72035)",
+            "track": 260,
+            "ground_speed": 133.3314133486932,
+            "altitude": 774.8016,
+            "address_type": 2,
+            "aircraft_type": AircraftType.GLIDER_OR_MOTOR_GLIDER,
+            "stealth": False,
+            "address": "DD89C9",
+            "climb_rate": 1.00584,
+            "turn_rate": -2.4,
+            "signal_quality": 7.0,
+            "error_count": 0,
+            "frequency_offset": 0.7,
+            "gps_quality_horizontal": 2,
+            "gps_quality_vertical": 3,
+            "location_mgrs": "32TPR4270563862",
+            "location_mgrs_short": "32TPR4263",
+            "is_trustworthy": False,
+        }
+
+        self.assertEqual(
+            sender_position_message_to_csv_string(message, none_character=r"\N"),
+            "2020-01-01 12:00:01,FLRDD89C9,OGFLR,\\N,LIDH,2020-01-01 11:50:54,SRID=4326;POINT(11.547333333333333 45.72035),260,133.3314133486932,774,2,GLIDER_OR_MOTOR_GLIDER,\\N,DD89C9,1.00584,-2.4,7.0,\\N,0.7,2,3,\\N,\\N,\\N,\\N,\\N,\\N,\\N,32TPR4270563862,32TPR4263,\\N,False\n",
+        )
+        self.assertEqual(SENDER_POSITION_CODEC.fields, SENDER_POSITION_BEACON_FIELDS)
+
+        record = SENDER_POSITION_CODEC.to_record(message)
+        self.assertFalse(hasattr(record, "__dict__"))
+        self.assertEqual(SENDER_POSITION_CODEC.encode_record(record), sender_position_message_to_csv_string(message, none_character=r"\N"))
+
+        del message["aircraft_type"]
+        self.assertIn(",UNKNOWN,", sender_position_message_to_csv_string(message))
+
+    def test_receiver_status_message_to_csv_string(self):
+        message = {
+            "reference_timestamp": datetime(2020, 1, 1, 12, 0, 1),
+            "name": "LILH",
+            "dstcall": "OGNSDR",
+            "receiver_name": "GLIDERN2",
+            "timestamp": datetime(2020, 1, 1, 13, 22, 1),
+            "version": "0.2.7",
+            "platform": "RPI-GPU",
+            "cpu_temp": 55.7,
+        }
+
+        self.assertEqual(receiver_status_message_to_csv_string(message), "2020-01-01 12:00:01,LILH,OGNSDR,GLIDERN2,2020-01-01 13:22:01,0.2.7,RPI-GPU,55.7,\n")
+
+    def test_add_sender_and_receiver_ids(self):
+        class Cursor:
+            def __init__(self):
+                self.statements = []
+
+            def execute(self, sql, parameters=None):
+                self.statements.append((sql, parameters))
+
+            def fetchall(self):
+                return []
+
+        sender_id_cache.clear()
+        receiver_id_cache.clear()
+        sender_id_cache.update([("FLRDD89C9", 1)])
+        receiver_id_cache.update([("LIDH", 2)])
+        sender_id_cache.warmed = receiver_id_cache.warmed = True
+
+        lines = [
+            "2020-01-01 12:00:01,FLRDD89C9,OGFLR,\\N,LIDH,2020-01-01 11:50:54,SRID=4326;POINT(11.5 45.7),\\N\n",
+            "2020-01-01 12:00:02,FLRDD89C9,OGFLR,\\N,NEWRX,2020-01-01 11:50:55,SRID=4326;POINT(11.5 45.7),\\N\n",
+        ]
+        cursor = Cursor()
+        cursor.connection = mock.Mock()
+
+        # unknown receivers are inserted (just the name), so the sender positions don't have to wait for the receiver upserts
+        with mock.patch("app.gateway.id_cache.execute_values", return_value=[("NEWRX", 3)]) as execute_values:
+            self.assertEqual(
+                add_sender_and_receiver_ids(cursor, lines),
+                [
+                    "2020-01-01 12:00:01,FLRDD89C9,OGFLR,\\N,LIDH,2020-01-01 11:50:54,SRID=4326;POINT(11.5 45.7),\\N,1,2\n",
+                    "2020-01-01 12:00:02,FLRDD89C9,OGFLR,\\N,NEWRX,2020-01-01 11:50:55,SRID=4326;POINT(11.5 45.7),\\N,1,3\n",
+                ]
+            )
+        self.assertEqual(execute_values.call_args[0][2], [("NEWRX", )])
+        cursor.connection.commit.assert_called_once_with()
+
+        sender_id_cache.clear()
+        receiver_id_cache.clear()
+
+    def test_get_senders(self):
+        def csv_string(reference_timestamp, name, software_version):
+            return sender_position_message_to_csv_string({
+                "reference_timestamp": reference_timestamp, "name": name, "dstcall": "OGFLR", "receiver_name": "LIDH", "timestamp": reference_timestamp,
+                "location": "SRID=4326;POINT(11.5 45.7)", "address": name[3:], "software_version": software_version, "location_mgrs": "32TPR4270563862", "location_mgrs_short": "32TPR4263",
+            }, none_character=r"\N")
+
+        lines = [
+            csv_string(datetime(2020, 1, 1, 12, 0, 1), "FLRDD89C9", 7.0),
+            csv_string(datetime(2020, 1, 1, 12, 0, 5), "FLRDD89C9", 7.01),
+            csv_string(datetime(2020, 1, 1, 12, 0, 3), "FLRDD89C9", 7.0),
+            csv_string(datetime(2020, 1, 1, 12, 0, 2), "RND123456", None),
+        ]
+        senders = get_senders(lines)
+        self.assertEqual(senders, {"FLRDD89C9": (datetime(2020, 1, 1, 12, 0, 1), datetime(2020, 1, 1, 12, 0, 5), ("UNKNOWN", None, "DD89C9", "7.01", None, None))})
+
+        sender_cache = SenderCache()
+        self.assertEqual(sender_cache.get_changed(senders, lastseen_interval=60), senders)
+        self.assertEqual(sender_cache.get_new_addresses(senders), ["DD89C9"])
+        sender_cache.update(senders)
+        self.assertEqual(sender_cache.get_new_addresses(senders), [])
+
+        # nothing changed, lastseen is recent enough
+        senders = get_senders([csv_string(datetime(2020, 1, 1, 12, 0, 30), "FLRDD89C9", 7.01)])
+        self.assertEqual(sender_cache.get_changed(senders, lastseen_interval=60), {})
+
+        # lastseen is too old
+        senders = get_senders([csv_string(datetime(2020, 1, 1, 12, 1, 5), "FLRDD89C9", 7.01)])
+        self.assertEqual(sender_cache.get_changed(senders, lastseen_interval=60), senders)
+
+        # attributes changed
+        senders = get_senders([csv_string(datetime(2020, 1, 1, 12, 0, 30), "FLRDD89C9", 7.02)])
+        self.assertEqual(sender_cache.get_changed(senders, lastseen_interval=60), senders)
+
+        self.assertEqual((sender_cache.written_senders, sender_cache.skipped_senders), (3, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from app.gateway.parse_pool import ParsePool, get_route_key
+
+
+class TestParsePool(unittest.TestCase):
+    def test_get_route_key(self):
+        # beacons received by a receiver are routed by the receiver name ...
+        self.assertEqual(get_route_key("FLRDD89C9>OGFLR,qAS,LIDH:/115054h4543.22N/01132.84E'260/072/A=002542 !W10! id06DD89C9 +198fpm -0.8rot 7.0dB 0e +0.7kHz gps2x3"), "LIDH")
+        self.assertEqual(get_route_key("FLRDDA5BA>APRS,qAS,LFMX:/160829h4415.41N/00600.03E'342/049/A=005524 id0ADDA5BA -454fpm -1.1rot 8.8dB 0e +51.2kHz gps4x5"), "LFMX")
+
+        # ... and so are the beacons of the receiver itself
+        self.assertEqual(get_route_key("LILH>OGNSDR,TCPIP*,qAC,GLIDERN2:/132201h4457.61NI00900.58E&/A=000423"), "LILH")
+        self.assertEqual(get_route_key("LILH>OGNSDR,TCPIP*,qAC,GLIDERN2:>132201h v0.2.7.RPI-GPU CPU:0.7 RAM:770.2/968.2MB"), "LILH")
+
+    def test_submit_drops_if_the_queue_is_full(self):
+        pool = ParsePool(workers=1, queue_size=1, submit_timeout=0.01)
+        pool.submit("LILH>OGNSDR,TCPIP*,qAC,GLIDERN2:/132201h4457.61NI00900.58E&/A=000423")
+        pool.submit("LILH>OGNSDR,TCPIP*,qAC,GLIDERN2:>132201h v0.2.7.RPI-GPU CPU:0.7 RAM:770.2/968.2MB")
+        self.assertEqual(pool.dropped, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import struct
+import unittest
+from datetime import datetime
+
+import sqlalchemy as sa
+from geoalchemy2.types import Geometry
+
+from app.model import AircraftType
+from app.gateway.pgcopy import PgCopyEncoder, IteratorFile, PGCOPY_HEADER, PGCOPY_TRAILER
+from app.gateway.message_handling import sender_position_message_to_csv_string, SENDER_POSITION_PGCOPY_ENCODER
+
+
+class TestPgCopy(unittest.TestCase):
+    def test_encode_row(self):
+        encoder = PgCopyEncoder([sa.SmallInteger(), sa.Float(precision=2), sa.DateTime(), Geometry("POINT", srid=4326), sa.Boolean(), sa.String(), sa.Enum(AircraftType), sa.Integer()])
+
+        row = encoder.encode_row("260,774.5,2000-01-01 00:00:01.500000,SRID=4326;POINT(11.5 45.7),True,\\N,GLIDER_OR_MOTOR_GLIDER,42\n")
+        fields = [
+            struct.pack(">h", 8),
+            struct.pack(">ih", 2, 260),
+            struct.pack(">if", 4, 774.5),
+            struct.pack(">iq", 8, 1500000),
+            struct.pack(">i", 25) + struct.pack("<BIIdd", 1, 0x20000001, 4326, 11.5, 45.7),
+            struct.pack(">ib", 1, 1),
+            struct.pack(">i", -1),
+            struct.pack(">i", 22) + b"GLIDER_OR_MOTOR_GLIDER",
+            struct.pack(">ii", 4, 42),
+        ]
+        self.assertEqual(row, b"".join(fields))
+
+        with self.assertRaises(ValueError):
+            encoder.encode_row("260,774.5\n")
+
+    def test_sender_position_encoder(self):
+        message = {
+            "reference_timestamp": datetime(2020, 1, 1, 12, 0, 1),
+            "name": "FLRDD89C9",
+            "dstcall": "OGFLR",
+            "receiver_name": "LIDH",
+            "timestamp": datetime(2020, 1, 1, 11, 50, 54),
+            "location": "SRID=4326;POINT(11.547333333333333 45.72035)",
+            "track": 260,
+            "ground_speed": 133.3314133486932,
+            "altitude": 774.8016,
+            "aircraft_type": AircraftType.GLIDER_OR_MOTOR_GLIDER,
+            "climb_rate": 1.00584,
+            "error_count": 2,
+            "location_mgrs": "32TPR4270563862",
+            "location_mgrs_short": "32TPR4263",
+            "is_trustworthy": True,
+        }
+        line = sender_position_message_to_csv_string(message, none_character=r"\N").rstrip("\n") + ",1,2\n"
+
+        data = SENDER_POSITION_PGCOPY_ENCODER.encode([line, line])
+        self.assertTrue(data.startswith(PGCOPY_HEADER))
+        self.assertTrue(data.endswith(PGCOPY_TRAILER))
+        self.assertEqual(len(data), len(PGCOPY_HEADER) + 2 * len(SENDER_POSITION_PGCOPY_ENCODER.encode_row(line)) + len(PGCOPY_TRAILER))
+        self.assertEqual(IteratorFile(SENDER_POSITION_PGCOPY_ENCODER.iter_encode(iter([line, line]))).read(), data)
+
+    def test_iterator_file(self):
+        pulled = []
+
+        def lines():
+            for i in range(5):
+                pulled.append(i)
+                yield f"line {i}\n"
+
+        iterator_file = IteratorFile(lines())
+        self.assertEqual(iterator_file.read(10), "line 0\nlin")
+        self.assertEqual(pulled, [0, 1])
+        self.assertEqual(iterator_file.read(4), "e 1\n")
+        self.assertEqual(pulled, [0, 1])
+        self.assertEqual(iterator_file.read(), "line 2\nline 3\nline 4\n")
+        self.assertEqual(iterator_file.read(10), "")
+
+        self.assertEqual(IteratorFile([b"ab", b"cd"]).read(3), b"abc")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from ogn.parser.utils import CheapRuler
+
+from app.gateway.receiver_cache import ReceiverPositionCache, get_relations, add_relations
+from app.gateway.message_handling import SENDER_POSITION_CODEC
+
+
+class TestReceiverCache(unittest.TestCase):
+    def test_receiver_position_cache(self):
+        receiver_position_cache = ReceiverPositionCache(maxsize=2)
+        receiver_position_cache.warm([("LIDH", 11.5, 45.7), ("LILH", 9.0, 44.9)])
+        self.assertEqual(receiver_position_cache.get("LIDH"), (11.5, 45.7))
+
+        # LILH is the least recently used receiver
+        receiver_position_cache.update("Koenigsdf", 11.5, 48.1)
+        self.assertIsNone(receiver_position_cache.get("LILH"))
+        self.assertEqual(receiver_position_cache.get("Koenigsdf"), (11.5, 48.1))
+        self.assertEqual((receiver_position_cache.hits, receiver_position_cache.misses), (2, 1))
+
+    def test_get_relations(self):
+        senders = [(11.547, 45.720), (11.0, 47.0), (11.5, 45.7), (-0.5, 51.4)]
+        receivers = [(11.5, 45.7), (11.2, 46.9), (11.5, 45.7), (0.1, 51.3)]
+
+        distances, bearings = get_relations(*zip(*senders), *zip(*receivers))
+        for sender, receiver, distance, bearing in zip(senders, receivers, distances, bearings):
+            cheap_ruler = CheapRuler((sender[1] + receiver[1]) / 2.0)
+            self.assertAlmostEqual(distance, cheap_ruler.distance(sender, receiver), places=6)
+            self.assertAlmostEqual(bearing, cheap_ruler.bearing(sender, receiver), places=6)
+
+    def test_add_relations(self):
+        def get_relations(count):
+            return [(SENDER_POSITION_CODEC.to_record({"longitude": 11.547 + i / 1000, "latitude": 45.72, "signal_quality": 7.0}), (11.5, 45.7)) for i in range(count)]
+
+        scalar_relations = get_relations(10)
+        vectorized_relations = get_relations(40)
+        add_relations(scalar_relations)
+        add_relations(vectorized_relations)
+        for (scalar, _), (vectorized, _) in zip(scalar_relations, vectorized_relations):
+            self.assertAlmostEqual(scalar.distance, vectorized.distance, places=6)
+            self.assertEqual(scalar.bearing, vectorized.bearing)
+            self.assertAlmostEqual(scalar.normalized_quality, vectorized.normalized_quality, places=6)
+        self.assertIsInstance(vectorized_relations[0][0].bearing, int)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import time
+import unittest
+from unittest import mock
+
+from app.gateway.redis_writer import RedisBatchWriter
+from tests.gateway.test_spool import Transport
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class TestRedisBatchWriter(unittest.TestCase):
+    def setUp(self):
+        self.transport = Transport()
+
+    def test_flush_at_batch_size(self):
+        redis_writer = RedisBatchWriter(self.transport, batch_size=3, batch_interval=60)
+        redis_writer.add("sender_position", "1")
+        redis_writer.add("receiver_status", "2")
+        self.assertEqual(self.transport.rows, [])
+
+        redis_writer.add("sender_position", "3")
+        self.assertEqual(self.transport.rows, [("sender_position", "1"), ("sender_position", "3"), ("receiver_status", "2")])
+        self.assertEqual((redis_writer.flush_counter, redis_writer.flushed_rows, redis_writer.row_count), (1, 3, 0))
+
+    def test_flush_after_batch_interval(self):
+        clock = Clock()
+        with mock.patch("app.gateway.redis_writer.time", clock):
+            redis_writer = RedisBatchWriter(self.transport, batch_size=500, batch_interval=0.5)
+            redis_writer.add("sender_position", "1")
+            clock.now += 0.25
+            redis_writer.flush_if_due()
+            self.assertEqual(self.transport.rows, [])
+
+            clock.now += 0.25
+            redis_writer.flush_if_due()
+            self.assertEqual(self.transport.rows, [("sender_position", "1")])
+            self.assertEqual(redis_writer.max_row_latency, 0.5)
+
+    def test_timer_flushes_a_quiet_feed(self):
+        redis_writer = RedisBatchWriter(self.transport, batch_size=500, batch_interval=0.01)
+        redis_writer.start_timer()
+        redis_writer.add("sender_position", "1")
+
+        deadline = time.time() + 5
+        while not self.transport.rows and time.time() < deadline:
+            time.sleep(0.01)
+        redis_writer.stop_timer()
+
+        self.assertEqual(self.transport.rows, [("sender_position", "1")])
+        self.assertIsNone(redis_writer.timer)
+
+
+if __name__ == "__main__":
+    unittest.main()
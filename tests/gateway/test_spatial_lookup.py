@@ -0,0 +1,68 @@
+import unittest
+
+from shapely.geometry import box, MultiPolygon
+
+from app.gateway.spatial_lookup import SpatialLookup, get_spatial_lookup, reset_spatial_lookup
+
+
+class Cursor:
+    """Empty countries and airports with a given version (number and max. id)."""
+
+    def __init__(self, version):
+        self.version = version
+        self.queries = 0
+
+    def execute(self, query):
+        self.queries += 1
+
+    def fetchone(self):
+        return self.version
+
+    def fetchall(self):
+        return []
+
+
+class TestSpatialLookup(unittest.TestCase):
+    def setUp(self):
+        countries = [
+            (1, MultiPolygon([box(5.0, 47.0, 15.0, 55.0)])),
+            (2, MultiPolygon([box(15.0, 46.0, 17.0, 49.0), box(9.5, 46.5, 10.5, 47.0)])),
+        ]
+        airports = [
+            (10, box(11.00, 47.00, 11.10, 47.10), 11.05, 47.05),
+            (11, box(11.05, 47.05, 11.20, 47.20), 11.08, 47.08),
+        ]
+        self.spatial_lookup = SpatialLookup(countries, airports)
+
+    def test_get_country_id(self):
+        self.assertEqual(self.spatial_lookup.get_country_id(11.5, 48.0), 1)
+        self.assertEqual(self.spatial_lookup.get_country_id(16.0, 47.0), 2)
+        self.assertEqual(self.spatial_lookup.get_country_id(10.0, 46.75), 2)
+        self.assertIsNone(self.spatial_lookup.get_country_id(0.0, 0.0))
+
+    def test_get_airport_id(self):
+        self.assertEqual(self.spatial_lookup.get_airport_id(11.02, 47.02), 10)
+        self.assertEqual(self.spatial_lookup.get_airport_id(11.06, 47.06), 10)    # in both borders, 10 is nearer
+        self.assertEqual(self.spatial_lookup.get_airport_id(11.09, 47.09), 11)    # in both borders, 11 is nearer
+        self.assertIsNone(self.spatial_lookup.get_airport_id(11.5, 48.0))
+
+    def test_get_moved(self):
+        self.assertEqual(self.spatial_lookup.get_moved({1: (11.0, 47.0)}), {1: (11.0, 47.0)})
+        self.spatial_lookup.update_locations({1: (11.0, 47.0)})
+        self.assertEqual(self.spatial_lookup.get_moved({1: (11.0, 47.0), 2: (12.0, 48.0)}), {2: (12.0, 48.0)})
+        self.assertEqual(self.spatial_lookup.get_moved({1: (11.1, 47.0)}), {1: (11.1, 47.0)})
+
+    def test_get_spatial_lookup_reloads_after_import(self):
+        reset_spatial_lookup()
+        cursor = Cursor(version=(250, 250, 1000, 1000))
+        spatial_lookup = get_spatial_lookup(cursor)
+        self.assertIs(get_spatial_lookup(cursor), spatial_lookup)
+
+        # e.g. 'flask database import_airports'
+        cursor.version = (250, 250, 1001, 1001)
+        self.assertIsNot(get_spatial_lookup(cursor), spatial_lookup)
+        reset_spatial_lookup()
+
+
+if __name__ == "__main__":
+    unittest.main()
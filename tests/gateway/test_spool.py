@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+
+from redis.exceptions import ConnectionError
+
+from app.gateway.redis_writer import RedisBatchWriter
+from app.gateway.spool import Spool
+
+
+class Pipeline:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.rows = []
+
+    def execute(self):
+        if not self.redis_client.reachable:
+            raise ConnectionError("Connection refused")
+        self.redis_client.rows += self.rows
+
+
+class Transport:
+    def __init__(self):
+        self.redis_client = self
+        self.reachable = True
+        self.rows = []
+
+    def pipeline(self, transaction):
+        return Pipeline(self)
+
+    def write(self, pipeline, redis_target, csv_strings):
+        pipeline.rows += [(redis_target, csv_string) for csv_string in csv_strings]
+
+
+class TestSpool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_append_and_replay(self):
+        spool = Spool(self.path, segment_size=90, fsync="always")
+        spool.append({"sender_position": ["a" * 40, "b" * 40], "receiver_status": ["c"]})
+        spool.append({"sender_position": ["d"]})
+        self.assertEqual(len(spool.segments), 2)
+
+        # the spool survives a restart
+        spool.close()
+        spool = Spool(self.path)
+
+        replayed = []
+        self.assertEqual(spool.replay(replayed.append, max_rows=2), 2)
+        self.assertEqual(spool.replay(replayed.append, max_rows=10), 2)
+        self.assertEqual(replayed, [{"sender_position": ["a" * 40, "b" * 40]}, {"receiver_status": ["c"]}, {"sender_position": ["d"]}])
+        self.assertTrue(spool.is_empty())
+        self.assertEqual((spool.size, os.listdir(self.path)), (0, []))
+
+        with self.assertRaises(ValueError):
+            Spool(self.path, fsync="sometimes")
+
+    def test_redis_batch_writer(self):
+        transport = Transport()
+        spool = Spool(self.path)
+        redis_writer = RedisBatchWriter(transport, batch_size=2, spool=spool, retry_interval=0.0)
+
+        transport.reachable = False
+        redis_writer.add("sender_position", "1")
+        redis_writer.add("sender_position", "2")
+        self.assertEqual(spool.spooled_rows, 2)
+
+        transport.reachable = True
+        redis_writer.add("sender_position", "3")
+        redis_writer.add("sender_position", "4")
+        self.assertEqual(transport.rows, [("sender_position", str(i)) for i in range(1, 5)])
+        self.assertTrue(spool.is_empty())
+
+        redis_writer.add("sender_position", "5")
+        redis_writer.flush()
+        self.assertEqual(transport.rows[-1], ("sender_position", "5"))
+        self.assertEqual(spool.spooled_rows, 2)
+
+    def test_directory_is_created_with_the_first_segment(self):
+        path = os.path.join(self.path, "spool")
+        spool = Spool(path)
+        self.assertTrue(spool.is_empty())
+        self.assertFalse(os.path.exists(path))
+
+        spool.append({"sender_position": ["a"]})
+        spool.close()
+        self.assertTrue(os.path.isdir(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
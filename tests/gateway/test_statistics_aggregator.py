@@ -0,0 +1,37 @@
+import unittest
+from datetime import date
+
+from app.gateway.statistics_aggregator import StatisticsAggregator, MAX, MIN, SUM
+
+
+class TestStatisticsAggregator(unittest.TestCase):
+    def test_add(self):
+        aggregator = StatisticsAggregator("coverage_statistics", ["date", "sender_id"], [("max_distance", MAX), ("min_altitude", MIN), ("messages_count", SUM)])
+
+        aggregator.add([(date(2020, 1, 1), 1, 1000.0, None, 3), (date(2020, 1, 1), 2, 500.0, 300.0, 1)])
+        aggregator.add([(date(2020, 1, 1), 1, 800.0, 200.0, 2)])
+
+        self.assertEqual(aggregator.rows, {(date(2020, 1, 1), 1): [1000.0, 200.0, 5], (date(2020, 1, 1), 2): [500.0, 300.0, 1]})
+        self.assertEqual(aggregator.added_rows, 3)
+        self.assertEqual(
+            aggregator.upsert_sql,
+            "INSERT INTO coverage_statistics AS t (date, sender_id, max_distance, min_altitude, messages_count) VALUES %s ON CONFLICT (date, sender_id) DO UPDATE SET "
+            "max_distance = GREATEST(EXCLUDED.max_distance, t.max_distance), min_altitude = LEAST(EXCLUDED.min_altitude, t.min_altitude), messages_count = EXCLUDED.messages_count + t.messages_count",
+        )
+
+    def test_rebuilt_days_are_dropped(self):
+        aggregator = StatisticsAggregator("coverage_statistics", ["date", "sender_id"], [("messages_count", SUM)])
+        aggregator.add([(date(2020, 1, 1), 1, 3), (date(2020, 1, 2), 1, 2)])
+
+        # the rebuild of 2020-01-01 counted these beacons, the rebuild of another table doesn't matter
+        aggregator.add([(date(2020, 1, 1), 1, 1)], rebuilds=[(7, "coverage_statistics", date(2020, 1, 1)), (8, "sender_position_statistics", date(2020, 1, 2))])
+        self.assertEqual(aggregator.rows, {(date(2020, 1, 1), 1): [1], (date(2020, 1, 2), 1): [2]})
+        self.assertEqual((aggregator.rebuild_id, aggregator.dropped_rows), (8, 1))
+
+        # known rebuilds are applied only once
+        aggregator.add([], rebuilds=[(7, "coverage_statistics", date(2020, 1, 1))])
+        self.assertEqual(aggregator.rows[(date(2020, 1, 1), 1)], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+import time
+import unittest
+
+from app import create_app
+from app.gateway.transport import SortedSetTransport, StreamTransport, TransferBatch
+
+
+class RedisClient:
+    def __init__(self, members):
+        self.members = members
+        self.calls = []
+
+    def zpopmin(self, name, count):
+        self.calls.append(count)
+        popped, self.members = self.members[:count], self.members[count:]
+        return [(member.encode("utf-8"), 0.0) for member in popped]
+
+
+class StreamRedisClient:
+    """A redis stream with one consumer group in memory (only the commands of StreamTransport)."""
+
+    def __init__(self, rows, start_ms):
+        self.entries = [(f"{start_ms + i}-0".encode(), {b"row": row.encode("utf-8")}) for i, row in enumerate(rows)]
+        self.last_delivered = (0, 0)
+        self.pending = {}       # entry_id -> [consumer, delivery time (ms)]
+        self.now_ms = start_ms
+
+    def get_fields(self, entry_id):
+        return next((fields for other_id, fields in self.entries if other_id == entry_id), {})
+
+    def xgroup_create(self, name, groupname, id, mkstream):
+        pass
+
+    def xreadgroup(self, groupname, consumername, streams, count):
+        stream_id = list(streams.values())[0]
+        if stream_id == ">":
+            entries = [(entry_id, fields) for entry_id, fields in self.entries if self.get_key(entry_id) > self.last_delivered][:count]
+            if entries:
+                self.last_delivered = self.get_key(entries[-1][0])
+            for entry_id, fields in entries:
+                self.pending[entry_id] = [consumername, self.now_ms]
+        else:
+            after = stream_id if isinstance(stream_id, bytes) else stream_id.encode()
+            pending_ids = sorted((entry_id for entry_id, (consumer, delivered) in self.pending.items() if consumer == consumername and self.get_key(entry_id) > self.get_key(after)), key=self.get_key)
+            entries = [(entry_id, self.get_fields(entry_id)) for entry_id in pending_ids[:count]]
+        return [["stream", entries]] if entries else []
+
+    def get_key(self, entry_id):
+        return tuple(int(part) for part in entry_id.split(b"-"))
+
+    def xpending_range(self, name, groupname, min, max, count):
+        pending_ids = sorted(self.pending, key=self.get_key)
+        if min != "-":
+            pending_ids = [entry_id for entry_id in pending_ids if self.get_key(entry_id) >= self.get_key(min.encode())]
+        pending_ids = pending_ids[:count]
+        return [{"message_id": entry_id, "consumer": self.pending[entry_id][0].encode(), "time_since_delivered": self.now_ms - self.pending[entry_id][1], "times_delivered": 1} for entry_id in pending_ids]
+
+    def xclaim(self, name, groupname, consumername, min_idle_time, message_ids):
+        claimed = []
+        for entry_id in message_ids:
+            if self.now_ms - self.pending[entry_id][1] >= min_idle_time:
+                self.pending[entry_id] = [consumername, self.now_ms]
+                claimed.append((entry_id, self.get_fields(entry_id)))
+        return claimed
+
+    def xpending(self, name, groupname):
+        pending_ids = sorted(self.pending, key=self.get_key)
+        return {"pending": len(pending_ids), "min": pending_ids[0] if pending_ids else None, "max": pending_ids[-1] if pending_ids else None, "consumers": []}
+
+    def xack(self, name, groupname, *ids):
+        for entry_id in ids:
+            self.pending.pop(entry_id, None)
+
+    def xdel(self, name, *ids):
+        self.entries = [(entry_id, fields) for entry_id, fields in self.entries if entry_id not in ids]
+
+    def xlen(self, name):
+        return len(self.entries)
+
+    def pipeline(self, transaction):
+        return StreamPipeline(self)
+
+
+class StreamPipeline:
+    def __init__(self, redis_client):
+        self.redis_client = redis_client
+        self.commands = []
+
+    def xack(self, *args):
+        self.commands.append((self.redis_client.xack, args))
+
+    def xdel(self, *args):
+        self.commands.append((self.redis_client.xdel, args))
+
+    def execute(self):
+        for command, args in self.commands:
+            command(*args)
+
+
+class TestTransport(unittest.TestCase):
+    def test_transfer_batch(self):
+        redis_client = RedisClient([f"row {i}\n" for i in range(7)])
+        batch = TransferBatch(SortedSetTransport(redis_client), "sender_position", count=6, chunk_size=4)
+
+        self.assertFalse(batch.is_empty())
+        self.assertEqual(redis_client.calls, [4])
+
+        self.assertEqual(list(batch), [f"row {i}\n" for i in range(6)])
+        self.assertEqual(redis_client.calls, [4, 2])
+        self.assertEqual(batch.rows, 6)
+        self.assertEqual(batch.tokens, [None, None])
+        self.assertEqual(redis_client.members, ["row 6\n"])
+
+        batch = TransferBatch(SortedSetTransport(RedisClient([])), "sender_position", count=6, chunk_size=4)
+        self.assertTrue(batch.is_empty())
+        self.assertEqual(list(batch), [])
+
+    def get_stream_transport(self, redis_client, consumer):
+        return StreamTransport(redis_client, maxlen=1000, group="transfer", consumer=consumer, claim_idle_time=300)
+
+    def test_stream_read_chunks(self):
+        redis_client = StreamRedisClient([f"row {i}\n" for i in range(8)], start_ms=1000)
+        transport_a = self.get_stream_transport(redis_client, "a")
+        transport_b = self.get_stream_transport(redis_client, "b")
+
+        # both transfers fail before ack(), the rows of "b" are not claimed by "a" before claim_idle_time
+        self.assertEqual(transport_a.read("sender_position", 2)[0], ["row 0\n", "row 1\n"])
+        self.assertEqual(transport_b.read("sender_position", 2)[0], ["row 2\n", "row 3\n"])
+        self.assertEqual(transport_a.read("sender_position", 1)[0], ["row 0\n"])
+
+        # own pending rows first, then the claimed rows of "b" and then new rows
+        redis_client.now_ms += 300 * 1000
+        with create_app("testing").app_context():
+            chunks = [csv_strings for csv_strings, entry_ids in transport_a.read_chunks("sender_position", count=7, chunk_size=2)]
+        self.assertEqual(chunks, [["row 0\n", "row 1\n"], ["row 2\n", "row 3\n"], ["row 4\n", "row 5\n"], ["row 6\n"]])
+        self.assertTrue(all(redis_client.pending[entry_id][0] == "a" for entry_id in redis_client.pending))
+
+    def test_stream_ack_after_success(self):
+        redis_client = StreamRedisClient([f"row {i}\n" for i in range(5)], start_ms=1000)
+        transport = self.get_stream_transport(redis_client, "a")
+
+        # a failed stage doesn't call ack(): the rows stay in the stream and are delivered again
+        batch = TransferBatch(transport, "sender_position", count=3, chunk_size=2)
+        self.assertEqual(list(batch), ["row 0\n", "row 1\n", "row 2\n"])
+        self.assertEqual(len(redis_client.pending), 3)
+        self.assertEqual(redis_client.xlen("sender_position"), 5)
+
+        batch = TransferBatch(transport, "sender_position", count=3, chunk_size=2)
+        self.assertEqual(list(batch), ["row 0\n", "row 1\n", "row 2\n"])
+        batch.ack()
+        self.assertEqual(redis_client.pending, {})
+        self.assertEqual(redis_client.xlen("sender_position"), 2)
+
+        batch = TransferBatch(transport, "sender_position", count=3, chunk_size=2)
+        self.assertEqual(list(batch), ["row 3\n", "row 4\n"])
+
+    def test_stream_get_info(self):
+        start_ms = int(time.time() * 1000) - 5000
+        redis_client = StreamRedisClient([f"row {i}\n" for i in range(4)], start_ms=start_ms)
+        transport = self.get_stream_transport(redis_client, "a")
+
+        self.assertEqual(transport.get_info("sender_position"), {"length": 4, "pending": 0, "pending_lag": 0.0})
+
+        transport.read("sender_position", 3)
+        info = transport.get_info("sender_position")
+        self.assertEqual((info["length"], info["pending"]), (4, 3))
+        self.assertAlmostEqual(info["pending_lag"], 5.0, delta=1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,7 +3,7 @@ import unittest
 from datetime import date
 
 from app.model import AircraftType
-from app.utils import get_days, get_trackable, get_airports
+from app.utils import get_days, get_trackable, get_airports, is_trustworthy
 from app.commands.database import read_ddb
 
 
@@ -14,6 +14,16 @@ class TestStringMethods(unittest.TestCase):
         days = get_days(start, end)
         self.assertEqual(days, [date(2018, 2, 27), date(2018, 2, 28), date(2018, 3, 1), date(2018, 3, 2)])
 
+    def test_is_trustworthy(self):
+        self.assertTrue(is_trustworthy(distance=20000, normalized_quality=20, error_count=None, climb_rate=1.5))
+        self.assertTrue(is_trustworthy(distance=20000, normalized_quality=20, error_count=9, climb_rate=-50))
+        self.assertFalse(is_trustworthy(distance=500, normalized_quality=20, error_count=None, climb_rate=None))
+        self.assertFalse(is_trustworthy(distance=None, normalized_quality=20, error_count=None, climb_rate=None))
+        self.assertFalse(is_trustworthy(distance=20000, normalized_quality=0, error_count=None, climb_rate=None))
+        self.assertFalse(is_trustworthy(distance=20000, normalized_quality=41, error_count=None, climb_rate=None))
+        self.assertFalse(is_trustworthy(distance=20000, normalized_quality=20, error_count=10, climb_rate=None))
+        self.assertFalse(is_trustworthy(distance=20000, normalized_quality=20, error_count=None, climb_rate=51))
+
     def test_get_devices(self):
         sender_infos = read_ddb()
         self.assertGreater(len(sender_infos), 1000)